@@ -0,0 +1,446 @@
+"""
+Latency-aware routing across several inference backends.
+
+One Groq API key caps throughput at its rate limit. A BackendPool spreads
+calls over several backends (API keys, endpoints, or both) and is itself an
+InferenceBackend, so the detector uses it like a single one. Each call goes
+to the member with the lowest expected wait: the fewest calls in flight
+weighted by its exponentially weighted moving average (EWMA) latency, among
+members whose rate-limit budget, as reported in their x-ratelimit-* headers,
+still has room.
+
+A member that answers 429 is paused for its Retry-After and the call is sent
+to another member right away, so one hot key does not surface 429s while
+other keys sit idle. A member failing eject_after times in a row (5xx,
+connection errors, timeouts) is taken out of rotation for eject_seconds and
+then probed with a single call before it gets traffic again.
+
+The rate-limit headers passed back to the detector are the sums over all
+members, so the detector's scheduler sees the budget of the whole pool.
+
+Classes:
+    MemberStats: Snapshot of one pool member
+    BackendPool: InferenceBackend routing calls across member backends
+
+Usage:
+    >>> pool = BackendPool([GroqBackend(key, name=f"key{i}")
+    ...                     for i, key in enumerate(api_keys)])
+    >>> detector = LeafDiseaseDetector(backend=pool)
+    >>> [(member.name, member.ewma_ms, member.state) for member in pool.stats()]
+"""
+
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Set
+
+import groq
+
+from backends import BackendResponse, InferenceBackend
+from scheduler import parse_duration
+
+logger = logging.getLogger(__name__)
+
+HEALTHY = "healthy"
+LIMITED = "limited"
+EJECTED = "ejected"
+PROBING = "probing"
+
+_RATE_LIMIT_PREFIX = "x-ratelimit-"
+
+
+@dataclass
+class MemberStats:
+    """
+    Snapshot of one pool member.
+
+    Attributes:
+        name (str): Name of the member backend
+        state (str): healthy, limited (rate limit paused or budget spent),
+            ejected (failing, out of rotation) or probing
+        in_flight (int): Calls currently sent to the member
+        ewma_ms (Optional[float]): Smoothed latency, None before the first call
+        calls (int): Successful calls
+        failures (int): Failed calls (5xx, connection errors, timeouts)
+        rate_limited (int): Calls answered with 429
+        remaining_requests (Optional[float]): Request budget left, if known
+        remaining_tokens (Optional[float]): Token budget left, if known
+    """
+    name: str
+    state: str
+    in_flight: int
+    ewma_ms: Optional[float]
+    calls: int
+    failures: int
+    rate_limited: int
+    remaining_requests: Optional[float]
+    remaining_tokens: Optional[float]
+
+
+class _Member:
+    """Routing state of one backend (guarded by the pool lock)"""
+
+    def __init__(self, backend: InferenceBackend):
+        self.backend = backend
+        self.in_flight = 0
+        self.ewma: Optional[float] = None
+        self.mean_tokens = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.probe_in_flight = False
+        self.paused_until = 0.0
+        self.limits: Dict[str, Optional[float]] = {"requests": None, "tokens": None}
+        self.remaining: Dict[str, Optional[float]] = {"requests": None, "tokens": None}
+        self.budget_reset_at: Dict[str, float] = {"requests": 0.0, "tokens": 0.0}
+
+    def state(self, now: float) -> str:
+        if self.ejected_until:
+            if now < self.ejected_until or self.probe_in_flight:
+                return EJECTED
+            return PROBING
+        if now < self.paused_until or not self.has_budget(now):
+            return LIMITED
+        return HEALTHY
+
+    def has_budget(self, now: float) -> bool:
+        for kind, needed in (("requests", 1.0), ("tokens", self.mean_tokens)):
+            if now >= self.budget_reset_at[kind]:
+                # The provider's window has rolled over since the last header
+                self.remaining[kind] = None
+            remaining = self.remaining[kind]
+            if remaining is not None and remaining < needed:
+                return False
+        return True
+
+    def score(self) -> float:
+        """Expected wait of a new call: smoothed latency times the queue it joins"""
+        return (self.ewma or 0.0) * (self.in_flight + 1)
+
+
+class _TrackedStream:
+    """Chunk stream that frees its member's in-flight slot once closed"""
+
+    def __init__(self, chunks, release: Callable[[], None]):
+        self._chunks = chunks
+        self._release = release
+        self._released = False
+
+    def __iter__(self):
+        try:
+            yield from self._chunks
+        finally:
+            self._done()
+
+    def close(self):
+        try:
+            self._chunks.close()
+        finally:
+            self._done()
+
+    def _done(self):
+        if not self._released:
+            self._released = True
+            self._release()
+
+
+class _AsyncTrackedStream(_TrackedStream):
+    """Async counterpart of _TrackedStream"""
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._chunks:
+                yield chunk
+        finally:
+            self._done()
+
+    async def close(self):
+        try:
+            await self._chunks.close()
+        finally:
+            self._done()
+
+
+class BackendPool:
+    """
+    InferenceBackend that routes every call to the best member backend.
+
+    Attributes:
+        name (str): Label of the pool in logs
+        ewma_alpha (float): Weight of the newest latency in the EWMA
+        eject_after (int): Consecutive failures that take a member out of
+            rotation
+        eject_seconds (float): Time an ejected member waits before a probe
+    """
+
+    def __init__(self, backends: Sequence[InferenceBackend], name: str = "pool",
+                 ewma_alpha: float = 0.3, eject_after: int = 3,
+                 eject_seconds: float = 30.0):
+        """
+        Create a pool over member backends.
+
+        Args:
+            backends (Sequence[InferenceBackend]): Members, e.g. one
+                GroqBackend per API key or endpoint
+            name (str): Label of the pool in logs
+            ewma_alpha (float): Weight of the newest latency in the EWMA
+            eject_after (int): Consecutive failures that eject a member
+            eject_seconds (float): Time an ejected member waits before a probe
+
+        Raises:
+            ValueError: If no backends are given
+        """
+        if not backends:
+            raise ValueError("A backend pool needs at least one backend")
+        self.name = name
+        self.ewma_alpha = ewma_alpha
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self._members = [_Member(backend) for backend in backends]
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def complete(self, request: Dict, timeout: Optional[float]) -> BackendResponse:
+        return self._call(
+            lambda member, remaining: member.backend.complete(request, remaining),
+            timeout)
+
+    async def complete_async(self, request: Dict,
+                             timeout: Optional[float]) -> BackendResponse:
+        deadline = self._deadline(timeout)
+        tried: Set[_Member] = set()
+        while True:
+            member, started = self._acquire(tried)
+            try:
+                response = await member.backend.complete_async(
+                    request, self._remaining(deadline))
+            except BaseException as e:
+                if not self._failover(member, e, started, tried, deadline):
+                    raise
+                continue
+            return self._succeeded(member, response, started)
+
+    def stream(self, request: Dict, timeout: Optional[float]) -> BackendResponse:
+        return self._call(
+            lambda member, remaining: member.backend.stream(request, remaining),
+            timeout, streamed=True)
+
+    async def stream_async(self, request: Dict,
+                           timeout: Optional[float]) -> BackendResponse:
+        deadline = self._deadline(timeout)
+        tried: Set[_Member] = set()
+        while True:
+            member, started = self._acquire(tried)
+            try:
+                response = await member.backend.stream_async(
+                    request, self._remaining(deadline))
+            except BaseException as e:
+                if not self._failover(member, e, started, tried, deadline):
+                    raise
+                continue
+            return self._succeeded(member, response, started, streamed=True,
+                                   stream_cls=_AsyncTrackedStream)
+
+    async def probe_async(self):
+        """Probe every member, raising if none of them answered"""
+        errors = []
+        for member in self._members:
+            try:
+                await member.backend.probe_async()
+            except Exception as e:
+                logger.warning(f"Probe of {member.backend.name} failed: {str(e)}")
+                errors.append(e)
+        if len(errors) == len(self._members):
+            raise errors[0]
+
+    async def aclose(self):
+        for member in self._members:
+            await member.backend.aclose()
+
+    def stats(self) -> List[MemberStats]:
+        """
+        Return a snapshot of every member.
+
+        Returns:
+            List[MemberStats]: Routing state and counters, in member order
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [MemberStats(
+                name=member.backend.name,
+                state=member.state(now),
+                in_flight=member.in_flight,
+                ewma_ms=round(member.ewma * 1000, 1) if member.ewma is not None else None,
+                calls=member.calls,
+                failures=member.failures,
+                rate_limited=member.rate_limited,
+                remaining_requests=member.remaining["requests"],
+                remaining_tokens=member.remaining["tokens"],
+            ) for member in self._members]
+
+    def _call(self, send: Callable[[_Member, Optional[float]], BackendResponse],
+              timeout: Optional[float], streamed: bool = False) -> BackendResponse:
+        """Send a blocking call, failing over to other members where it helps"""
+        deadline = self._deadline(timeout)
+        tried: Set[_Member] = set()
+        while True:
+            member, started = self._acquire(tried)
+            try:
+                response = send(member, self._remaining(deadline))
+            except BaseException as e:
+                if not self._failover(member, e, started, tried, deadline):
+                    raise
+                continue
+            return self._succeeded(member, response, started, streamed=streamed)
+
+    def _acquire(self, tried: Set[_Member]):
+        """Pick the member for the next try and count the call as in flight"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [m for m in self._members if m not in tried] or self._members
+            states = {m: m.state(now) for m in candidates}
+            ready = [m for m in candidates if states[m] in (HEALTHY, PROBING)]
+            limited = [m for m in candidates if states[m] == LIMITED]
+            if ready:
+                member = min(ready, key=lambda m: (m.score(), self._rng.random()))
+            elif limited:
+                # With every member limited, the soonest to recover is tried
+                member = min(limited, key=lambda m: (m.paused_until, m.score()))
+            else:
+                member = min(candidates, key=lambda m: m.ejected_until)
+            if states[member] == PROBING:
+                member.probe_in_flight = True
+            member.in_flight += 1
+            if member.remaining["requests"] is not None:
+                member.remaining["requests"] -= 1
+            if member.remaining["tokens"] is not None:
+                member.remaining["tokens"] -= member.mean_tokens
+        return member, time.monotonic()
+
+    def _succeeded(self, member: _Member, response: BackendResponse,
+                   started: float, streamed: bool = False,
+                   stream_cls=_TrackedStream) -> BackendResponse:
+        """Record a successful call and return it with pool-wide headers"""
+        now = time.monotonic()
+        latency = now - started
+        usage = getattr(response.body, "usage", None)
+        tokens = getattr(usage, "total_tokens", None)
+        with self._lock:
+            member.calls += 1
+            member.ewma = latency if member.ewma is None else (
+                self.ewma_alpha * latency + (1 - self.ewma_alpha) * member.ewma)
+            if tokens:
+                member.mean_tokens = tokens if not member.mean_tokens else (
+                    self.ewma_alpha * tokens + (1 - self.ewma_alpha) * member.mean_tokens)
+            if member.ejected_until:
+                logger.info(f"Backend {member.backend.name} passed its probe, "
+                            f"back in rotation")
+            member.consecutive_failures = 0
+            member.ejected_until = 0.0
+            member.probe_in_flight = False
+            self._observe_headers(member, response.headers, now)
+            headers = self._pool_headers(response.headers)
+            if not streamed:
+                member.in_flight -= 1
+        if streamed:
+            body = stream_cls(response.body, lambda: self._release(member))
+            return BackendResponse(body, headers)
+        return BackendResponse(response.body, headers)
+
+    def _failover(self, member: _Member, error: BaseException, started: float,
+                  tried: Set[_Member], deadline: Optional[float]) -> bool:
+        """
+        Record a failed call and decide whether to try another member
+
+        Returns:
+            bool: True if the call should be sent to another member
+        """
+        now = time.monotonic()
+        status = getattr(error, "status_code", None)
+        rate_limited = isinstance(error, groq.RateLimitError) or status == 429
+        failed = (isinstance(error, (groq.APIConnectionError, groq.InternalServerError))
+                  or (status is not None and status >= 500))
+        with self._lock:
+            member.in_flight -= 1
+            member.probe_in_flight = False
+            if rate_limited:
+                member.rate_limited += 1
+                headers = getattr(getattr(error, "response", None), "headers", None) or {}
+                pause = parse_duration(headers.get("retry-after")) or 1.0
+                member.paused_until = max(member.paused_until, now + pause)
+                self._observe_headers(member, headers, now)
+                logger.warning(f"Backend {member.backend.name} rate limited, "
+                               f"paused for {pause:.1f}s")
+            elif failed:
+                member.failures += 1
+                member.consecutive_failures += 1
+                if member.ejected_until or member.consecutive_failures >= self.eject_after:
+                    member.ejected_until = now + self.eject_seconds
+                    logger.warning(f"Backend {member.backend.name} taken out of "
+                                   f"rotation for {self.eject_seconds:.0f}s: {str(error)}")
+            else:
+                # Client errors and cancellations say nothing about the member
+                return False
+            tried.add(member)
+            others = [m for m in self._members if m not in tried
+                      and m.state(now) in (HEALTHY, PROBING)]
+        if others and self._remaining(deadline) != 0.0:
+            logger.info(f"Retrying on another backend after {member.backend.name} "
+                        f"failed: {str(error)}")
+            return True
+        return False
+
+    def _release(self, member: _Member):
+        """Free the in-flight slot held by a finished stream"""
+        with self._lock:
+            member.in_flight -= 1
+
+    def _observe_headers(self, member: _Member, headers: Mapping[str, str],
+                         now: float):
+        """Record a member's rate-limit budget from its response headers (lock held)"""
+        for kind in ("requests", "tokens"):
+            remaining = _header_float(headers, f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            member.remaining[kind] = remaining
+            member.limits[kind] = _header_float(headers, f"x-ratelimit-limit-{kind}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            member.budget_reset_at[kind] = now + (reset if reset is not None else 60.0)
+
+    def _pool_headers(self, headers: Mapping[str, str]) -> Dict[str, str]:
+        """Replace a member's rate-limit headers with pool-wide sums (lock held)"""
+        pooled = {key.lower(): value for key, value in headers.items()
+                  if not key.lower().startswith(_RATE_LIMIT_PREFIX)}
+        for kind in ("requests", "tokens"):
+            remaining = [m.remaining[kind] for m in self._members]
+            limits = [m.limits[kind] for m in self._members]
+            if any(value is None for value in remaining):
+                continue
+            pooled[f"x-ratelimit-remaining-{kind}"] = f"{max(0.0, sum(remaining)):g}"
+            if all(value is not None for value in limits):
+                pooled[f"x-ratelimit-limit-{kind}"] = f"{sum(limits):g}"
+            reset = min(m.budget_reset_at[kind] for m in self._members) - time.monotonic()
+            pooled[f"x-ratelimit-reset-{kind}"] = f"{max(0.0, reset):.2f}s"
+        return pooled
+
+    @staticmethod
+    def _deadline(timeout: Optional[float]) -> Optional[float]:
+        return None if timeout is None else time.monotonic() + timeout
+
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def _header_float(headers: Mapping[str, str], name: str) -> Optional[float]:
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,145 @@
+"""
+Inference backends for the Leaf Disease Detection System.
+
+The detector builds chat completion requests and leaves sending them to a
+backend. Every backend exposes the same four calls (blocking, coroutine,
+and a streaming variant of each) and returns the parsed completion, or the
+chunk stream, together with the response headers that the scheduler reads
+rate-limit information from. The Groq SDK is one such backend; pointed at
+another base URL it talks to any server that speaks the same API, such as
+the offline stand-in in standin_server.py, so load tests, benchmarks and CI
+run without network access or quota.
+
+Backends report failures with the groq SDK's exception types (or any
+exception with a status_code attribute and a response carrying headers),
+so the retry policy, circuit breaker and scheduler treat all of them alike.
+
+Classes:
+    BackendResponse: Completion or chunk stream with its response headers
+    InferenceBackend: Protocol implemented by every backend
+    GroqBackend: Backend built on the Groq SDK
+
+Usage:
+    >>> backend = GroqBackend(api_key="offline", base_url="http://127.0.0.1:8001")
+    >>> detector = LeafDiseaseDetector(backend=backend)
+    >>> response = backend.complete(request, timeout=30.0)
+    >>> response.body.choices[0].message.content, response.headers
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping, Optional, Protocol, runtime_checkable
+
+from groq import AsyncGroq, Groq
+
+
+@dataclass
+class BackendResponse:
+    """
+    Answer of one backend call.
+
+    Attributes:
+        body (Any): Parsed chat completion, or for streamed calls an iterator
+            (async iterator for the coroutine variant) of completion chunks
+            that has a close() method
+        headers (Mapping[str, str]): Response headers, including any
+            x-ratelimit-* and Retry-After information
+    """
+    body: Any
+    headers: Mapping[str, str] = field(default_factory=dict)
+
+
+@runtime_checkable
+class InferenceBackend(Protocol):
+    """
+    Sends chat completion requests on behalf of the detector.
+
+    request is the keyword arguments of an OpenAI-style
+    chat.completions.create() call, as built by the detector.
+
+    Attributes:
+        name (str): Label of the backend in logs and statistics
+    """
+
+    name: str
+
+    def complete(self, request: Dict, timeout: Optional[float]) -> BackendResponse:
+        """Send a request and wait for the whole completion"""
+        ...
+
+    async def complete_async(self, request: Dict,
+                             timeout: Optional[float]) -> BackendResponse:
+        """Coroutine counterpart of complete()"""
+        ...
+
+    def stream(self, request: Dict, timeout: Optional[float]) -> BackendResponse:
+        """Send a request and return once the chunk stream is open"""
+        ...
+
+    async def stream_async(self, request: Dict,
+                           timeout: Optional[float]) -> BackendResponse:
+        """Coroutine counterpart of stream()"""
+        ...
+
+    async def probe_async(self):
+        """Make a cheap call that opens the connection pool, raising on failure"""
+        ...
+
+    async def aclose(self):
+        """Release the connections held by the backend"""
+        ...
+
+
+class GroqBackend:
+    """
+    Backend built on the Groq SDK.
+
+    The SDK's own retries are disabled; retries are handled by the
+    detector's retry policy, within the caller's deadline.
+
+    Attributes:
+        name (str): Label of the backend, "groq" unless given
+        client (Groq): Blocking SDK client
+        async_client (AsyncGroq): Asynchronous SDK client
+    """
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 name: str = "groq"):
+        """
+        Create the SDK clients.
+
+        Args:
+            api_key (str): Groq API key (any value for the offline stand-in)
+            base_url (Optional[str]): Server to talk to instead of the Groq
+                API, e.g. http://127.0.0.1:8001 for the stand-in server.
+                If None, GROQ_BASE_URL or the public API is used.
+            name (str): Label of the backend in logs and statistics
+        """
+        self.name = name
+        self.client = Groq(api_key=api_key, base_url=base_url, max_retries=0)
+        self.async_client = AsyncGroq(api_key=api_key, base_url=base_url,
+                                      max_retries=0)
+
+    def complete(self, request: Dict, timeout: Optional[float]) -> BackendResponse:
+        raw = self.client.chat.completions.with_raw_response.create(
+            **request, timeout=timeout)
+        return BackendResponse(raw.parse(), raw.headers)
+
+    async def complete_async(self, request: Dict,
+                             timeout: Optional[float]) -> BackendResponse:
+        raw = await self.async_client.chat.completions.with_raw_response.create(
+            **request, timeout=timeout)
+        return BackendResponse(await raw.parse(), raw.headers)
+
+    def stream(self, request: Dict, timeout: Optional[float]) -> BackendResponse:
+        return self.complete(dict(request, stream=True), timeout)
+
+    async def stream_async(self, request: Dict,
+                           timeout: Optional[float]) -> BackendResponse:
+        return await self.complete_async(dict(request, stream=True), timeout)
+
+    async def probe_async(self):
+        await self.async_client.models.list()
+
+    async def aclose(self):
+        await self.async_client.close()
+        self.client.close()
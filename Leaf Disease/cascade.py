@@ -0,0 +1,142 @@
+"""
+Two-tier model cascade for the Leaf Disease Detection System.
+
+Most leaves are easy cases that a smaller, faster vision model diagnoses as
+well as a large one. The cascade sends every image to the fast model first
+and re-runs it on the strong model only when the first answer is not good
+enough: its confidence is below a threshold, the disease type is unknown,
+the answer was cut off, or it could not be parsed at all. Mean latency and
+cost then follow the fast model while hard cases still get the strong one.
+
+Classes:
+    CascadeStats: Snapshot of escalation counters and per-tier latency
+    CascadePolicy: Tier models, escalation rule and counters
+
+Usage:
+    >>> cascade = CascadePolicy(fast_model="meta-llama/llama-4-scout-17b-16e-instruct",
+    ...                         strong_model="meta-llama/llama-4-maverick-17b-128e-instruct",
+    ...                         min_confidence=70)
+    >>> reason = cascade.escalation_reason(result)   # None keeps the fast answer
+    >>> cascade.stats().escalation_rate
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+FAST = "fast"
+STRONG = "strong"
+
+
+@dataclass
+class CascadeStats:
+    """
+    Snapshot of cascade counters.
+
+    Attributes:
+        requests (int): Analyses that went through the cascade
+        escalations (int): Analyses re-run on the strong model
+        escalation_rate (float): escalations / requests
+        reasons (Dict[str, int]): Escalations per reason
+        fallbacks (int): Escalations that failed, answered by the fast model
+        fast_mean_ms (float): Mean latency of the fast tier
+        strong_mean_ms (float): Mean latency of the strong tier
+    """
+    requests: int
+    escalations: int
+    escalation_rate: float
+    reasons: Dict[str, int] = field(default_factory=dict)
+    fallbacks: int = 0
+    fast_mean_ms: float = 0.0
+    strong_mean_ms: float = 0.0
+
+
+class CascadePolicy:
+    """
+    Decide when an answer of the fast model is escalated to the strong one.
+
+    Attributes:
+        fast_model (str): Model asked first
+        strong_model (str): Model asked when the fast answer is escalated
+        min_confidence (float): Confidence (0-100) below which to escalate
+    """
+
+    def __init__(self, fast_model: str, strong_model: str,
+                 min_confidence: float = 70.0):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._escalations = 0
+        self._reasons: Dict[str, int] = {}
+        self._fallbacks = 0
+        self._latency_ms = {FAST: 0.0, STRONG: 0.0}
+        self._latency_calls = {FAST: 0, STRONG: 0}
+
+    @property
+    def signature(self) -> str:
+        """Identity of the cascade for cache keys, changed by any setting"""
+        return f"{self.fast_model}>{self.strong_model}@{self.min_confidence:g}"
+
+    def escalation_reason(self, result: Optional[Dict]) -> Optional[str]:
+        """
+        Decide whether a fast-tier result needs the strong model.
+
+        Args:
+            result (Optional[Dict]): Parsed fast-tier result, None if the
+                answer could not be parsed
+
+        Returns:
+            Optional[str]: parse_failed, truncated, unknown or low_confidence,
+                or None to keep the fast answer
+        """
+        if result is None:
+            return "parse_failed"
+        if result.get("truncated"):
+            return "truncated"
+        if result.get("disease_type", "unknown") in ("unknown", ""):
+            return "unknown"
+        if float(result.get("confidence") or 0) < self.min_confidence:
+            return "low_confidence"
+        return None
+
+    def record(self, tier: str, seconds: float):
+        """Record the latency of one tier of an analysis"""
+        with self._lock:
+            if tier == FAST:
+                self._requests += 1
+            self._latency_ms[tier] += seconds * 1000
+            self._latency_calls[tier] += 1
+
+    def record_escalation(self, reason: str):
+        """Count an analysis escalated to the strong model"""
+        with self._lock:
+            self._escalations += 1
+            self._reasons[reason] = self._reasons.get(reason, 0) + 1
+
+    def record_fallback(self):
+        """Count an escalation that failed and fell back to the fast answer"""
+        with self._lock:
+            self._fallbacks += 1
+
+    def stats(self) -> CascadeStats:
+        """
+        Return a snapshot of the cascade counters.
+
+        Returns:
+            CascadeStats: Escalation rate, reasons and per-tier latency
+        """
+        with self._lock:
+            means = {tier: round(self._latency_ms[tier] / self._latency_calls[tier], 1)
+                     if self._latency_calls[tier] else 0.0
+                     for tier in (FAST, STRONG)}
+            return CascadeStats(
+                requests=self._requests,
+                escalations=self._escalations,
+                escalation_rate=round(self._escalations / self._requests, 4)
+                if self._requests else 0.0,
+                reasons=dict(self._reasons),
+                fallbacks=self._fallbacks,
+                fast_mean_ms=means[FAST],
+                strong_mean_ms=means[STRONG])
@@ -0,0 +1,257 @@
+"""
+Circuit breaker for upstream calls in the Leaf Disease Detection System.
+
+During an upstream outage every analysis would otherwise wait for its own
+timeout or error before failing, tying up workers and the caller's patience.
+The breaker watches the outcome and latency of recent calls and, once too
+many fail or are too slow, fails new calls immediately for a cool-down
+period. After the cool-down a few probe calls are let through; if they
+succeed the breaker closes again, otherwise it reopens.
+
+States:
+    closed: Calls flow normally while outcomes are recorded
+    open: Calls fail fast with CircuitOpenError until open_seconds pass
+    half_open: Up to half_open_probes probe calls decide whether to close
+
+Classes:
+    CircuitOpenError: Raised instead of calling upstream while open
+    BreakerTicket: Permission for one call, passed back with its outcome
+    BreakerStats: Snapshot of breaker state and counters
+    CircuitBreaker: Thread-safe breaker with error-rate and latency thresholds
+
+Usage:
+    >>> breaker = CircuitBreaker(failure_rate=0.5, slow_call_seconds=10.0)
+    >>> ticket = breaker.before_call()   # raises CircuitOpenError while open
+    >>> breaker.record(ticket, success=True, latency=2.4)
+"""
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling upstream while the circuit is open.
+
+    Attributes:
+        retry_after (float): Seconds until the breaker lets calls through again
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class BreakerTicket:
+    """
+    Permission for one upstream call.
+
+    Attributes:
+        generation (int): Breaker generation the call was admitted in;
+            outcomes from earlier generations are ignored
+        probe (bool): True if the call is a half-open probe
+    """
+    generation: int
+    probe: bool = False
+
+
+@dataclass
+class BreakerStats:
+    """
+    Snapshot of breaker state and counters.
+
+    Attributes:
+        state (str): closed, open or half_open
+        failure_rate (float): Share of failed calls in the window
+        slow_call_rate (float): Share of slow calls in the window
+        window_calls (int): Calls currently in the window
+        opened (int): Times the breaker opened
+        rejected (int): Calls failed fast without reaching upstream
+        retry_after (float): Seconds until calls are let through again
+    """
+    state: str
+    failure_rate: float
+    slow_call_rate: float
+    window_calls: int
+    opened: int
+    rejected: int
+    retry_after: float
+
+
+class CircuitBreaker:
+    """
+    Fail fast when recent upstream calls mostly fail or are too slow.
+
+    Outcomes are kept in a count-based sliding window. The breaker opens when
+    the window holds at least min_calls outcomes and either the failure rate
+    reaches failure_rate or the share of calls slower than slow_call_seconds
+    reaches slow_call_rate. Calls whose outcome says nothing about upstream
+    health (client errors, cancellations) are recorded with success=None and
+    do not count.
+
+    Attributes:
+        failure_rate (float): Failure share that opens the breaker
+        slow_call_seconds (float): Latency above which a call counts as slow
+        slow_call_rate (float): Slow-call share that opens the breaker
+        window_size (int): Number of recent outcomes considered
+        min_calls (int): Outcomes required before the breaker may open
+        open_seconds (float): Cool-down before probes are sent
+        half_open_probes (int): Successful probes required to close
+    """
+
+    def __init__(self, failure_rate: float = 0.5,
+                 slow_call_seconds: float = 10.0, slow_call_rate: float = 0.5,
+                 window_size: int = 20, min_calls: int = 10,
+                 open_seconds: float = 30.0, half_open_probes: int = 2):
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._window: "deque[tuple]" = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._generation = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._opened = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the cool-down ends"""
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._state
+
+    def before_call(self) -> BreakerTicket:
+        """
+        Ask permission for one upstream call.
+
+        Returns:
+            BreakerTicket: Ticket to pass to record() with the call's outcome
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with all
+                probe slots taken
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            if self._state == CLOSED:
+                return BreakerTicket(self._generation)
+            if (self._state == HALF_OPEN
+                    and self._probes_in_flight < self.half_open_probes):
+                self._probes_in_flight += 1
+                return BreakerTicket(self._generation, probe=True)
+            self._rejected += 1
+            state, retry_after = self._state, self._retry_after(now)
+        raise CircuitOpenError(
+            f"Upstream circuit is {state}; failing fast, retry in "
+            f"{retry_after:.1f}s", retry_after)
+
+    def record(self, ticket: BreakerTicket, success: Optional[bool],
+               latency: float = 0.0):
+        """
+        Record the outcome of a call admitted by before_call().
+
+        Args:
+            ticket (BreakerTicket): Ticket returned by before_call()
+            success (Optional[bool]): True for success, False for an upstream
+                failure, None for outcomes that say nothing about upstream
+                health (the call is forgotten)
+            latency (float): Upstream latency of the call in seconds
+        """
+        now = time.monotonic()
+        with self._lock:
+            if ticket.generation != self._generation:
+                return
+            healthy = success and latency < self.slow_call_seconds
+            if ticket.probe:
+                self._probes_in_flight -= 1
+                if success is None:
+                    return
+                if not healthy:
+                    self._open(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._close()
+                return
+            if success is None or self._state != CLOSED:
+                return
+            self._window.append((not success, latency >= self.slow_call_seconds))
+            if len(self._window) >= self.min_calls:
+                failure_rate, slow_rate = self._rates()
+                if (failure_rate >= self.failure_rate
+                        or slow_rate >= self.slow_call_rate):
+                    self._open(now)
+
+    def stats(self) -> BreakerStats:
+        """
+        Return a snapshot of the breaker state and counters.
+
+        Returns:
+            BreakerStats: State, window rates and open/reject counters
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            failure_rate, slow_rate = self._rates()
+            return BreakerStats(
+                state=self._state,
+                failure_rate=round(failure_rate, 4),
+                slow_call_rate=round(slow_rate, 4),
+                window_calls=len(self._window),
+                opened=self._opened,
+                rejected=self._rejected,
+                retry_after=round(self._retry_after(now), 3))
+
+    def _rates(self):
+        """Failure and slow-call shares of the window (lock held)"""
+        if not self._window:
+            return 0.0, 0.0
+        failures = sum(1 for failed, _ in self._window if failed)
+        slow = sum(1 for _, is_slow in self._window if is_slow)
+        return failures / len(self._window), slow / len(self._window)
+
+    def _retry_after(self, now: float) -> float:
+        """Seconds until calls are admitted again (lock held)"""
+        if self._state == OPEN:
+            return max(0.0, self._opened_at + self.open_seconds - now)
+        if self._state == HALF_OPEN:
+            return 1.0
+        return 0.0
+
+    def _advance(self, now: float):
+        """Move from open to half-open once the cool-down has passed (lock held)"""
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._generation += 1
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+    def _open(self, now: float):
+        """Trip the breaker (lock held)"""
+        self._state = OPEN
+        self._generation += 1
+        self._opened_at = now
+        self._opened += 1
+        self._window.clear()
+
+    def _close(self):
+        """Resume normal operation after successful probes (lock held)"""
+        self._state = CLOSED
+        self._generation += 1
+        self._window.clear()
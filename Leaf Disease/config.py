@@ -35,12 +35,87 @@ class AppConfig:
 
     Attributes:
         groq_api_key (str): API key for Groq AI services (required)
+        groq_base_url (Optional[str]): Server speaking the Groq API instead of
+            the public API, e.g. the offline stand-in server
+        backend_pool (Optional[str]): Comma-separated API keys, each
+            optionally followed by @base_url, to route calls across instead
+            of groq_api_key alone
+        pool_eject_after (int): Consecutive failures that take a pool member
+            out of rotation
+        pool_eject_seconds (float): Time an ejected pool member waits before
+            it is probed
         model_name (str): Name of the AI model to use for analysis
         model_temperature (float): Temperature parameter for model response generation
         max_completion_tokens (int): Maximum tokens allowed in model responses
+        prompt_id (str): Versioned analysis prompt, see prompts.PROMPTS
+        output_mode (Optional[str]): Provider-side output constraint overriding
+            the prompt's own: text, json_object or json_schema
         log_level (str): Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         log_file (str): Path to the log file for application logging
         supported_formats (tuple): Tuple of supported image file extensions
+        result_store_path (Optional[str]): SQLite file for the persistent result
+            cache shared by worker processes; disabled when None
+        result_store_ttl_seconds (float): Lifetime of persisted results in seconds
+        result_store_max_bytes (int): Size cap of the persistent result cache
+        near_duplicate_enabled (bool): Reuse results of perceptually similar
+            images (resized, recompressed or lightly cropped uploads)
+        near_duplicate_max_distance (int): Largest perceptual-hash Hamming
+            distance treated as the same image
+        near_duplicate_max_entries (int): Maximum number of indexed results
+        preprocess_max_side (int): Longest image side sent upstream, in pixels
+        preprocess_quality (int): Encoder quality for the upstream image (1-100)
+        preprocess_format (str): Upstream image format, JPEG or WEBP
+        leaf_crop_enabled (bool): Crop images to the leaf region before encoding
+        leaf_crop_margin (float): Padding around the leaf crop as a fraction
+            of the leaf bounding box
+        vegetation_threshold (float): Excess-green index above which a pixel
+            counts as vegetation
+        plant_filter_enabled (bool): Reject non-plant images locally
+        min_plant_score (float): Plant score below which an image is rejected
+        quality_gate_enabled (bool): Reject blurry or badly exposed images locally
+        min_sharpness (float): Laplacian variance below which an image is blurry
+        max_dark_fraction (float): Largest tolerated share of nearly black pixels
+        max_bright_fraction (float): Largest tolerated share of nearly white pixels
+        min_resolution (int): Smallest tolerated short side of an upload in pixels
+        batch_max_concurrency (int): Default number of images analysed in
+            parallel by batch analysis
+        rate_limit_requests_per_minute (float): Upstream request budget per
+            API key
+        rate_limit_tokens_per_minute (float): Upstream token budget per API
+            key, replaced by the provider's limit once reported in response
+            headers
+        upstream_initial_concurrency (int): Starting AIMD concurrency limit
+        upstream_max_concurrency (int): Upper bound of the AIMD concurrency
+            limit per API key
+        max_queue_wait_seconds (float): Longest wait for upstream capacity
+            before a call fails
+        request_timeout_seconds (float): Overall deadline of one analysis,
+            covering every attempt and the backoff between them
+        retry_max_attempts (int): Upstream attempts per analysis, including the first
+        retry_base_delay (float): Backoff ceiling of the first retry in seconds
+        retry_max_delay (float): Largest backoff ceiling in seconds
+        hedging_enabled (bool): Send a backup call when an async upstream call
+            is slower than hedge_percentile of recent calls
+        hedge_percentile (float): Latency percentile after which to hedge
+        hedge_budget (float): Extra upstream calls allowed for hedging, as a
+            fraction of all calls
+        breaker_failure_rate (float): Share of failed recent calls that opens
+            the circuit breaker
+        breaker_slow_call_seconds (float): Latency above which a call is slow
+        breaker_slow_call_rate (float): Share of slow recent calls that opens
+            the circuit breaker
+        breaker_open_seconds (float): Time the breaker fails fast before probing
+        cascade_enabled (bool): Ask cascade_fast_model first and re-run only
+            uncertain answers on cascade_strong_model
+        cascade_fast_model (str): Cheaper, faster first-tier model
+        cascade_strong_model (str): Second-tier model for escalated answers
+        cascade_min_confidence (float): Confidence (0-100) below which a
+            first-tier answer is escalated
+        resolution_escalation_enabled (bool): Send a small preview rendition
+            first and the full image only for uncertain answers
+        preview_max_side (int): Longest side of the preview rendition in pixels
+        preview_min_confidence (float): Confidence (0-100) below which a
+            preview answer is resent at full resolution
 
     Example:
         >>> # Create config from environment variables
@@ -56,10 +131,16 @@ class AppConfig:
 
     # API Configuration
     groq_api_key: str  # Required API key for Groq AI services
+    groq_base_url: Optional[str] = None  # Public Groq API
+    backend_pool: Optional[str] = None  # Single key, no routing
+    pool_eject_after: int = 3  # Failures in a row before ejection
+    pool_eject_seconds: float = 30.0  # Ejection time before a probe
     model_name: str = "meta-llama/llama-4-scout-17b-16e-instruct"  # AI model identifier
     # Controls randomness in model responses (0.0-2.0)
     model_temperature: float = 0.3
     max_completion_tokens: int = 1024  # Maximum tokens in model responses
+    prompt_id: str = "leaf-v1"  # Original prompt; leaf-json-v2 is compact JSON mode
+    output_mode: Optional[str] = None  # Use the prompt's output mode
 
     # Logging Configuration
     log_level: str = "INFO"  # Logging verbosity level
@@ -69,6 +150,69 @@ class AppConfig:
     # Supported image formats
     supported_formats: tuple = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
 
+    # Result Cache Configuration
+    result_store_path: Optional[str] = None  # Persistent cache database file
+    result_store_ttl_seconds: float = 7 * 24 * 3600  # One week
+    result_store_max_bytes: int = 256 * 1024 * 1024  # 256 MB
+    near_duplicate_enabled: bool = False  # Opt-in, exact matches only otherwise
+    near_duplicate_max_distance: int = 6  # Out of 64 hash bits
+    near_duplicate_max_entries: int = 10000  # Bounded in-memory index
+
+    # Image Preprocessing Configuration
+    preprocess_max_side: int = 1024  # Longest side after downscaling
+    preprocess_quality: int = 85  # JPEG/WebP encoder quality
+    preprocess_format: str = "JPEG"  # Encoding used for the upstream call
+    leaf_crop_enabled: bool = True  # Crop to the dominant vegetation region
+    leaf_crop_margin: float = 0.1  # Keep lesions on the leaf edge
+    vegetation_threshold: float = 0.1  # Excess-green cut-off
+
+    # Local Image Gate Configuration
+    plant_filter_enabled: bool = True  # Skip the API for obvious non-plants
+    min_plant_score: float = 0.05  # Fraction of plant-coloured pixels required
+    quality_gate_enabled: bool = True  # Skip the API for unusable photos
+    min_sharpness: float = 20.0  # Laplacian variance at 512 px
+    max_dark_fraction: float = 0.7  # Underexposure limit
+    max_bright_fraction: float = 0.6  # Overexposure limit
+    min_resolution: int = 224  # Minimum short side in pixels
+
+    # Batch Analysis Configuration
+    batch_max_concurrency: int = 8  # Upstream calls in flight per batch
+
+    # Upstream Scheduler Configuration
+    rate_limit_requests_per_minute: float = 30  # Groq free tier RPM
+    rate_limit_tokens_per_minute: float = 30000  # Groq free tier TPM
+    upstream_initial_concurrency: int = 4  # Starting concurrency limit
+    upstream_max_concurrency: int = 16  # Ceiling for additive increase
+    max_queue_wait_seconds: float = 30.0  # Queue instead of failing fast
+
+    # Retry Configuration
+    request_timeout_seconds: float = 60.0  # Overall deadline per analysis
+    retry_max_attempts: int = 3  # Only 429, 5xx and connection errors retry
+    retry_base_delay: float = 0.5  # Full-jitter backoff starts here
+    retry_max_delay: float = 8.0  # Backoff ceiling
+
+    # Hedged Request Configuration
+    hedging_enabled: bool = False  # Opt-in, costs extra upstream calls
+    hedge_percentile: float = 0.9  # Hedge calls slower than p90
+    hedge_budget: float = 0.05  # At most 5% extra calls
+
+    # Circuit Breaker Configuration
+    breaker_failure_rate: float = 0.5  # Open when half the calls fail
+    breaker_slow_call_seconds: float = 10.0  # Slow-call latency threshold
+    breaker_slow_call_rate: float = 0.5  # Open when half the calls are slow
+    breaker_open_seconds: float = 30.0  # Fail fast this long before probing
+
+    # Model Cascade Configuration
+    cascade_enabled: bool = False  # Opt-in, model_name is used otherwise
+    cascade_fast_model: str = "meta-llama/llama-4-scout-17b-16e-instruct"  # First tier
+    cascade_strong_model: str = "meta-llama/llama-4-maverick-17b-128e-instruct"  # Second tier
+    cascade_min_confidence: float = 70.0  # Escalate less confident answers
+
+    # Resolution Escalation Configuration
+    resolution_escalation_enabled: bool = False  # Opt-in, one pass otherwise
+    preview_max_side: int = 384  # Thumbnail for the first pass
+    preview_min_confidence: float = 70.0  # Resend less confident answers
+
     @classmethod
     def from_env(cls) -> 'AppConfig':
         """
@@ -80,11 +224,60 @@ class AppConfig:
 
         Environment Variables:
             GROQ_API_KEY (required): API key for Groq AI services
+            GROQ_BASE_URL (optional): Talk to another server, e.g. the stand-in
+            BACKEND_POOL (optional): Route across "key1,key2@url,..." instead
+            POOL_EJECT_AFTER (optional): Override the pool ejection threshold
+            POOL_EJECT_SECONDS (optional): Override the pool ejection time
             MODEL_NAME (optional): Override default AI model name
             MODEL_TEMPERATURE (optional): Override default model temperature
             MAX_COMPLETION_TOKENS (optional): Override default max tokens
+            PROMPT_ID (optional): Select the prompt version, e.g. leaf-json-v2
+            OUTPUT_MODE (optional): Override the prompt's output constraint
             LOG_LEVEL (optional): Override default logging level
             LOG_FILE (optional): Override default log file path
+            RESULT_STORE_PATH (optional): Enable the persistent result cache
+            RESULT_STORE_TTL_SECONDS (optional): Override persisted result lifetime
+            RESULT_STORE_MAX_BYTES (optional): Override persistent cache size cap
+            NEAR_DUPLICATE_ENABLED (optional): "true" reuses near-duplicate results
+            NEAR_DUPLICATE_MAX_DISTANCE (optional): Override the hash distance
+            NEAR_DUPLICATE_MAX_ENTRIES (optional): Override the index size
+            PREPROCESS_MAX_SIDE (optional): Override longest image side
+            PREPROCESS_QUALITY (optional): Override encoder quality
+            PREPROCESS_FORMAT (optional): Override upstream image format
+            LEAF_CROP_ENABLED (optional): "false" disables leaf-region cropping
+            LEAF_CROP_MARGIN (optional): Override leaf crop margin
+            VEGETATION_THRESHOLD (optional): Override excess-green cut-off
+            PLANT_FILTER_ENABLED (optional): "false" disables the non-plant filter
+            MIN_PLANT_SCORE (optional): Override the non-plant filter threshold
+            QUALITY_GATE_ENABLED (optional): "false" disables the quality gate
+            MIN_SHARPNESS (optional): Override the blur threshold
+            MAX_DARK_FRACTION (optional): Override the underexposure limit
+            MAX_BRIGHT_FRACTION (optional): Override the overexposure limit
+            MIN_RESOLUTION (optional): Override the minimum short side
+            BATCH_MAX_CONCURRENCY (optional): Override batch concurrency
+            RATE_LIMIT_RPM (optional): Override the upstream request budget
+            RATE_LIMIT_TPM (optional): Override the upstream token budget
+            UPSTREAM_INITIAL_CONCURRENCY (optional): Override the starting limit
+            UPSTREAM_MAX_CONCURRENCY (optional): Override the concurrency ceiling
+            MAX_QUEUE_WAIT_SECONDS (optional): Override the queue wait bound
+            REQUEST_TIMEOUT_SECONDS (optional): Override the analysis deadline
+            RETRY_MAX_ATTEMPTS (optional): Override the upstream attempt budget
+            RETRY_BASE_DELAY (optional): Override the first backoff ceiling
+            RETRY_MAX_DELAY (optional): Override the largest backoff ceiling
+            HEDGING_ENABLED (optional): "true" enables hedged requests
+            HEDGE_PERCENTILE (optional): Override the hedge latency percentile
+            HEDGE_BUDGET (optional): Override the hedge budget fraction
+            BREAKER_FAILURE_RATE (optional): Override the breaker error-rate threshold
+            BREAKER_SLOW_CALL_SECONDS (optional): Override the slow-call latency
+            BREAKER_SLOW_CALL_RATE (optional): Override the slow-call threshold
+            BREAKER_OPEN_SECONDS (optional): Override the breaker cool-down
+            CASCADE_ENABLED (optional): "true" enables the two-tier model cascade
+            CASCADE_FAST_MODEL (optional): Override the first-tier model
+            CASCADE_STRONG_MODEL (optional): Override the second-tier model
+            CASCADE_MIN_CONFIDENCE (optional): Override the escalation threshold
+            RESOLUTION_ESCALATION_ENABLED (optional): "true" enables preview passes
+            PREVIEW_MAX_SIDE (optional): Override the preview rendition size
+            PREVIEW_MIN_CONFIDENCE (optional): Override the preview threshold
 
         Returns:
             AppConfig: Configured instance with values from environment variables
@@ -105,11 +298,110 @@ class AppConfig:
 
         return cls(
             groq_api_key=groq_api_key,
+            groq_base_url=os.getenv("GROQ_BASE_URL", cls.groq_base_url),
+            backend_pool=os.getenv("BACKEND_POOL", cls.backend_pool),
+            pool_eject_after=int(
+                os.getenv("POOL_EJECT_AFTER", cls.pool_eject_after)),
+            pool_eject_seconds=float(
+                os.getenv("POOL_EJECT_SECONDS", cls.pool_eject_seconds)),
             model_name=os.getenv("MODEL_NAME", cls.model_name),
             model_temperature=float(
                 os.getenv("MODEL_TEMPERATURE", cls.model_temperature)),
             max_completion_tokens=int(
                 os.getenv("MAX_COMPLETION_TOKENS", cls.max_completion_tokens)),
+            prompt_id=os.getenv("PROMPT_ID", cls.prompt_id),
+            output_mode=os.getenv("OUTPUT_MODE", cls.output_mode),
             log_level=os.getenv("LOG_LEVEL", cls.log_level),
-            log_file=os.getenv("LOG_FILE", cls.log_file)
+            log_file=os.getenv("LOG_FILE", cls.log_file),
+            result_store_path=os.getenv(
+                "RESULT_STORE_PATH", cls.result_store_path),
+            result_store_ttl_seconds=float(
+                os.getenv("RESULT_STORE_TTL_SECONDS", cls.result_store_ttl_seconds)),
+            result_store_max_bytes=int(
+                os.getenv("RESULT_STORE_MAX_BYTES", cls.result_store_max_bytes)),
+            near_duplicate_enabled=os.getenv(
+                "NEAR_DUPLICATE_ENABLED",
+                str(cls.near_duplicate_enabled)).lower() == "true",
+            near_duplicate_max_distance=int(
+                os.getenv("NEAR_DUPLICATE_MAX_DISTANCE",
+                          cls.near_duplicate_max_distance)),
+            near_duplicate_max_entries=int(
+                os.getenv("NEAR_DUPLICATE_MAX_ENTRIES",
+                          cls.near_duplicate_max_entries)),
+            preprocess_max_side=int(
+                os.getenv("PREPROCESS_MAX_SIDE", cls.preprocess_max_side)),
+            preprocess_quality=int(
+                os.getenv("PREPROCESS_QUALITY", cls.preprocess_quality)),
+            preprocess_format=os.getenv(
+                "PREPROCESS_FORMAT", cls.preprocess_format),
+            leaf_crop_enabled=os.getenv(
+                "LEAF_CROP_ENABLED", str(cls.leaf_crop_enabled)).lower() == "true",
+            leaf_crop_margin=float(
+                os.getenv("LEAF_CROP_MARGIN", cls.leaf_crop_margin)),
+            vegetation_threshold=float(
+                os.getenv("VEGETATION_THRESHOLD", cls.vegetation_threshold)),
+            plant_filter_enabled=os.getenv(
+                "PLANT_FILTER_ENABLED", str(cls.plant_filter_enabled)).lower() == "true",
+            min_plant_score=float(
+                os.getenv("MIN_PLANT_SCORE", cls.min_plant_score)),
+            quality_gate_enabled=os.getenv(
+                "QUALITY_GATE_ENABLED", str(cls.quality_gate_enabled)).lower() == "true",
+            min_sharpness=float(
+                os.getenv("MIN_SHARPNESS", cls.min_sharpness)),
+            max_dark_fraction=float(
+                os.getenv("MAX_DARK_FRACTION", cls.max_dark_fraction)),
+            max_bright_fraction=float(
+                os.getenv("MAX_BRIGHT_FRACTION", cls.max_bright_fraction)),
+            min_resolution=int(
+                os.getenv("MIN_RESOLUTION", cls.min_resolution)),
+            batch_max_concurrency=int(
+                os.getenv("BATCH_MAX_CONCURRENCY", cls.batch_max_concurrency)),
+            rate_limit_requests_per_minute=float(
+                os.getenv("RATE_LIMIT_RPM", cls.rate_limit_requests_per_minute)),
+            rate_limit_tokens_per_minute=float(
+                os.getenv("RATE_LIMIT_TPM", cls.rate_limit_tokens_per_minute)),
+            upstream_initial_concurrency=int(
+                os.getenv("UPSTREAM_INITIAL_CONCURRENCY",
+                          cls.upstream_initial_concurrency)),
+            upstream_max_concurrency=int(
+                os.getenv("UPSTREAM_MAX_CONCURRENCY", cls.upstream_max_concurrency)),
+            max_queue_wait_seconds=float(
+                os.getenv("MAX_QUEUE_WAIT_SECONDS", cls.max_queue_wait_seconds)),
+            request_timeout_seconds=float(
+                os.getenv("REQUEST_TIMEOUT_SECONDS", cls.request_timeout_seconds)),
+            retry_max_attempts=int(
+                os.getenv("RETRY_MAX_ATTEMPTS", cls.retry_max_attempts)),
+            retry_base_delay=float(
+                os.getenv("RETRY_BASE_DELAY", cls.retry_base_delay)),
+            retry_max_delay=float(
+                os.getenv("RETRY_MAX_DELAY", cls.retry_max_delay)),
+            hedging_enabled=os.getenv(
+                "HEDGING_ENABLED", str(cls.hedging_enabled)).lower() == "true",
+            hedge_percentile=float(
+                os.getenv("HEDGE_PERCENTILE", cls.hedge_percentile)),
+            hedge_budget=float(
+                os.getenv("HEDGE_BUDGET", cls.hedge_budget)),
+            breaker_failure_rate=float(
+                os.getenv("BREAKER_FAILURE_RATE", cls.breaker_failure_rate)),
+            breaker_slow_call_seconds=float(
+                os.getenv("BREAKER_SLOW_CALL_SECONDS", cls.breaker_slow_call_seconds)),
+            breaker_slow_call_rate=float(
+                os.getenv("BREAKER_SLOW_CALL_RATE", cls.breaker_slow_call_rate)),
+            breaker_open_seconds=float(
+                os.getenv("BREAKER_OPEN_SECONDS", cls.breaker_open_seconds)),
+            cascade_enabled=os.getenv(
+                "CASCADE_ENABLED", str(cls.cascade_enabled)).lower() == "true",
+            cascade_fast_model=os.getenv(
+                "CASCADE_FAST_MODEL", cls.cascade_fast_model),
+            cascade_strong_model=os.getenv(
+                "CASCADE_STRONG_MODEL", cls.cascade_strong_model),
+            cascade_min_confidence=float(
+                os.getenv("CASCADE_MIN_CONFIDENCE", cls.cascade_min_confidence)),
+            resolution_escalation_enabled=os.getenv(
+                "RESOLUTION_ESCALATION_ENABLED",
+                str(cls.resolution_escalation_enabled)).lower() == "true",
+            preview_max_side=int(
+                os.getenv("PREVIEW_MAX_SIDE", cls.preview_max_side)),
+            preview_min_confidence=float(
+                os.getenv("PREVIEW_MIN_CONFIDENCE", cls.preview_min_confidence))
         )
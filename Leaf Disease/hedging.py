@@ -0,0 +1,220 @@
+"""
+Hedged upstream requests for the Leaf Disease Detection System.
+
+Most vision-model calls finish in a few seconds, but a few percent take
+several times longer for reasons unrelated to the image (a slow replica, a
+congested connection). Hedging cuts that tail: when a call has not returned
+by a high percentile of recent latency, an identical backup call is sent,
+the first response wins and the other call is cancelled.
+
+Hedges cost extra upstream calls, so they are paid for from a budget that
+grows by a fixed fraction of every primary call (5% by default). When the
+budget is empty, slow calls simply run to completion.
+
+Classes:
+    LatencyTracker: Sliding window of recent latencies with percentiles
+    HedgeStats: Snapshot of hedging counters
+    HedgePolicy: Decide when to hedge and race the calls
+
+Usage:
+    >>> policy = HedgePolicy(percentile=0.9, budget=0.05)
+    >>> completion = await policy.run_async(lambda: call_upstream())
+    >>> policy.stats().hedge_rate
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+
+class LatencyTracker:
+    """
+    Thread-safe sliding window of recent latencies.
+
+    Attributes:
+        window (int): Number of most recent samples kept
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        """Add one latency sample in seconds"""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """
+        Return a percentile of the recorded latencies.
+
+        Args:
+            fraction (float): Percentile as a fraction, e.g. 0.9 for p90
+
+        Returns:
+            Optional[float]: Latency in seconds, or None without samples
+        """
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(fraction * len(ordered)))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+@dataclass
+class HedgeStats:
+    """
+    Snapshot of hedging counters.
+
+    Attributes:
+        requests (int): Primary calls made through the policy
+        hedges (int): Backup calls sent
+        wins (int): Backup calls that answered first
+        skipped (int): Hedges not sent because the budget was empty
+        hedge_rate (float): hedges / requests
+        win_rate (float): wins / hedges
+        hedge_delay_ms (Optional[float]): Current hedge delay, None while
+            too few samples have been collected
+    """
+    requests: int
+    hedges: int
+    wins: int
+    skipped: int
+    hedge_rate: float
+    win_rate: float
+    hedge_delay_ms: Optional[float]
+
+
+class HedgePolicy:
+    """
+    Send a backup call when the primary is slower than recent calls.
+
+    The hedge delay is the configured percentile of recent latencies, but
+    never below min_delay. Latencies are recorded from the start of the
+    primary call to the first response, so a won hedge records a lower bound
+    of the primary's latency.
+
+    Attributes:
+        percentile (float): Latency percentile after which to hedge
+        budget (float): Hedges allowed per primary call, e.g. 0.05 for 5%
+        min_samples (int): Samples required before hedging starts
+        min_delay (float): Smallest hedge delay in seconds
+        max_burst (float): Largest number of hedges the budget can save up
+        latencies (LatencyTracker): Recent call latencies
+    """
+
+    def __init__(self, percentile: float = 0.9, budget: float = 0.05,
+                 min_samples: int = 20, min_delay: float = 0.5,
+                 max_burst: float = 10.0, window: int = 200):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_burst = max_burst
+        self.latencies = LatencyTracker(window)
+        self._credits = 0.0
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._hedges = 0
+        self._wins = 0
+        self._skipped = 0
+
+    def delay(self) -> Optional[float]:
+        """
+        Return how long to wait for the primary before hedging.
+
+        Returns:
+            Optional[float]: Delay in seconds, or None while too few
+                latencies have been recorded to hedge
+        """
+        if len(self.latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latencies.percentile(self.percentile))
+
+    async def run_async(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run call, racing a backup copy if the first one is slow.
+
+        Args:
+            call (Callable[[], Awaitable[Any]]): Creates one upstream call;
+                invoked a second time for the hedge
+
+        Returns:
+            Any: Result of whichever call succeeded first
+
+        Raises:
+            Exception: The primary's error if every call failed
+        """
+        started = time.monotonic()
+        with self._lock:
+            self._requests += 1
+            self._credits = min(self.max_burst, self._credits + self.budget)
+
+        primary = asyncio.ensure_future(call())
+        tasks = [primary]
+        try:
+            delay = self.delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self._spend():
+                    tasks.append(asyncio.ensure_future(call()))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in tasks if task in done
+                               and not task.cancelled()
+                               and task.exception() is None), None)
+                if winner is not None:
+                    self.latencies.record(time.monotonic() - started)
+                    if winner is not primary:
+                        with self._lock:
+                            self._wins += 1
+                    return winner.result()
+            # Every call failed; report the primary's error
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # Let cancelled calls release their resources before returning
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> HedgeStats:
+        """
+        Return a snapshot of the hedging counters.
+
+        Returns:
+            HedgeStats: Request, hedge and win counts with derived rates
+        """
+        delay = self.delay()
+        with self._lock:
+            return HedgeStats(
+                requests=self._requests,
+                hedges=self._hedges,
+                wins=self._wins,
+                skipped=self._skipped,
+                hedge_rate=round(self._hedges / self._requests, 4)
+                if self._requests else 0.0,
+                win_rate=round(self._wins / self._hedges, 4)
+                if self._hedges else 0.0,
+                hedge_delay_ms=None if delay is None else round(delay * 1000, 1))
+
+    def _spend(self) -> bool:
+        """Take one hedge from the budget, if available"""
+        with self._lock:
+            if self._credits >= 1.0:
+                self._credits -= 1.0
+                self._hedges += 1
+                return True
+            self._skipped += 1
+            return False
@@ -0,0 +1,383 @@
+"""
+Local image gates for the Leaf Disease Detection System.
+
+Every upstream analysis costs a vision-model round trip of several seconds.
+The gates in this module run on the preprocessed image in a few milliseconds
+and reject uploads that would only produce an "invalid_image" answer anyway,
+returning the same response shape the model would have produced together with
+a structured rejection reason.
+
+Classes:
+    GateRejection: Why an image was rejected locally
+    PlantFeatures: Colour features used by the plant filter
+    PlantFilter: Reject images that contain no plant material
+    QualityMetrics: Sharpness and exposure measurements
+    QualityGate: Reject blurry, badly exposed or tiny images
+
+Functions:
+    rejection_result: Build an invalid_image analysis result for a rejection
+
+Usage:
+    >>> quality_gate = QualityGate(min_sharpness=20.0)
+    >>> plant_filter = PlantFilter(min_plant_score=0.05)
+    >>> rejection = (quality_gate.check(image, original_size)
+    ...              or plant_filter.check(image))
+    >>> if rejection is not None:
+    ...     return rejection_result(rejection)
+"""
+
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from vegetation import vegetation_mask
+
+
+@dataclass
+class GateRejection:
+    """
+    Reason an image was rejected before the upstream call.
+
+    Attributes:
+        gate (str): Name of the gate that rejected the image
+        reason (str): Machine-readable reason code
+        message (str): Human-readable explanation
+        advice (List[str]): Steps the user can take to get a usable image
+        features (Dict[str, float]): Measured values behind the decision
+    """
+    gate: str
+    reason: str
+    message: str
+    advice: List[str]
+    features: Dict[str, float] = field(default_factory=dict)
+
+
+def rejection_result(rejection: GateRejection) -> Dict:
+    """
+    Build an invalid_image analysis result for a local rejection.
+
+    The result has the same fields as an upstream invalid_image answer, plus a
+    "rejection" entry describing which gate fired and why.
+
+    Args:
+        rejection (GateRejection): Rejection returned by a gate
+
+    Returns:
+        Dict: Analysis results as dictionary (JSON serializable)
+    """
+    return {
+        "disease_detected": False,
+        "disease_name": None,
+        "disease_type": "invalid_image",
+        "severity": "none",
+        "confidence": 0.0,
+        "symptoms": [rejection.message],
+        "possible_causes": ["Image rejected before analysis"],
+        "treatment": list(rejection.advice),
+        "analysis_timestamp": datetime.now().astimezone().isoformat(),
+        "rejection": {
+            "gate": rejection.gate,
+            "reason": rejection.reason,
+            "features": {name: round(float(value), 4)
+                         for name, value in rejection.features.items()},
+        },
+    }
+
+
+def _thumbnail(image: Image.Image, grid_size: int) -> Image.Image:
+    """Box-reduce an image to roughly grid_size pixels on its longest side"""
+    factor = max(1, max(image.size) // grid_size)
+    return image.reduce(factor) if factor > 1 else image
+
+
+@dataclass
+class PlantFeatures:
+    """
+    Colour features of an image used to decide whether it shows a plant.
+
+    Attributes:
+        vegetation_ratio (float): Fraction of pixels with high excess green
+        plant_hue_ratio (float): Fraction of saturated pixels with yellow to
+            green hues, which also covers chlorotic tissue
+        necrotic_ratio (float): Fraction of saturated, darker pixels with
+            brown to orange hues, as in blighted or necrotic tissue
+        hue_histogram (List[float]): Normalized 12-bin hue histogram of
+            saturated pixels
+    """
+    vegetation_ratio: float
+    plant_hue_ratio: float
+    necrotic_ratio: float
+    hue_histogram: List[float]
+
+    @property
+    def plant_score(self) -> float:
+        """Strongest of the plant indicators, in [0, 1]"""
+        return max(self.vegetation_ratio, self.plant_hue_ratio,
+                   self.necrotic_ratio)
+
+
+class PlantFilter:
+    """
+    Reject images without plant material before spending an API call.
+
+    Screenshots, documents and most selfies have almost no pixels with green
+    or yellow-green hues. Heavily blighted leaves may have none left either,
+    so saturated brown to orange pixels that are darker than typical skin
+    count as plant material too. The filter is deliberately conservative: it
+    only rejects when the excess-green, plant-hue and necrotic ratios all
+    fall below min_plant_score. Brown non-plant objects (wood, dark skin)
+    pass and are left to the model.
+
+    Attributes:
+        min_plant_score (float): Images scoring below this are rejected
+        vegetation_threshold (float): Excess-green cut-off for vegetation pixels
+        grid_size (int): Approximate longest side of the analysed thumbnail
+        checked (int): Images inspected
+        rejected (int): Images rejected, i.e. upstream calls saved
+    """
+
+    # PIL hue is scaled to 0-255; 45-170 degrees spans yellow-green to green
+    PLANT_HUE_RANGE = (32, 120)
+    MIN_SATURATION = 50
+    MIN_VALUE = 40
+    # 14-44 degrees: brown, rust and orange necrotic tissue. It needs more
+    # saturation and less brightness than plant hues to leave out pale skin.
+    NECROTIC_HUE_RANGE = (10, 31)
+    NECROTIC_MIN_SATURATION = 100
+    NECROTIC_MAX_VALUE = 180
+
+    def __init__(self, min_plant_score: float = 0.05,
+                 vegetation_threshold: float = 0.1, grid_size: int = 128):
+        self.min_plant_score = min_plant_score
+        self.vegetation_threshold = vegetation_threshold
+        self.grid_size = grid_size
+        self.checked = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def features(self, image: Image.Image) -> PlantFeatures:
+        """
+        Compute the colour features of an RGB image.
+
+        Args:
+            image (Image.Image): RGB image
+
+        Returns:
+            PlantFeatures: Vegetation, plant-hue and necrotic ratios and the
+                hue histogram
+        """
+        small = _thumbnail(image, self.grid_size)
+        rgb = np.asarray(small)
+        hsv = np.asarray(small.convert("HSV"))
+        hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+
+        colourful = (saturation >= self.MIN_SATURATION) & (value >= self.MIN_VALUE)
+        low, high = self.PLANT_HUE_RANGE
+        plant_hue = colourful & (hue >= low) & (hue <= high)
+        low, high = self.NECROTIC_HUE_RANGE
+        necrotic = (colourful & (hue >= low) & (hue <= high)
+                    & (saturation >= self.NECROTIC_MIN_SATURATION)
+                    & (value <= self.NECROTIC_MAX_VALUE))
+        histogram = np.bincount(hue[colourful].astype(np.int32) * 12 // 256,
+                                minlength=12).astype(np.float64)
+        if histogram.sum():
+            histogram /= histogram.sum()
+
+        return PlantFeatures(
+            vegetation_ratio=float(
+                vegetation_mask(rgb, self.vegetation_threshold).mean()),
+            plant_hue_ratio=float(plant_hue.mean()),
+            necrotic_ratio=float(necrotic.mean()),
+            hue_histogram=[round(float(bin_), 4) for bin_ in histogram])
+
+    def check(self, image: Image.Image) -> Optional[GateRejection]:
+        """
+        Decide whether an image is worth sending upstream.
+
+        Args:
+            image (Image.Image): RGB image
+
+        Returns:
+            Optional[GateRejection]: Rejection if the image shows no plant,
+                                     otherwise None
+        """
+        features = self.features(image)
+        rejected = features.plant_score < self.min_plant_score
+        with self._lock:
+            self.checked += 1
+            if rejected:
+                self.rejected += 1
+        if not rejected:
+            return None
+        return GateRejection(
+            gate="plant_filter",
+            reason="no_plant_detected",
+            message="This image does not contain a plant leaf",
+            advice=["Please upload an image of a plant leaf for disease analysis"],
+            features={"vegetation_ratio": features.vegetation_ratio,
+                      "plant_hue_ratio": features.plant_hue_ratio,
+                      "necrotic_ratio": features.necrotic_ratio,
+                      "plant_score": features.plant_score})
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the filter counters.
+
+        Returns:
+            Dict[str, int]: Images checked and rejected (calls saved)
+        """
+        with self._lock:
+            return {"checked": self.checked, "rejected": self.rejected}
+
+
+@dataclass
+class QualityMetrics:
+    """
+    Sharpness and exposure measurements of an image.
+
+    Attributes:
+        sharpness (float): Variance of the Laplacian of the luminance
+        mean_luminance (float): Average luminance in [0, 255]
+        dark_fraction (float): Fraction of nearly black pixels
+        bright_fraction (float): Fraction of nearly white pixels
+    """
+    sharpness: float
+    mean_luminance: float
+    dark_fraction: float
+    bright_fraction: float
+
+
+class QualityGate:
+    """
+    Reject images too blurry, too dark, too bright or too small to diagnose.
+
+    Sharpness is the variance of a 4-neighbour Laplacian computed on the
+    luminance downscaled to analysis_size, so the threshold does not depend
+    on the upload resolution. Exposure is judged from the share of clipped
+    pixels in the luminance histogram.
+
+    Attributes:
+        min_sharpness (float): Laplacian variance below which an image is blurry
+        max_dark_fraction (float): Largest tolerated share of nearly black pixels
+        max_bright_fraction (float): Largest tolerated share of nearly white pixels
+        min_resolution (int): Smallest tolerated short side of the upload in pixels
+        analysis_size (int): Approximate longest side used for the measurements
+        checked (int): Images inspected
+        rejected (int): Images rejected, i.e. upstream calls saved
+    """
+
+    DARK_LEVEL = 25
+    BRIGHT_LEVEL = 240
+
+    def __init__(self, min_sharpness: float = 20.0,
+                 max_dark_fraction: float = 0.7,
+                 max_bright_fraction: float = 0.6,
+                 min_resolution: int = 224, analysis_size: int = 512):
+        self.min_sharpness = min_sharpness
+        self.max_dark_fraction = max_dark_fraction
+        self.max_bright_fraction = max_bright_fraction
+        self.min_resolution = min_resolution
+        self.analysis_size = analysis_size
+        self.checked = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def metrics(self, image: Image.Image) -> QualityMetrics:
+        """
+        Measure sharpness and exposure of an image.
+
+        Args:
+            image (Image.Image): RGB or grayscale image
+
+        Returns:
+            QualityMetrics: Laplacian variance and luminance statistics
+        """
+        luma = np.asarray(_thumbnail(image.convert("L"), self.analysis_size),
+                          dtype=np.float32)
+        laplacian = (luma[:-2, 1:-1] + luma[2:, 1:-1] + luma[1:-1, :-2]
+                     + luma[1:-1, 2:] - 4.0 * luma[1:-1, 1:-1])
+        histogram = np.bincount(luma.astype(np.uint8).ravel(), minlength=256)
+        total = max(1, luma.size)
+        return QualityMetrics(
+            sharpness=float(laplacian.var()) if laplacian.size else 0.0,
+            mean_luminance=float(luma.mean()) if luma.size else 0.0,
+            dark_fraction=float(histogram[:self.DARK_LEVEL].sum() / total),
+            bright_fraction=float(histogram[self.BRIGHT_LEVEL + 1:].sum() / total))
+
+    def check(self, image: Image.Image,
+              original_size: Optional[tuple] = None) -> Optional[GateRejection]:
+        """
+        Decide whether an image is good enough to diagnose.
+
+        Args:
+            image (Image.Image): Image as it would be sent upstream
+            original_size (Optional[tuple]): (width, height) of the upload,
+                used for the resolution check. Defaults to the image size.
+
+        Returns:
+            Optional[GateRejection]: Rejection with an actionable reason, or
+                                     None if the image is usable
+        """
+        rejection = self._evaluate(image, original_size or image.size)
+        with self._lock:
+            self.checked += 1
+            if rejection is not None:
+                self.rejected += 1
+        return rejection
+
+    def _evaluate(self, image: Image.Image,
+                  original_size: tuple) -> Optional[GateRejection]:
+        """Return the first quality problem found, checking cheapest first"""
+        if min(original_size) < self.min_resolution:
+            return GateRejection(
+                gate="quality_gate",
+                reason="low_resolution",
+                message=f"The image is too small ({original_size[0]}x"
+                        f"{original_size[1]}) to analyse reliably",
+                advice=["Move closer to the leaf or use a higher camera resolution",
+                        f"Upload an image at least {self.min_resolution} pixels "
+                        f"on its shortest side"],
+                features={"width": original_size[0],
+                          "height": original_size[1]})
+
+        metrics = self.metrics(image)
+        features = dict(metrics.__dict__)
+        if metrics.dark_fraction > self.max_dark_fraction:
+            return GateRejection(
+                gate="quality_gate",
+                reason="underexposed",
+                message="The image is too dark to see the leaf clearly",
+                advice=["Take the photo in daylight or add more light",
+                        "Avoid shooting the leaf against a bright background"],
+                features=features)
+        if metrics.bright_fraction > self.max_bright_fraction:
+            return GateRejection(
+                gate="quality_gate",
+                reason="overexposed",
+                message="The image is too bright and washed out",
+                advice=["Avoid direct sunlight or flash glare on the leaf",
+                        "Shade the leaf or step back from strong light"],
+                features=features)
+        if metrics.sharpness < self.min_sharpness:
+            return GateRejection(
+                gate="quality_gate",
+                reason="blurry",
+                message="The image is too blurry to identify symptoms",
+                advice=["Hold the camera steady and tap the screen to focus on the leaf",
+                        "Keep the leaf still and retake the photo"],
+                features=features)
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the gate counters.
+
+        Returns:
+            Dict[str, int]: Images checked and rejected (calls saved)
+        """
+        with self._lock:
+            return {"checked": self.checked, "rejected": self.rejected}
@@ -0,0 +1,312 @@
+"""
+Incremental JSON parsing for streamed analyses in the Leaf Disease Detection System.
+
+A streamed completion arrives as many small text deltas, and the complete
+JSON object is only parseable once the last one is in. The diagnosis fields
+that matter most (disease_detected, disease_name, severity) come first in
+the answer, so waiting for the whole object delays them by the time it takes
+to generate the symptoms, causes and treatment lists. This module scans the
+deltas as they arrive and reports each top-level field of the object as soon
+as its value is complete.
+
+Text before the opening brace (a markdown fence, a sentence of preamble) is
+skipped. Nested values are returned whole once their closing bracket arrives.
+
+The same scanner parses complete answers. It finds the first balanced object
+in a single linear pass without regular expressions, and when the answer was
+cut off by the token limit it keeps every completed field and closes the
+array or string that was being written, instead of discarding the answer.
+
+Classes:
+    IncrementalJSONParser: Emit top-level object fields from streamed text
+    ParsedObject: Fields parsed from a model answer and how they were recovered
+
+Functions:
+    parse_json_object: Extract the first JSON object, repairing truncation
+
+Usage:
+    >>> parser = IncrementalJSONParser()
+    >>> parser.feed('```json\\n{"disease_detected": tr')
+    []
+    >>> parser.feed('ue, "disease_name": "Leaf Rust", "sev')
+    [('disease_detected', True), ('disease_name', 'Leaf Rust')]
+    >>> parsed = parse_json_object('{"severity": "mild", "symptoms": ["spots", "yel')
+    >>> parsed.data, parsed.truncated, parsed.repaired
+    ({'severity': 'mild', 'symptoms': ['spots']}, True, ['symptoms'])
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Scanner states at the top level of the object
+_KEY = "key"          # expecting a key or the closing brace
+_COLON = "colon"      # expecting the colon after a key
+_VALUE = "value"      # expecting the start of a value
+_SCALAR = "scalar"    # inside a number, true, false or null
+_AFTER = "after"      # expecting a comma or the closing brace
+
+
+@dataclass
+class ParsedObject:
+    """
+    Fields parsed from a model answer.
+
+    Attributes:
+        data (Dict[str, Any]): Top-level fields that could be recovered
+        truncated (bool): True if an object started but the answer ended
+            before it closed
+        repaired (List[str]): Fields whose cut-off value was closed by the
+            parser
+    """
+    data: Dict[str, Any] = field(default_factory=dict)
+    truncated: bool = False
+    repaired: List[str] = field(default_factory=list)
+
+
+class IncrementalJSONParser:
+    """
+    Scan streamed text and emit top-level object fields as they complete.
+
+    Feed text deltas in order. Each call returns the (key, value) pairs whose
+    values were completed by that delta. Strings, objects and arrays complete
+    at their closing character; numbers and literals complete at the
+    delimiter that follows them. Values that fail to parse are skipped with a
+    warning, leaving the final parse of the full text to deal with them.
+
+    Attributes:
+        fields (Dict[str, Any]): Every field emitted so far
+        complete (bool): True once the closing brace of the object was seen
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.complete = False
+        self._depth = 0
+        self._state = _KEY
+        self._in_string = False
+        self._escape = False
+        self._key = None
+        self._token: List[str] = []
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        Consume the next delta of streamed text.
+
+        Args:
+            text (str): Text that follows everything fed so far
+
+        Returns:
+            List[Tuple[str, Any]]: Fields completed by this delta, in order
+        """
+        completed: List[Tuple[str, Any]] = []
+        for char in text:
+            if self.complete:
+                break
+            self._consume(char, completed)
+        return completed
+
+    def _consume(self, char: str, completed: List[Tuple[str, Any]]):
+        """Advance the scanner by one character"""
+        if self._depth == 0:
+            # Skip fences and preamble until the object starts
+            if char == "{":
+                self._depth = 1
+            return
+
+        if self._in_string:
+            self._token.append(char)
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._depth == 1:
+                    self._end_token(completed)
+            return
+
+        if self._depth > 1:
+            # Inside a nested value; only track strings and brackets
+            self._token.append(char)
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._end_token(completed)
+            return
+
+        if self._state == _SCALAR:
+            if char not in ",}" and not char.isspace():
+                self._token.append(char)
+                return
+            self._end_token(completed)
+
+        if char.isspace():
+            return
+        if self._state == _KEY:
+            if char == '"':
+                self._start_token(char, in_string=True)
+            elif char == "}":
+                self.complete = True
+        elif self._state == _COLON:
+            if char == ":":
+                self._state = _VALUE
+        elif self._state == _VALUE:
+            if char == '"':
+                self._start_token(char, in_string=True)
+            elif char in "{[":
+                self._start_token(char)
+                self._depth = 2
+            else:
+                self._start_token(char)
+                self._state = _SCALAR
+        elif self._state == _AFTER:
+            if char == ",":
+                self._state = _KEY
+            elif char == "}":
+                self.complete = True
+
+    @property
+    def started(self) -> bool:
+        """True once the opening brace of the object was seen"""
+        return self._depth > 0 or self.complete
+
+    def finish(self) -> Optional[Tuple[str, Any]]:
+        """
+        Close the value that was being written when the text ended.
+
+        Arrays and objects keep their complete entries and drop the one that
+        was cut off; a cut-off string value keeps the text written so far. Numbers and
+        literals are dropped, since a truncated number cannot be told apart
+        from a complete one.
+
+        Returns:
+            Optional[Tuple[str, Any]]: The repaired field, or None if the
+                object is complete or nothing could be salvaged
+        """
+        if self.complete or self._depth == 0 or not self._token:
+            return None
+        if self._depth == 1 and (self._state != _VALUE or not self._in_string):
+            # A key or a bare scalar was cut off
+            return None
+        value = _close_truncated("".join(self._token))
+        if value is _UNREPAIRABLE:
+            return None
+        self.fields[self._key] = value
+        return self._key, value
+
+    def _start_token(self, char: str, in_string: bool = False):
+        self._token = [char]
+        self._in_string = in_string
+
+    def _end_token(self, completed: List[Tuple[str, Any]]):
+        """Finish the key or value held in the token buffer"""
+        text = "".join(self._token)
+        self._token = []
+        if self._state == _KEY:
+            self._key = json.loads(text)
+            self._state = _COLON
+            return
+        self._state = _AFTER
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping unparseable streamed value for "
+                           f"{self._key!r}: {text[:50]}")
+            return
+        self.fields[self._key] = value
+        completed.append((self._key, value))
+
+
+_UNREPAIRABLE = object()
+
+
+def _close_truncated(text: str) -> Any:
+    """
+    Parse a string, array or object value whose end was cut off.
+
+    Containers cut off inside an entry are cut back to their last complete
+    entry; containers cut off between entries and bare strings are closed
+    where they stop.
+
+    Args:
+        text (str): Value text from its opening character to the cut
+
+    Returns:
+        Any: The repaired value, or _UNREPAIRABLE
+    """
+    closers: List[str] = []
+    in_string = escape = False
+    last_comma: Optional[Tuple[int, Tuple[str, ...]]] = None
+    for index, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "[":
+            closers.append("]")
+        elif char == "{":
+            closers.append("}")
+        elif char in "]}":
+            closers.pop()
+        elif char == ",":
+            last_comma = (index, tuple(closers))
+
+    # A dangling backslash would escape the closing quote
+    body = text[:-1] if escape else text
+    closed = body + ('"' if in_string else "") + "".join(reversed(closers))
+    if not closers:
+        # A bare string value keeps the text written so far
+        candidates = [closed]
+    else:
+        # Fall back to the entries before the cut, or an empty container
+        candidates = [closed, text[0] + ("]" if text[0] == "[" else "}")]
+        if last_comma is not None:
+            index, open_closers = last_comma
+            candidates.insert(1, text[:index] + "".join(reversed(open_closers)))
+        if in_string or text.rstrip()[-1] not in '"]}':
+            # The last entry is incomplete; prefer dropping it
+            candidates.append(candidates.pop(0))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return _UNREPAIRABLE
+
+
+def parse_json_object(text: str) -> ParsedObject:
+    """
+    Extract the first JSON object from a model answer in one pass.
+
+    Markdown fences and text around the object are ignored. If the answer
+    ends before the object closes, every completed field is kept and the
+    field that was cut off is repaired where possible.
+
+    Args:
+        text (str): Full model answer
+
+    Returns:
+        ParsedObject: Recovered fields; data is empty if no object was found
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    parsed = ParsedObject(data=parser.fields,
+                          truncated=parser.started and not parser.complete)
+    if parsed.truncated:
+        repaired = parser.finish()
+        if repaired is not None:
+            parsed.repaired.append(repaired[0])
+    return parsed
@@ -1,14 +1,37 @@
 import os
-import json
+import asyncio
+import base64
+import hashlib
 import logging
 import sys
-from typing import Dict, Optional, List
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, Optional, List, Tuple, Union
 from dataclasses import dataclass
 from datetime import datetime
 
-from groq import Groq
+from groq import BadRequestError, RateLimitError
 from dotenv import load_dotenv
 
+from backend_pool import BackendPool
+from backends import GroqBackend, InferenceBackend
+from cascade import FAST, STRONG, CascadePolicy, CascadeStats
+from circuit_breaker import BreakerTicket, CircuitBreaker
+from config import AppConfig
+from hedging import HedgePolicy, HedgeStats
+from image_gates import GateRejection, PlantFilter, QualityGate, rejection_result
+from json_stream import IncrementalJSONParser, ParsedObject, parse_json_object
+from perceptual_hash import NearDuplicateIndex, phash
+from persistent_cache import SQLiteAnalysisCache
+from preprocessing import ImagePreprocessor, PreprocessedImage
+from resolution import FULL, PREVIEW, ResolutionPolicy, ResolutionStats
+from prompts import DEFAULT_PROMPT_ID, AnalysisPrompt, get_prompt
+from result_cache import AnalysisCache, make_cache_key
+from retry import Deadline, RetryPolicy
+from scheduler import Reservation, UpstreamScheduler
+from single_flight import SingleFlight
+from usage import CallUsage, UsageLedger, UsageTotals
+from vegetation import LeafCropper
+
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
@@ -41,6 +64,70 @@ class DiseaseAnalysisResult:
     analysis_timestamp: str = datetime.now().astimezone().isoformat()
 
 
+@dataclass
+class BatchItemResult:
+    """
+    Outcome of one image in a batch analysis.
+
+    Attributes:
+        index (int): Position of the image in the input sequence
+        result (Optional[Dict]): Analysis results, None if the item failed
+        error (Optional[str]): Error message, None if the item succeeded
+    """
+    index: int
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        """True if the image was analysed successfully"""
+        return self.error is None
+
+
+@dataclass
+class StreamEvent:
+    """
+    One event of a streamed analysis.
+
+    Events arrive in the order preprocessed (only when the image was
+    preprocessed), one field event per top-level result field as soon as the
+    model has finished writing it, and a final done event.
+
+    Attributes:
+        event (str): preprocessed, field or done
+        field (Optional[str]): Result field name for field events
+        value (Any): Preprocessing summary, the field value as written by the
+            model, or the final validated result dictionary for done
+    """
+    event: str
+    field: Optional[str] = None
+    value: Any = None
+
+
+@dataclass
+class _OpenedStream:
+    """Streaming upstream call admitted by the scheduler and breaker"""
+    chunks: Any
+    reservation: Reservation
+    ticket: BreakerTicket
+    started: float
+    headers: Any = None
+
+
+@dataclass
+class _PreparedAnalysis:
+    """Local state for one analysis, computed before any upstream call"""
+    base64_image: str
+    image_sha256: str
+    cache_key: str
+    variant: str
+    mime_type: str = "image/jpeg"
+    preprocessed: Optional[PreprocessedImage] = None
+    preview_base64: Optional[str] = None
+    perceptual_hash: Optional[int] = None
+    result: Optional[Dict] = None
+
+
 class LeafDiseaseDetector:
     """
     Advanced Leaf Disease Detection System using AI Vision Analysis.
@@ -69,8 +156,43 @@ class LeafDiseaseDetector:
         MODEL_NAME (str): The AI model used for analysis
         DEFAULT_TEMPERATURE (float): Default temperature for response generation
         DEFAULT_MAX_TOKENS (int): Default maximum tokens for responses
+        DEFAULT_BATCH_CONCURRENCY (int): Default number of images analysed in
+            parallel by analyze_many() and analyze_as_completed()
+        DEFAULT_TIMEOUT (float): Default overall deadline of one analysis in
+            seconds, covering queueing, every attempt and the backoff between
         api_key (str): Groq API key for authentication
-        client (Groq): Groq API client instance
+        backend (InferenceBackend): Sends the chat completion requests,
+            the Groq API unless another backend is given
+        model_name (str): Model used by this instance (defaults to MODEL_NAME)
+        cache (AnalysisCache): In-memory cache of results keyed by image content
+        store (Optional[SQLiteAnalysisCache]): Persistent result store shared
+            across processes, consulted after the in-memory cache
+        near_duplicates (Optional[NearDuplicateIndex]): Perceptual-hash index
+            that answers visually identical re-uploads without an API call
+        preprocessor (ImagePreprocessor): Orients, downsizes and re-encodes
+            images before they are sent upstream
+        plant_filter (Optional[PlantFilter]): Local gate that rejects images
+            without plant material before the upstream call
+        quality_gate (Optional[QualityGate]): Local gate that rejects blurry,
+            badly exposed or tiny images before the upstream call
+        prompt (AnalysisPrompt): Versioned prompt and output constraint in use
+        prompt_fingerprint (str): Digest of the analysis prompt used in cache keys
+        single_flight (SingleFlight): Shares one upstream call between
+            concurrent analyses of the same image and parameters
+        scheduler (UpstreamScheduler): Admits upstream calls within the
+            provider's rate limits and an adaptive concurrency limit
+        retry_policy (RetryPolicy): Retries transient upstream failures with
+            exponential backoff and full jitter
+        hedge_policy (Optional[HedgePolicy]): Sends a backup call when an
+            async upstream call is slower than recent calls (opt-in)
+        breaker (CircuitBreaker): Fails upstream calls fast with
+            CircuitOpenError while the upstream is failing or too slow
+        usage_ledger (UsageLedger): Token and latency totals of upstream
+            calls per model and per prompt version
+        cascade (Optional[CascadePolicy]): Asks a fast model first and
+            escalates uncertain answers to a strong one (opt-in)
+        resolution (Optional[ResolutionPolicy]): Sends a small preview
+            first and resends uncertain cases at full resolution (opt-in)
 
     Example:
         >>> detector = LeafDiseaseDetector()
@@ -81,13 +203,45 @@ class LeafDiseaseDetector:
         ...     print(f"Disease detected: {result['disease_name']}")
         >>> else:
         ...     print("Healthy leaf detected")
+
+        From async code (e.g. FastAPI endpoints) await the coroutine variant
+        so the event loop is not blocked while the model responds:
+
+        >>> result = await detector.analyze_leaf_image_async(base64_image_data)
+
+        Batches of images are analysed with bounded concurrency:
+
+        >>> results = await detector.analyze_many(images, max_concurrency=8)
+
+        Result fields can be streamed while the model is still generating:
+
+        >>> async for event in detector.stream_leaf_image_async(base64_image_data):
+        ...     if event.event == "field":
+        ...         print(event.field, event.value)
     """
 
     MODEL_NAME = "meta-llama/llama-4-scout-17b-16e-instruct"
     DEFAULT_TEMPERATURE = 0.3
     DEFAULT_MAX_TOKENS = 1024
+    DEFAULT_BATCH_CONCURRENCY = 8
+    DEFAULT_TIMEOUT = 60.0
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None,
+                 cache: Optional[AnalysisCache] = None,
+                 store: Optional[SQLiteAnalysisCache] = None,
+                 model_name: Optional[str] = None,
+                 near_duplicates: Optional[NearDuplicateIndex] = None,
+                 preprocessor: Optional[ImagePreprocessor] = None,
+                 plant_filter: Optional[PlantFilter] = None,
+                 quality_gate: Optional[QualityGate] = None,
+                 scheduler: Optional[UpstreamScheduler] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 hedge_policy: Optional[HedgePolicy] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 prompt: Optional[AnalysisPrompt] = None,
+                 cascade: Optional[CascadePolicy] = None,
+                 resolution: Optional[ResolutionPolicy] = None,
+                 backend: Optional[InferenceBackend] = None):
         """
         Initialize the Leaf Disease Detector with API credentials.
 
@@ -98,77 +252,268 @@ class LeafDiseaseDetector:
         Args:
             api_key (Optional[str]): Groq API key. If None, will attempt to
                                    load from GROQ_API_KEY environment variable.
+            cache (Optional[AnalysisCache]): Result cache to use. If None, a
+                                   cache with default limits is created.
+            store (Optional[SQLiteAnalysisCache]): Persistent result store.
+                                   Entries from other model/prompt versions
+                                   are dropped when the detector starts.
+            model_name (Optional[str]): Model to use instead of MODEL_NAME.
+            near_duplicates (Optional[NearDuplicateIndex]): Near-duplicate index.
+                                   When set, results of images within its
+                                   Hamming distance are reused and marked
+                                   with near_duplicate=True.
+            preprocessor (Optional[ImagePreprocessor]): Image preprocessing
+                                   stage. If None, one with default settings
+                                   and leaf-region cropping is created.
+            plant_filter (Optional[PlantFilter]): Non-plant pre-filter. When
+                                   set, obvious non-plant images get an
+                                   invalid_image result without an API call.
+            quality_gate (Optional[QualityGate]): Blur, exposure and resolution
+                                   gate. When set, unusable photos get an
+                                   invalid_image result with an actionable
+                                   rejection reason without an API call.
+            scheduler (Optional[UpstreamScheduler]): Rate-limit-aware
+                                   admission control for upstream calls. If
+                                   None, one with default limits is created.
+            retry_policy (Optional[RetryPolicy]): Retry budget and backoff for
+                                   transient upstream errors. If None, the
+                                   default policy (3 attempts) is used.
+            hedge_policy (Optional[HedgePolicy]): Tail-latency hedging for
+                                   the async path. Disabled when None.
+            breaker (Optional[CircuitBreaker]): Circuit breaker around the
+                                   upstream client. If None, one with default
+                                   thresholds is created.
+            prompt (Optional[AnalysisPrompt]): Analysis prompt version. If
+                                   None, the DEFAULT_PROMPT_ID prompt is used.
+            cascade (Optional[CascadePolicy]): Two-tier model cascade. When
+                                   set, its strong model replaces model_name
+                                   and analyses ask its fast model first.
+            resolution (Optional[ResolutionPolicy]): Resolution escalation.
+                                   When set, analyses send a preview
+                                   rendition first and the full image only
+                                   for uncertain answers.
+            backend (Optional[InferenceBackend]): Inference backend. If None,
+                                   a GroqBackend using api_key is created;
+                                   no API key is needed otherwise.
 
         Raises:
-            ValueError: If no valid API key is found in parameters or environment.
+            ValueError: If no backend is given and no valid API key is found
+                        in parameters or environment.
 
         Note:
             Ensure your .env file contains GROQ_API_KEY or pass it directly.
         """
         load_dotenv()
         self.api_key = api_key or os.environ.get("GROQ_API_KEY")
-        if not self.api_key:
-            raise ValueError("GROQ_API_KEY not found in environment variables")
-        self.client = Groq(api_key=self.api_key)
+        if backend is None:
+            if not self.api_key:
+                raise ValueError("GROQ_API_KEY not found in environment variables")
+            backend = GroqBackend(api_key=self.api_key)
+        self.backend = backend
+        self.cascade = cascade
+        self.model_name = (cascade.strong_model if cascade is not None
+                           else model_name or self.MODEL_NAME)
+        self.resolution = resolution
+        # Results of a cascade depend on both tiers and the threshold
+        self._result_model = (cascade.signature if cascade is not None
+                              else self.model_name)
+        if resolution is not None:
+            self._result_model += f"|{resolution.signature}"
+        self.cache = cache if cache is not None else AnalysisCache()
+        self.prompt = prompt if prompt is not None else get_prompt(DEFAULT_PROMPT_ID)
+        # The output constraint changes answers, so it is part of the fingerprint
+        fingerprinted = self.create_analysis_prompt()
+        if self.prompt.output_mode != "text":
+            fingerprinted += f"|{self.prompt.output_mode}"
+        self.prompt_fingerprint = hashlib.sha256(fingerprinted.encode()).hexdigest()
+        # Downgraded to "text" if the provider rejects the output constraint
+        self._output_mode = self.prompt.output_mode
+        self.usage_ledger = UsageLedger()
+        self.store = store
+        self.near_duplicates = near_duplicates
+        self.preprocessor = (preprocessor if preprocessor is not None
+                             else ImagePreprocessor(cropper=LeafCropper()))
+        self.plant_filter = plant_filter
+        self.quality_gate = quality_gate
+        self.single_flight = SingleFlight()
+        self.scheduler = scheduler if scheduler is not None else UpstreamScheduler()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.hedge_policy = hedge_policy
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        if self.store is not None:
+            self.store.set_version(f"{self._result_model}|{self.prompt_fingerprint}"
+                                   f"|{self.preprocessor.signature}")
         logger.info("Leaf Disease Detector initialized")
 
+    @classmethod
+    def from_config(cls, config: AppConfig) -> 'LeafDiseaseDetector':
+        """
+        Create a detector from application configuration.
+
+        Args:
+            config (AppConfig): Application settings, typically from AppConfig.from_env()
+
+        Returns:
+            LeafDiseaseDetector: Detector using the configured model,
+                                 preprocessing and local gates and, when
+                                 enabled, a persistent result store and a
+                                 near-duplicate index
+        """
+        store = None
+        if config.result_store_path:
+            store = SQLiteAnalysisCache(
+                config.result_store_path,
+                ttl_seconds=config.result_store_ttl_seconds,
+                max_bytes=config.result_store_max_bytes)
+        near_duplicates = None
+        if config.near_duplicate_enabled:
+            near_duplicates = NearDuplicateIndex(
+                max_distance=config.near_duplicate_max_distance,
+                max_entries=config.near_duplicate_max_entries)
+        cropper = None
+        if config.leaf_crop_enabled:
+            cropper = LeafCropper(threshold=config.vegetation_threshold,
+                                  margin=config.leaf_crop_margin)
+        preprocessor = ImagePreprocessor(
+            max_side=config.preprocess_max_side,
+            quality=config.preprocess_quality,
+            output_format=config.preprocess_format,
+            cropper=cropper)
+        plant_filter = None
+        if config.plant_filter_enabled:
+            plant_filter = PlantFilter(
+                min_plant_score=config.min_plant_score,
+                vegetation_threshold=config.vegetation_threshold)
+        quality_gate = None
+        if config.quality_gate_enabled:
+            quality_gate = QualityGate(
+                min_sharpness=config.min_sharpness,
+                max_dark_fraction=config.max_dark_fraction,
+                max_bright_fraction=config.max_bright_fraction,
+                min_resolution=config.min_resolution)
+        backend = cls._backend_from_config(config)
+        # Rate limits and the concurrency ceiling are configured per API key
+        keys = len(backend) if isinstance(backend, BackendPool) else 1
+        scheduler = UpstreamScheduler(
+            requests_per_minute=config.rate_limit_requests_per_minute * keys,
+            tokens_per_minute=config.rate_limit_tokens_per_minute * keys,
+            initial_concurrency=config.upstream_initial_concurrency,
+            max_concurrency=config.upstream_max_concurrency * keys,
+            max_queue_wait=config.max_queue_wait_seconds)
+        hedge_policy = None
+        if config.hedging_enabled:
+            hedge_policy = HedgePolicy(percentile=config.hedge_percentile,
+                                       budget=config.hedge_budget)
+        cascade = None
+        if config.cascade_enabled:
+            cascade = CascadePolicy(
+                fast_model=config.cascade_fast_model,
+                strong_model=config.cascade_strong_model,
+                min_confidence=config.cascade_min_confidence)
+        resolution = None
+        if config.resolution_escalation_enabled:
+            resolution = ResolutionPolicy(
+                preview_side=config.preview_max_side,
+                min_confidence=config.preview_min_confidence)
+        detector = cls(api_key=config.groq_api_key, store=store,
+                       near_duplicates=near_duplicates,
+                       backend=backend,
+                       model_name=config.model_name,
+                       preprocessor=preprocessor,
+                       plant_filter=plant_filter,
+                       quality_gate=quality_gate,
+                       scheduler=scheduler,
+                       retry_policy=RetryPolicy(
+                           max_attempts=config.retry_max_attempts,
+                           base_delay=config.retry_base_delay,
+                           max_delay=config.retry_max_delay),
+                       hedge_policy=hedge_policy,
+                       breaker=CircuitBreaker(
+                           failure_rate=config.breaker_failure_rate,
+                           slow_call_seconds=config.breaker_slow_call_seconds,
+                           slow_call_rate=config.breaker_slow_call_rate,
+                           open_seconds=config.breaker_open_seconds),
+                       prompt=get_prompt(config.prompt_id, config.output_mode),
+                       cascade=cascade,
+                       resolution=resolution)
+        detector.DEFAULT_TEMPERATURE = config.model_temperature
+        detector.DEFAULT_MAX_TOKENS = config.max_completion_tokens
+        detector.DEFAULT_BATCH_CONCURRENCY = config.batch_max_concurrency
+        detector.DEFAULT_TIMEOUT = config.request_timeout_seconds
+        return detector
+
+    @staticmethod
+    def _backend_from_config(config: AppConfig) -> InferenceBackend:
+        """
+        Create the configured backend: one Groq key, or a pool of keys
+
+        Args:
+            config (AppConfig): Application settings
+
+        Returns:
+            InferenceBackend: GroqBackend, or a BackendPool over one
+                              GroqBackend per backend_pool entry
+        """
+        if not config.backend_pool:
+            return GroqBackend(config.groq_api_key, base_url=config.groq_base_url)
+        members = []
+        for index, entry in enumerate(config.backend_pool.split(",")):
+            key, _, base_url = entry.strip().partition("@")
+            base_url = base_url or config.groq_base_url
+            members.append(GroqBackend(
+                key, base_url=base_url,
+                name=f"key{index}@{base_url or 'groq'}"))
+        logger.info(f"Routing upstream calls across {len(members)} backends")
+        return BackendPool(members, eject_after=config.pool_eject_after,
+                           eject_seconds=config.pool_eject_seconds)
+
+    async def warmup(self) -> bool:
+        """
+        Open the upstream connection pool ahead of the first analysis.
+
+        Issues a cheap model listing request so the TLS handshake and
+        connection setup are paid at startup instead of by the first user.
+
+        Returns:
+            bool: True if the probe succeeded, False otherwise
+        """
+        try:
+            await self.backend.probe_async()
+            logger.info("Upstream connection warmed up")
+            return True
+        except Exception as e:
+            logger.warning(f"Warmup probe failed: {str(e)}")
+            return False
+
+    async def aclose(self):
+        """Close the pooled connections held by the backend"""
+        await self.backend.aclose()
+
     def create_analysis_prompt(self) -> str:
         """
         Create the standardized analysis prompt for the AI model.
 
-        Generates a comprehensive prompt that instructs the AI model to analyze
-        leaf images for diseases and return structured JSON results. The prompt
-        specifies the required output format and analysis criteria.
+        Returns the text of the configured prompt version, which instructs the
+        model to analyze the leaf image for diseases and return structured
+        JSON results in the required output format.
 
         Returns:
             str: Formatted prompt string with instructions for disease analysis
                  and JSON schema specification.
 
         Note:
-            The prompt ensures consistent output formatting across all analyses
-            and includes all necessary fields for comprehensive disease assessment.
-        """
-        return """IMPORTANT: First determine if this image contains a plant leaf or vegetation. If the image shows humans, animals, objects, buildings, or anything other than plant leaves/vegetation, return the "invalid_image" response format below.
-
-        If this is a valid leaf/plant image, analyze it for diseases and return the results in JSON format.
-        
-        Please identify:
-        1. Whether this is actually a leaf/plant image
-        2. Disease name (if any)
-        3. Disease type/category or invalid_image
-        4. Severity level (mild, moderate, severe)
-        5. Confidence score (0-100%)
-        6. Symptoms observed
-        7. Possible causes
-        8. Treatment recommendations
-
-        For NON-LEAF images (humans, animals, objects, or not detected as leaves, etc.), return this format:
-        {
-            "disease_detected": false,
-            "disease_name": null,
-            "disease_type": "invalid_image",
-            "severity": "none",
-            "confidence": 95,
-            "symptoms": ["This image does not contain a plant leaf"],
-            "possible_causes": ["Invalid image type uploaded"],
-            "treatment": ["Please upload an image of a plant leaf for disease analysis"]
-        }
-        
-        For VALID LEAF images, return this format:
-        {
-            "disease_detected": true/false,
-            "disease_name": "name of disease or null",
-            "disease_type": "fungal/bacterial/viral/pest/nutrient deficiency/healthy",
-            "severity": "mild/moderate/severe/none",
-            "confidence": 85,
-            "symptoms": ["list", "of", "symptoms"],
-            "possible_causes": ["list", "of", "causes"],
-            "treatment": ["list", "of", "treatments"]
-        }"""
+            Prompt versions are registered in prompts.PROMPTS. The original
+            prompt "leaf-v1" is the default; "leaf-json-v2" is a compact
+            prompt in JSON mode that caps each list at 3 short entries.
+        """
+        return self.prompt.text
 
     def analyze_leaf_image_base64(self, base64_image: str,
                                   temperature: float = None,
-                                  max_tokens: int = None) -> Dict:
+                                  max_tokens: int = None,
+                                  bypass_gates: bool = False,
+                                  timeout: Optional[float] = None,
+                                  include_usage: bool = False) -> Dict:
         """
         Analyze base64 encoded image data for leaf diseases and return JSON result.
 
@@ -180,6 +525,14 @@ class LeafDiseaseDetector:
             base64_image (str): Base64 encoded image data (without data:image prefix)
             temperature (float, optional): Model temperature for response generation
             max_tokens (int, optional): Maximum tokens for response
+            bypass_gates (bool): Skip the local image gates and always ask
+                                 the model
+            timeout (Optional[float]): Overall deadline in seconds for the
+                                 analysis including retries. Defaults to
+                                 DEFAULT_TIMEOUT.
+            include_usage (bool): Add a usage entry with the tokens and
+                                 timings of the upstream call (None when
+                                 the result was answered locally)
 
         Returns:
             Dict: Analysis results as dictionary (JSON serializable)
@@ -187,134 +540,1273 @@ class LeafDiseaseDetector:
                  - For valid leaves: standard disease analysis results
 
         Raises:
+            DeadlineExceeded: If the deadline ran out before a result arrived
             Exception: If analysis fails
         """
         try:
             logger.info("Starting analysis for base64 image data")
+            deadline = self._deadline(timeout)
 
-            # Validate base64 input
-            if not isinstance(base64_image, str):
-                raise ValueError("base64_image must be a string")
-
-            if not base64_image:
-                raise ValueError("base64_image cannot be empty")
-
-            # Clean base64 string (remove data URL prefix if present)
-            if base64_image.startswith('data:'):
-                base64_image = base64_image.split(',', 1)[1]
-
-            # Prepare request parameters
-            temperature = temperature or self.DEFAULT_TEMPERATURE
-            max_tokens = max_tokens or self.DEFAULT_MAX_TOKENS
-
-            # Make API request
-            completion = self.client.chat.completions.create(
-                model=self.MODEL_NAME,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": self.create_analysis_prompt()
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                temperature=temperature,
-                max_completion_tokens=max_tokens,
-                top_p=1,
-                stream=False,
-                stop=None,
-            )
-
-            logger.info("API request completed successfully")
-            result = self._parse_response(
-                completion.choices[0].message.content)
+            prepared = self._prepare(base64_image, temperature, bypass_gates)
+            if prepared.result is not None:
+                return self._with_usage(prepared.result, None, include_usage)
 
-            # Return as dictionary for JSON serialization
-            return result.__dict__
+            request = self._build_request(
+                prepared.base64_image, temperature, max_tokens,
+                prepared.mime_type)
+            result, call_usage = self.single_flight.run(
+                self._flight_key(prepared, request),
+                lambda: self._complete(prepared, request, deadline),
+                timeout=deadline.remaining())
+            return self._with_usage(result, call_usage, include_usage)
 
         except Exception as e:
             logger.error(f"Analysis failed for base64 image data: {str(e)}")
             raise
 
-    def _parse_response(self, response_content: str) -> DiseaseAnalysisResult:
+    async def analyze_leaf_image_async(self, base64_image: str,
+                                       temperature: float = None,
+                                       max_tokens: int = None,
+                                       bypass_gates: bool = False,
+                                       timeout: Optional[float] = None,
+                                       include_usage: bool = False) -> Dict:
         """
-        Parse and validate API response
+        Asynchronously analyze base64 encoded image data for leaf diseases.
+
+        Coroutine counterpart of analyze_leaf_image_base64() backed by the
+        backend's async calls. Awaiting it yields control to the event loop while
+        the upstream request is in flight, so a single worker can serve many
+        overlapping analyses. The CPU-bound local stages (decoding,
+        preprocessing, gates) run in a worker thread for the same reason.
 
         Args:
-            response_content (str): Raw response from API
+            base64_image (str): Base64 encoded image data (without data:image prefix)
+            temperature (float, optional): Model temperature for response generation
+            max_tokens (int, optional): Maximum tokens for response
+            bypass_gates (bool): Skip the local image gates and always ask
+                                 the model
+            timeout (Optional[float]): Overall deadline in seconds for the
+                                 analysis including retries. Defaults to
+                                 DEFAULT_TIMEOUT.
+            include_usage (bool): Add a usage entry with the tokens and
+                                 timings of the upstream call (None when
+                                 the result was answered locally)
 
         Returns:
-            DiseaseAnalysisResult: Parsed and validated results
+            Dict: Analysis results as dictionary (JSON serializable)
+
+        Raises:
+            DeadlineExceeded: If the deadline ran out before a result arrived
+            Exception: If analysis fails
         """
         try:
-            # Clean up response - remove markdown code blocks if present
-            cleaned_response = response_content.strip()
-            if cleaned_response.startswith('```json'):
-                cleaned_response = cleaned_response.replace(
-                    '```json', '').replace('```', '').strip()
-            elif cleaned_response.startswith('```'):
-                cleaned_response = cleaned_response.replace('```', '').strip()
-
-            # Parse JSON
-            disease_data = json.loads(cleaned_response)
-            logger.info("Response parsed successfully as JSON")
+            logger.info("Starting async analysis for base64 image data")
+            deadline = self._deadline(timeout)
 
-            # Validate required fields and create result object
-            return DiseaseAnalysisResult(
-                disease_detected=bool(
-                    disease_data.get('disease_detected', False)),
-                disease_name=disease_data.get('disease_name'),
-                disease_type=disease_data.get('disease_type', 'unknown'),
-                severity=disease_data.get('severity', 'unknown'),
-                confidence=float(disease_data.get('confidence', 0)),
-                symptoms=disease_data.get('symptoms', []),
-                possible_causes=disease_data.get('possible_causes', []),
-                treatment=disease_data.get('treatment', [])
-            )
-
-        except json.JSONDecodeError:
-            logger.warning(
-                "Failed to parse as JSON, attempting to extract JSON from response")
-
-            # Try to find JSON in the response using regex
-            import re
-            json_match = re.search(r'\{.*\}', response_content, re.DOTALL)
-            if json_match:
-                try:
-                    disease_data = json.loads(json_match.group())
-                    logger.info("JSON extracted and parsed successfully")
-
-                    return DiseaseAnalysisResult(
-                        disease_detected=bool(
-                            disease_data.get('disease_detected', False)),
-                        disease_name=disease_data.get('disease_name'),
-                        disease_type=disease_data.get(
-                            'disease_type', 'unknown'),
-                        severity=disease_data.get('severity', 'unknown'),
-                        confidence=float(disease_data.get('confidence', 0)),
-                        symptoms=disease_data.get('symptoms', []),
-                        possible_causes=disease_data.get(
-                            'possible_causes', []),
-                        treatment=disease_data.get('treatment', [])
-                    )
-                except json.JSONDecodeError:
-                    pass
-
-            # If all parsing attempts fail, log the raw response and raise error
+            prepared = await asyncio.to_thread(
+                self._prepare, base64_image, temperature, bypass_gates)
+            if prepared.result is not None:
+                return self._with_usage(prepared.result, None, include_usage)
+
+            request = self._build_request(
+                prepared.base64_image, temperature, max_tokens,
+                prepared.mime_type)
+            result, call_usage = await self.single_flight.run_async(
+                self._flight_key(prepared, request),
+                lambda: self._complete_async(prepared, request, deadline),
+                timeout=deadline.remaining())
+            return self._with_usage(result, call_usage, include_usage)
+
+        except Exception as e:
+            logger.error(f"Analysis failed for base64 image data: {str(e)}")
+            raise
+
+    def stream_leaf_image_base64(self, base64_image: str,
+                                 temperature: float = None,
+                                 max_tokens: int = None,
+                                 bypass_gates: bool = False,
+                                 timeout: Optional[float] = None,
+                                 include_usage: bool = False) -> Iterator[StreamEvent]:
+        """
+        Analyze base64 encoded image data, yielding result fields as they are generated.
+
+        Streaming counterpart of analyze_leaf_image_base64(). The model's
+        answer is requested as a token stream and run through an incremental
+        JSON parser, so each top-level field (disease_detected, disease_name,
+        severity, ...) is yielded as soon as the model has finished writing it
+        instead of after the whole answer. Cached and locally rejected results
+        are yielded field by field without an upstream call.
+
+        Only opening the stream is retried; an error after the first token is
+        raised to the caller. Streamed calls are not coalesced or hedged, since
+        every caller consumes its own stream. They skip the model cascade and
+        resolution escalation, sending the full image to model_name once, so
+        their results are not cached while either is enabled.
+
+        Args:
+            base64_image (str): Base64 encoded image data (without data:image prefix)
+            temperature (float, optional): Model temperature for response generation
+            max_tokens (int, optional): Maximum tokens for response
+            bypass_gates (bool): Skip the local image gates and always ask
+                                 the model
+            timeout (Optional[float]): Overall deadline in seconds for the
+                                 analysis including retries. Defaults to
+                                 DEFAULT_TIMEOUT.
+            include_usage (bool): Add a usage entry with the tokens and
+                                 timings of the upstream call (None when
+                                 the result was answered locally)
+
+        Yields:
+            StreamEvent: preprocessed, then one field event per result field,
+                         then done with the validated result dictionary
+
+        Raises:
+            DeadlineExceeded: If the deadline ran out before the stream opened
+            Exception: If analysis fails
+        """
+        try:
+            logger.info("Starting streamed analysis for base64 image data")
+            deadline = self._deadline(timeout)
+
+            prepared = self._prepare(base64_image, temperature, bypass_gates)
+            yield from self._local_events(prepared, include_usage)
+            if prepared.result is not None:
+                return
+
+            request = self._build_request(
+                prepared.base64_image, temperature, max_tokens,
+                prepared.mime_type, stream=True)
+            opened = self.retry_policy.run(
+                lambda timeout: self._open_stream(request, timeout), deadline)
+            parser = IncrementalJSONParser()
+            parts: List[str] = []
+            usage = None
+            try:
+                for chunk in opened.chunks:
+                    text = self._chunk_text(chunk)
+                    usage = self._chunk_usage(chunk) or usage
+                    if text:
+                        parts.append(text)
+                        for name, value in parser.feed(text):
+                            yield StreamEvent("field", name, value)
+            except BaseException as e:
+                self._release_failed(request, opened.reservation, opened.ticket,
+                                     opened.started, e)
+                raise
+            finally:
+                opened.chunks.close()
+            call_usage = self._release_stream(request, opened, usage)
+
+            logger.info("Streamed API request completed successfully")
+            result = self._finish(prepared, "".join(parts))
+            yield StreamEvent("done", value=self._with_usage(
+                result, call_usage, include_usage))
+
+        except Exception as e:
+            logger.error(f"Streamed analysis failed for base64 image data: {str(e)}")
+            raise
+
+    async def stream_leaf_image_async(self, base64_image: str,
+                                      temperature: float = None,
+                                      max_tokens: int = None,
+                                      bypass_gates: bool = False,
+                                      timeout: Optional[float] = None,
+                                      include_usage: bool = False) -> AsyncIterator[StreamEvent]:
+        """
+        Asynchronously analyze base64 encoded image data, yielding result fields as they are generated.
+
+        Coroutine counterpart of stream_leaf_image_base64() backed by the
+        backend's async calls, suitable for long-lived streaming responses that
+        should not hold a worker thread.
+
+        Args:
+            base64_image (str): Base64 encoded image data (without data:image prefix)
+            temperature (float, optional): Model temperature for response generation
+            max_tokens (int, optional): Maximum tokens for response
+            bypass_gates (bool): Skip the local image gates and always ask
+                                 the model
+            timeout (Optional[float]): Overall deadline in seconds for the
+                                 analysis including retries. Defaults to
+                                 DEFAULT_TIMEOUT.
+            include_usage (bool): Add a usage entry with the tokens and
+                                 timings of the upstream call (None when
+                                 the result was answered locally)
+
+        Yields:
+            StreamEvent: preprocessed, then one field event per result field,
+                         then done with the validated result dictionary
+
+        Raises:
+            DeadlineExceeded: If the deadline ran out before the stream opened
+            Exception: If analysis fails
+        """
+        try:
+            logger.info("Starting async streamed analysis for base64 image data")
+            deadline = self._deadline(timeout)
+
+            prepared = await asyncio.to_thread(
+                self._prepare, base64_image, temperature, bypass_gates)
+            for event in self._local_events(prepared, include_usage):
+                yield event
+            if prepared.result is not None:
+                return
+
+            request = self._build_request(
+                prepared.base64_image, temperature, max_tokens,
+                prepared.mime_type, stream=True)
+            opened = await self.retry_policy.run_async(
+                lambda timeout: self._open_stream_async(request, timeout),
+                deadline)
+            parser = IncrementalJSONParser()
+            parts: List[str] = []
+            usage = None
+            try:
+                async for chunk in opened.chunks:
+                    text = self._chunk_text(chunk)
+                    usage = self._chunk_usage(chunk) or usage
+                    if text:
+                        parts.append(text)
+                        for name, value in parser.feed(text):
+                            yield StreamEvent("field", name, value)
+            except BaseException as e:
+                self._release_failed(request, opened.reservation, opened.ticket,
+                                     opened.started, e)
+                raise
+            finally:
+                await opened.chunks.close()
+            call_usage = self._release_stream(request, opened, usage)
+
+            logger.info("Streamed API request completed successfully")
+            result = self._finish(prepared, "".join(parts))
+            yield StreamEvent("done", value=self._with_usage(
+                result, call_usage, include_usage))
+
+        except Exception as e:
+            logger.error(f"Streamed analysis failed for base64 image data: {str(e)}")
+            raise
+
+    async def analyze_many(self, images: Union[Iterable[str], AsyncIterable[str]],
+                           max_concurrency: Optional[int] = None,
+                           temperature: float = None,
+                           max_tokens: int = None,
+                           bypass_gates: bool = False,
+                           timeout: Optional[float] = None) -> List[BatchItemResult]:
+        """
+        Analyze a batch of base64 encoded images with bounded concurrency.
+
+        Args:
+            images (Union[Iterable[str], AsyncIterable[str]]): Base64 encoded
+                images, consumed lazily
+            max_concurrency (Optional[int]): Maximum analyses in flight.
+                Defaults to DEFAULT_BATCH_CONCURRENCY.
+            temperature (float, optional): Model temperature for response generation
+            max_tokens (int, optional): Maximum tokens for response
+            bypass_gates (bool): Skip the local image gates and always ask
+                                 the model
+
+        Returns:
+            List[BatchItemResult]: One entry per image, in input order. A
+                failed image has error set instead of result and does not
+                affect the others.
+
+        Raises:
+            ValueError: If max_concurrency is less than 1
+        """
+        results = [item async for item in self.analyze_as_completed(
+            images, max_concurrency, temperature, max_tokens, bypass_gates,
+            timeout)]
+        results.sort(key=lambda item: item.index)
+        return results
+
+    async def analyze_as_completed(self, images: Union[Iterable[str], AsyncIterable[str]],
+                                   max_concurrency: Optional[int] = None,
+                                   temperature: float = None,
+                                   max_tokens: int = None,
+                                   bypass_gates: bool = False,
+                                   timeout: Optional[float] = None) -> AsyncIterator[BatchItemResult]:
+        """
+        Analyze a stream of images, yielding each result as soon as it is ready.
+
+        At most max_concurrency analyses are in flight. The next image is only
+        taken from images when a slot frees up and no new analysis starts
+        while the consumer is still handling a yielded result, so a slow
+        consumer or a large input never piles up work in memory. Closing the
+        generator early cancels the analyses still in flight.
+
+        Args:
+            images (Union[Iterable[str], AsyncIterable[str]]): Base64 encoded
+                images, consumed lazily
+            max_concurrency (Optional[int]): Maximum analyses in flight.
+                Defaults to DEFAULT_BATCH_CONCURRENCY.
+            temperature (float, optional): Model temperature for response generation
+            max_tokens (int, optional): Maximum tokens for response
+            bypass_gates (bool): Skip the local image gates and always ask
+                                 the model
+
+        Yields:
+            BatchItemResult: Outcome of one image, in completion order; use
+                index to map it back to the input
+
+        Raises:
+            ValueError: If max_concurrency is less than 1
+        """
+        limit = max_concurrency or self.DEFAULT_BATCH_CONCURRENCY
+        if limit < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        if hasattr(images, "__aiter__"):
+            source = images.__aiter__()
+        else:
+            source = self._iterate_async(images)
+
+        pending = set()
+        index = 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < limit:
+                    try:
+                        image = await source.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(self._analyze_item(
+                        index, image, temperature, max_tokens, bypass_gates,
+                        timeout)))
+                    index += 1
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def cache_key(self, base64_image: str, temperature: float = None) -> str:
+        """
+        Compute the result cache key for an image and request parameters.
+
+        Args:
+            base64_image (str): Base64 encoded image data, optionally with a
+                                data URL prefix
+            temperature (float, optional): Model temperature for response generation
+
+        Returns:
+            str: Content-addressed key combining the decoded image bytes,
+                 model name, temperature and prompt fingerprint
+        """
+        return make_cache_key(self._image_digest(base64_image), self._result_model,
+                              temperature or self.DEFAULT_TEMPERATURE,
+                              self.prompt_fingerprint,
+                              self.preprocessor.signature)
+
+    def invalidate_cache(self, base64_image: Optional[str] = None,
+                         temperature: float = None) -> int:
+        """
+        Drop cached results for one image, or the whole cache.
+
+        Clears both the in-memory cache and, if configured, the persistent
+        store. For the persistent store every entry for the image is dropped
+        regardless of temperature. The near-duplicate index is only cleared
+        when the whole cache is invalidated.
+
+        Args:
+            base64_image (Optional[str]): Image whose cached result should be
+                                          dropped. If None, clears the cache.
+            temperature (float, optional): Temperature the result was cached under
+
+        Returns:
+            int: Number of entries removed
+        """
+        if base64_image is None:
+            removed = self.cache.invalidate()
+            if self.store is not None:
+                removed += self.store.invalidate()
+            if self.near_duplicates is not None:
+                removed += self.near_duplicates.clear()
+            return removed
+        removed = self.cache.invalidate(self.cache_key(base64_image, temperature))
+        if self.store is not None:
+            removed += self.store.invalidate(
+                image_sha256=self._image_digest(base64_image))
+        return removed
+
+    def usage_by_model(self) -> Dict[str, UsageTotals]:
+        """
+        Return token and latency totals of the upstream calls per model.
+
+        Returns:
+            Dict[str, UsageTotals]: Totals keyed by model name
+        """
+        return self.usage_ledger.by_model()
+
+    def prompt_usage(self) -> Dict[str, UsageTotals]:
+        """
+        Return token and latency totals of the upstream calls per prompt.
+
+        Compare the mean prompt and completion tokens of prompt versions by
+        running the same images through detectors configured with each.
+
+        Returns:
+            Dict[str, UsageTotals]: Totals keyed by prompt ID
+        """
+        return self.usage_ledger.by_prompt()
+
+    def cascade_stats(self) -> Optional[CascadeStats]:
+        """
+        Return the escalation rate and per-tier latency of the model cascade.
+
+        Token totals per tier are available from usage_by_model().
+
+        Returns:
+            Optional[CascadeStats]: Cascade counters, or None if the cascade
+                                    is disabled
+        """
+        return self.cascade.stats() if self.cascade is not None else None
+
+    def resolution_stats(self) -> Optional[ResolutionStats]:
+        """
+        Return the escalation rate and per-pass figures of resolution escalation.
+
+        Returns:
+            Optional[ResolutionStats]: Escalation counters, or None if
+                                       resolution escalation is disabled
+        """
+        return self.resolution.stats() if self.resolution is not None else None
+
+    def hedge_stats(self) -> Optional[HedgeStats]:
+        """
+        Return the hedge rate, win rate and current delay of request hedging.
+
+        Only the async analysis path (_hedged_attempt_async) is hedged; calls
+        made through the sync path and streamed calls are never hedged and do
+        not show up in these counters.
+
+        Returns:
+            Optional[HedgeStats]: Hedging counters, or None if hedging is
+                                  disabled
+        """
+        return self.hedge_policy.stats() if self.hedge_policy is not None else None
+
+    async def _analyze_item(self, index: int, base64_image: str,
+                            temperature: float = None,
+                            max_tokens: int = None,
+                            bypass_gates: bool = False,
+                            timeout: Optional[float] = None) -> BatchItemResult:
+        """Analyze one batch image, capturing any failure in the result"""
+        try:
+            result = await self.analyze_leaf_image_async(
+                base64_image, temperature, max_tokens, bypass_gates, timeout)
+            return BatchItemResult(index=index, result=result)
+        except Exception as e:
+            return BatchItemResult(index=index, error=str(e))
+
+    @staticmethod
+    async def _iterate_async(images: Iterable[str]) -> AsyncIterator[str]:
+        """Adapt a plain iterable to the async iteration protocol"""
+        for image in images:
+            yield image
+
+    def _image_digest(self, base64_image: str) -> str:
+        """Return the SHA-256 hex digest of the decoded image bytes"""
+        image_bytes = base64.b64decode(self._clean_base64(base64_image))
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def _prepare(self, base64_image: str,
+                 temperature: float = None,
+                 bypass_gates: bool = False) -> _PreparedAnalysis:
+        """
+        Run the local stages of an analysis ahead of the upstream call
+
+        Validates the input, computes cache keys and answers from the exact
+        result cache or the near-duplicate index when possible. Otherwise the
+        image is preprocessed into the payload for the upstream call and run
+        through the local image gates. If the returned object has a result,
+        no upstream call is needed.
+
+        Args:
+            base64_image (str): Base64 encoded image data
+            temperature (float, optional): Model temperature for response generation
+            bypass_gates (bool): Skip the local image gates
+
+        Returns:
+            _PreparedAnalysis: Upstream payload, cache keys and any local result
+        """
+        base64_image = self._clean_base64(base64_image)
+        image_bytes = base64.b64decode(base64_image)
+        image_sha256 = hashlib.sha256(image_bytes).hexdigest()
+        temperature = temperature or self.DEFAULT_TEMPERATURE
+        pipeline = self.preprocessor.signature
+        prepared = _PreparedAnalysis(
+            base64_image=base64_image,
+            image_sha256=image_sha256,
+            cache_key=make_cache_key(image_sha256, self._result_model, temperature,
+                                     self.prompt_fingerprint, pipeline),
+            variant=(f"{self._result_model}|{temperature:.4f}"
+                     f"|{self.prompt_fingerprint}|{pipeline}"))
+
+        prepared.result = self._lookup_cached(prepared.cache_key)
+        if prepared.result is not None:
+            logger.info("Returning cached analysis result")
+            return prepared
+
+        try:
+            processed = self.preprocessor.process(image_bytes)
+        except ValueError as e:
+            # Let the model judge payloads Pillow cannot read
+            logger.warning(f"Preprocessing skipped: {str(e)}")
+            return prepared
+        prepared.preprocessed = processed
+        prepared.base64_image = base64.b64encode(processed.data).decode('utf-8')
+        prepared.mime_type = processed.mime_type
+        logger.info(
+            f"Preprocessed {processed.original_format} "
+            f"{processed.original_size[0]}x{processed.original_size[1]} -> "
+            f"{processed.width}x{processed.height}, "
+            f"{processed.original_bytes} -> {len(processed.data)} bytes "
+            f"(saved {processed.bytes_saved}), crop {processed.crop_box}, "
+            f"timings {processed.timings}")
+
+        if not bypass_gates:
+            rejection = self._run_gates(processed)
+            if rejection is not None:
+                logger.info(f"Image rejected locally by {rejection.gate}: "
+                            f"{rejection.reason} {rejection.features}")
+                prepared.result = rejection_result(rejection)
+                return prepared
+
+        if self.near_duplicates is not None:
+            prepared.perceptual_hash = phash(processed.image)
+            match = self.near_duplicates.find(
+                prepared.perceptual_hash, prepared.variant)
+            if match is not None:
+                distance, result = match
+                logger.info(
+                    f"Returning near-duplicate result (distance {distance})")
+                result["near_duplicate"] = True
+                result["hash_distance"] = distance
+                prepared.result = result
+                return prepared
+
+        if (self.resolution is not None
+                and max(processed.width, processed.height) > self.resolution.preview_side):
+            preview = self.preprocessor.render(
+                processed.image, self.resolution.preview_side)
+            prepared.preview_base64 = base64.b64encode(preview).decode('utf-8')
+        return prepared
+
+    def _run_gates(self, processed: PreprocessedImage) -> Optional[GateRejection]:
+        """
+        Run the configured local image gates on a preprocessed image
+
+        The quality gate runs first so that a dark or blurry leaf is reported
+        as such rather than as a non-plant image.
+
+        Args:
+            processed (PreprocessedImage): Output of the preprocessing stage
+
+        Returns:
+            Optional[GateRejection]: First rejection raised, or None if the
+                                     image should be sent upstream
+        """
+        if self.quality_gate is not None:
+            rejection = self.quality_gate.check(
+                processed.image, processed.original_size)
+            if rejection is not None:
+                return rejection
+        if self.plant_filter is not None:
+            rejection = self.plant_filter.check(processed.image)
+            if rejection is not None:
+                return rejection
+        return None
+
+    def _complete(self, prepared: _PreparedAnalysis, request: Dict,
+                  deadline: Deadline) -> Tuple[Dict, Optional[CallUsage]]:
+        """Make the upstream calls for a prepared analysis and record the result with the usage of every pass"""
+        if prepared.preview_base64 is None:
+            result, call_usage = self._analyze_request(request, deadline)
+            # Return as dictionary for JSON serialization
+            return self._store(prepared, self._single_pass(result)), call_usage
+
+        preview_request = self._preview_request(request, prepared)
+        started = time.monotonic()
+        preview, preview_usage = None, None
+        try:
+            preview, preview_usage = self._analyze_request(preview_request, deadline)
+        except ValueError as e:
+            logger.warning(f"Preview answer could not be parsed: {str(e)}")
+        reason = self._judge_preview(preview, prepared, started)
+        if reason is None:
+            return self._store(prepared, dict(preview, resolution_pass=PREVIEW)), preview_usage
+
+        started = time.monotonic()
+        try:
+            result, call_usage = self._analyze_request(request, deadline)
+        except Exception as e:
+            return self._resolution_fallback(preview, reason, e), preview_usage
+        self.resolution.record(FULL, time.monotonic() - started,
+                               len(prepared.base64_image))
+        result = dict(result, resolution_pass=FULL, resolution_reason=reason)
+        return (self._store(prepared, result),
+                CallUsage.combine(preview_usage, call_usage))
+
+    async def _complete_async(self, prepared: _PreparedAnalysis,
+                              request: Dict, deadline: Deadline
+                              ) -> Tuple[Dict, Optional[CallUsage]]:
+        """Coroutine counterpart of _complete() using the backend's async calls"""
+        if prepared.preview_base64 is None:
+            result, call_usage = await self._analyze_request_async(request, deadline)
+            return self._store(prepared, self._single_pass(result)), call_usage
+
+        preview_request = self._preview_request(request, prepared)
+        started = time.monotonic()
+        preview, preview_usage = None, None
+        try:
+            preview, preview_usage = await self._analyze_request_async(
+                preview_request, deadline)
+        except ValueError as e:
+            logger.warning(f"Preview answer could not be parsed: {str(e)}")
+        reason = self._judge_preview(preview, prepared, started)
+        if reason is None:
+            return self._store(prepared, dict(preview, resolution_pass=PREVIEW)), preview_usage
+
+        started = time.monotonic()
+        try:
+            result, call_usage = await self._analyze_request_async(request, deadline)
+        except Exception as e:
+            return self._resolution_fallback(preview, reason, e), preview_usage
+        self.resolution.record(FULL, time.monotonic() - started,
+                               len(prepared.base64_image))
+        result = dict(result, resolution_pass=FULL, resolution_reason=reason)
+        return (self._store(prepared, result),
+                CallUsage.combine(preview_usage, call_usage))
+
+    def _analyze_request(self, request: Dict, deadline: Deadline
+                         ) -> Tuple[Dict, Optional[CallUsage]]:
+        """
+        Get the parsed result for one request, through the model cascade if enabled
+
+        The usage returned covers both tiers of an escalated answer.
+
+        Raises:
+            ValueError: If no analysis could be recovered from the answer
+        """
+        if self.cascade is None:
+            content, call_usage = self._generate(request, deadline)
+            return self._to_result(content), call_usage
+
+        started = time.monotonic()
+        content, fast_usage = self._generate(
+            dict(request, model=self.cascade.fast_model), deadline)
+        self.cascade.record(FAST, time.monotonic() - started)
+        fast_result, reason = self._judge_fast_tier(content)
+        if reason is None:
+            return dict(fast_result, model_tier=FAST), fast_usage
+
+        started = time.monotonic()
+        try:
+            content, call_usage = self._generate(
+                dict(request, model=self.cascade.strong_model), deadline)
+            result = self._to_result(content)
+        except Exception as e:
+            return self._cascade_fallback(fast_result, reason, e), fast_usage
+        self.cascade.record(STRONG, time.monotonic() - started)
+        result = dict(result, model_tier=STRONG, escalation_reason=reason)
+        return result, CallUsage.combine(fast_usage, call_usage)
+
+    async def _analyze_request_async(self, request: Dict, deadline: Deadline
+                                     ) -> Tuple[Dict, Optional[CallUsage]]:
+        """Coroutine counterpart of _analyze_request() using the backend's async calls"""
+        if self.cascade is None:
+            content, call_usage = await self._generate_async(request, deadline)
+            return self._to_result(content), call_usage
+
+        started = time.monotonic()
+        content, fast_usage = await self._generate_async(
+            dict(request, model=self.cascade.fast_model), deadline)
+        self.cascade.record(FAST, time.monotonic() - started)
+        fast_result, reason = self._judge_fast_tier(content)
+        if reason is None:
+            return dict(fast_result, model_tier=FAST), fast_usage
+
+        started = time.monotonic()
+        try:
+            content, call_usage = await self._generate_async(
+                dict(request, model=self.cascade.strong_model), deadline)
+            result = self._to_result(content)
+        except Exception as e:
+            return self._cascade_fallback(fast_result, reason, e), fast_usage
+        self.cascade.record(STRONG, time.monotonic() - started)
+        result = dict(result, model_tier=STRONG, escalation_reason=reason)
+        return result, CallUsage.combine(fast_usage, call_usage)
+
+    def _generate(self, request: Dict,
+                  deadline: Deadline) -> Tuple[str, Optional[CallUsage]]:
+        """Make the upstream call for a request, returning the answer text and its usage"""
+        try:
+            completion, call_usage = self.retry_policy.run(
+                lambda timeout: self._attempt(request, timeout), deadline)
+        except BadRequestError as e:
+            content = self._failed_generation(e)
+            if content is not None:
+                return content, None
+            fallback = self._drop_output_constraint(request, e)
+            if fallback is None:
+                raise
+            completion, call_usage = self.retry_policy.run(
+                lambda timeout: self._attempt(fallback, timeout), deadline)
+        logger.info("API request completed successfully")
+        return completion.choices[0].message.content, call_usage
+
+    async def _generate_async(self, request: Dict, deadline: Deadline
+                              ) -> Tuple[str, Optional[CallUsage]]:
+        """Coroutine counterpart of _generate() using the backend's async calls"""
+        try:
+            completion, call_usage = await self.retry_policy.run_async(
+                lambda timeout: self._hedged_attempt_async(request, timeout),
+                deadline)
+        except BadRequestError as e:
+            content = self._failed_generation(e)
+            if content is not None:
+                return content, None
+            fallback = self._drop_output_constraint(request, e)
+            if fallback is None:
+                raise
+            completion, call_usage = await self.retry_policy.run_async(
+                lambda timeout: self._hedged_attempt_async(fallback, timeout),
+                deadline)
+        logger.info("API request completed successfully")
+        return completion.choices[0].message.content, call_usage
+
+    def _judge_fast_tier(self, content: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Parse a first-tier answer and decide whether to escalate it
+
+        Returns:
+            Tuple[Optional[Dict], Optional[str]]: The parsed result (None if
+                it could not be parsed) and the escalation reason (None to
+                keep the answer)
+        """
+        try:
+            result = self._to_result(content)
+        except ValueError as e:
+            logger.warning(f"Fast-tier answer could not be parsed: {str(e)}")
+            result = None
+        reason = self.cascade.escalation_reason(result)
+        if reason is not None:
+            self.cascade.record_escalation(reason)
+            logger.info(f"Escalating to {self.cascade.strong_model}: {reason}")
+        return result, reason
+
+    def _cascade_fallback(self, fast_result: Optional[Dict], reason: str,
+                          error: Exception) -> Dict:
+        """
+        Answer with the first-tier result when the escalated call failed
+
+        The result is not cached, so the image is escalated again next time.
+
+        Raises:
+            Exception: error, if the first-tier answer was unusable too
+        """
+        if fast_result is None:
+            raise error
+        self.cascade.record_fallback()
+        logger.warning(f"Escalated call failed, keeping the fast-tier "
+                       f"answer: {str(error)}")
+        return dict(fast_result, model_tier=FAST, escalation_reason=reason,
+                    escalation_failed=True)
+
+    def _single_pass(self, result: Dict) -> Dict:
+        """Mark a result of an image too small for a preview as a full-resolution answer"""
+        if self.resolution is None:
+            return result
+        return dict(result, resolution_pass=FULL)
+
+    def _preview_request(self, request: Dict, prepared: _PreparedAnalysis) -> Dict:
+        """Return request with the image replaced by the preview rendition"""
+        return self._build_request(
+            prepared.preview_base64, request["temperature"],
+            request["max_completion_tokens"], prepared.mime_type)
+
+    def _judge_preview(self, preview: Optional[Dict], prepared: _PreparedAnalysis,
+                       started: float) -> Optional[str]:
+        """
+        Record the preview pass and decide whether to resend at full resolution
+
+        Returns:
+            Optional[str]: The escalation reason, or None to keep the preview
+        """
+        self.resolution.record(PREVIEW, time.monotonic() - started,
+                               len(prepared.preview_base64))
+        reason = self.resolution.escalation_reason(preview)
+        if reason is not None:
+            self.resolution.record_escalation(reason)
+            logger.info(f"Resending at full resolution: {reason}")
+        return reason
+
+    def _resolution_fallback(self, preview: Optional[Dict], reason: str,
+                             error: Exception) -> Dict:
+        """
+        Answer with the preview result when the full-resolution pass failed
+
+        The result is not cached, so the image is escalated again next time.
+
+        Raises:
+            Exception: error, if the preview answer was unusable too
+        """
+        if preview is None:
+            raise error
+        self.resolution.record_fallback()
+        logger.warning(f"Full-resolution pass failed, keeping the preview "
+                       f"answer: {str(error)}")
+        return dict(preview, resolution_pass=PREVIEW, resolution_reason=reason,
+                    escalation_failed=True)
+
+    def _attempt(self, request: Dict, timeout: Optional[float]):
+        """Make one scheduled upstream attempt that gives up after timeout seconds, returning the completion and its usage"""
+        deadline = Deadline.after(timeout)
+        ticket = self.breaker.before_call()
+        try:
+            reservation = self.scheduler.acquire(max_wait=timeout)
+        except BaseException:
+            self.breaker.record(ticket, None)
+            raise
+        started = time.monotonic()
+        try:
+            response = self.backend.complete(request, deadline.remaining())
+        except BaseException as e:
+            self._release_failed(request, reservation, ticket, started, e)
+            raise
+        return self._release_completed(request, reservation, ticket, started,
+                                       response.body, response.headers)
+
+    async def _hedged_attempt_async(self, request: Dict, timeout: Optional[float]):
+        """Make one async attempt, hedged with a backup call if configured"""
+        if self.hedge_policy is None:
+            return await self._attempt_async(request, timeout)
+        return await self.hedge_policy.run_async(
+            lambda: self._attempt_async(request, timeout))
+
+    async def _attempt_async(self, request: Dict, timeout: Optional[float]):
+        """Coroutine counterpart of _attempt() using the backend's async calls"""
+        deadline = Deadline.after(timeout)
+        ticket = self.breaker.before_call()
+        try:
+            reservation = await self.scheduler.acquire_async(max_wait=timeout)
+        except BaseException:
+            self.breaker.record(ticket, None)
+            raise
+        started = time.monotonic()
+        try:
+            response = await self.backend.complete_async(
+                request, deadline.remaining())
+        except BaseException as e:
+            self._release_failed(request, reservation, ticket, started, e)
+            raise
+        return self._release_completed(request, reservation, ticket, started,
+                                       response.body, response.headers)
+
+    def _open_stream(self, request: Dict, timeout: Optional[float]) -> _OpenedStream:
+        """Open one scheduled streaming call; the caller releases it once consumed"""
+        deadline = Deadline.after(timeout)
+        ticket = self.breaker.before_call()
+        try:
+            reservation = self.scheduler.acquire(max_wait=timeout)
+        except BaseException:
+            self.breaker.record(ticket, None)
+            raise
+        started = time.monotonic()
+        try:
+            response = self.backend.stream(request, deadline.remaining())
+            return _OpenedStream(response.body, reservation, ticket, started,
+                                 response.headers)
+        except BaseException as e:
+            self._release_failed(request, reservation, ticket, started, e)
+            raise
+
+    async def _open_stream_async(self, request: Dict,
+                                 timeout: Optional[float]) -> _OpenedStream:
+        """Coroutine counterpart of _open_stream() using the backend's async calls"""
+        deadline = Deadline.after(timeout)
+        ticket = self.breaker.before_call()
+        try:
+            reservation = await self.scheduler.acquire_async(max_wait=timeout)
+        except BaseException:
+            self.breaker.record(ticket, None)
+            raise
+        started = time.monotonic()
+        try:
+            response = await self.backend.stream_async(
+                request, deadline.remaining())
+            return _OpenedStream(response.body, reservation, ticket,
+                                 started, response.headers)
+        except BaseException as e:
+            self._release_failed(request, reservation, ticket, started, e)
+            raise
+
+    def _release_stream(self, request: Dict, opened: _OpenedStream,
+                        usage) -> CallUsage:
+        """Report a fully consumed stream to the scheduler, breaker and usage ledger"""
+        upstream_seconds = time.monotonic() - opened.started
+        self.breaker.record(opened.ticket, True, upstream_seconds)
+        self.scheduler.release(opened.reservation,
+                               used_tokens=getattr(usage, "total_tokens", None),
+                               headers=opened.headers)
+        return self._record_usage(request, opened.reservation, usage,
+                                  upstream_seconds)
+
+    @staticmethod
+    def _chunk_text(chunk) -> Optional[str]:
+        """Text delta carried by a streamed completion chunk, if any"""
+        if not chunk.choices:
+            return None
+        return chunk.choices[0].delta.content
+
+    @staticmethod
+    def _chunk_usage(chunk):
+        """Token usage reported by a streamed chunk (on the last one), if any"""
+        return (getattr(chunk, "usage", None)
+                or getattr(getattr(chunk, "x_groq", None), "usage", None))
+
+    def _local_events(self, prepared: _PreparedAnalysis,
+                      include_usage: bool = False) -> Iterator[StreamEvent]:
+        """Events available before any upstream call: preprocessing and local results"""
+        processed = prepared.preprocessed
+        if processed is not None:
+            yield StreamEvent("preprocessed", value={
+                "original_size": list(processed.original_size),
+                "size": [processed.width, processed.height],
+                "bytes_saved": processed.bytes_saved,
+                "cropped": processed.crop_box is not None,
+                "timings": processed.timings,
+            })
+        if prepared.result is not None:
+            for name, value in prepared.result.items():
+                yield StreamEvent("field", name, value)
+            yield StreamEvent("done", value=self._with_usage(
+                prepared.result, None, include_usage))
+
+    @staticmethod
+    def _failed_generation(error: BadRequestError) -> Optional[str]:
+        """
+        Return the answer the provider rejected for not matching JSON mode
+
+        Groq reports json_validate_failed together with the generated text,
+        which the tolerant parser can often still use, saving another call.
+        """
+        body = error.body if isinstance(error.body, dict) else {}
+        body = body.get("error", body)
+        if body.get("code") != "json_validate_failed":
+            return None
+        content = body.get("failed_generation")
+        if content:
+            logger.warning("Answer failed JSON mode validation, parsing the "
+                           "failed generation instead")
+        return content or None
+
+    def _drop_output_constraint(self, request: Dict,
+                                error: BadRequestError) -> Optional[Dict]:
+        """
+        Return request without response_format if the provider rejected it
+
+        The constraint is switched off for later calls as well, so an
+        unsupported mode costs one failed call per process.
+
+        Returns:
+            Optional[Dict]: Request to retry, or None if the error has
+                            another cause
+        """
+        if "response_format" not in request or "response_format" not in str(error):
+            return None
+        logger.warning(f"Provider rejected response_format "
+                       f"{self._output_mode}, falling back to plain text: "
+                       f"{str(error)}")
+        self._output_mode = "text"
+        return {key: value for key, value in request.items()
+                if key != "response_format"}
+
+    def _record_usage(self, request: Dict, reservation: Reservation, usage,
+                      upstream_seconds: float) -> CallUsage:
+        """Record the tokens and timings of one successful upstream call in the ledger"""
+        call_usage = CallUsage.from_completion_usage(
+            usage, model=request["model"], prompt_id=self.prompt.prompt_id,
+            prompt_chars=len(self.create_analysis_prompt()),
+            queue_seconds=reservation.queued_seconds,
+            upstream_seconds=upstream_seconds)
+        self.usage_ledger.record(call_usage)
+        logger.info(f"Upstream call used {call_usage.prompt_tokens} prompt "
+                    f"(~{call_usage.image_tokens} image) and "
+                    f"{call_usage.completion_tokens} completion tokens, "
+                    f"queued {call_usage.queue_ms:.0f} ms, upstream "
+                    f"{call_usage.upstream_ms:.0f} ms "
+                    f"({call_usage.model}, prompt {call_usage.prompt_id})")
+        return call_usage
+
+    @staticmethod
+    def _with_usage(result: Dict, call_usage: Optional[CallUsage],
+                    include_usage: bool) -> Dict:
+        """Return result with the usage metadata attached if it was asked for"""
+        if not include_usage:
+            return result
+        return dict(result, usage=call_usage.as_dict() if call_usage else None)
+
+    def _release_completed(self, request: Dict, reservation: Reservation,
+                           ticket: BreakerTicket, started: float, completion,
+                           headers=None) -> Tuple[Any, CallUsage]:
+        """Report a successful call to the scheduler, breaker and usage ledger"""
+        upstream_seconds = time.monotonic() - started
+        self.breaker.record(ticket, True, upstream_seconds)
+        usage = getattr(completion, "usage", None)
+        self.scheduler.release(reservation,
+                               used_tokens=getattr(usage, "total_tokens", None),
+                               headers=headers)
+        return completion, self._record_usage(request, reservation, usage,
+                                              upstream_seconds)
+
+    def _release_failed(self, request: Dict, reservation: Reservation,
+                        ticket: BreakerTicket, started: float,
+                        error: BaseException):
+        """Report a failed call to the scheduler, breaker and usage ledger, flagging rate-limit errors"""
+        # Rate limits, client errors and cancellations say nothing about upstream health
+        upstream_failure = (isinstance(error, Exception)
+                            and not isinstance(error, RateLimitError)
+                            and self.retry_policy.is_retryable(error))
+        self.breaker.record(ticket, False if upstream_failure else None,
+                            time.monotonic() - started)
+        if isinstance(error, Exception):
+            self.usage_ledger.record_failure(request["model"],
+                                             self.prompt.prompt_id)
+        if isinstance(error, RateLimitError):
+            logger.warning(f"Upstream rate limit hit: {str(error)}")
+            self.scheduler.release(reservation, rate_limited=True,
+                                   headers=error.response.headers)
+        else:
+            self.scheduler.release(reservation)
+
+    def _deadline(self, timeout: Optional[float]) -> Deadline:
+        """Start the overall deadline of one analysis"""
+        return Deadline.after(self.DEFAULT_TIMEOUT if timeout is None else timeout)
+
+    @staticmethod
+    def _flight_key(prepared: _PreparedAnalysis, request: Dict) -> str:
+        """Key under which identical concurrent upstream calls are coalesced"""
+        return f"{prepared.cache_key}|{request['max_completion_tokens']}"
+
+    def _finish(self, prepared: _PreparedAnalysis, content: str) -> Dict:
+        """
+        Parse the model's answer and record it in the caches
+
+        Args:
+            prepared (_PreparedAnalysis): State returned by _prepare()
+            content (str): Message content of the completion
+
+        An answer cut off by the token limit is returned with the fields that
+        could be recovered, flagged with truncated, recovered_fields and
+        repaired_fields. It is not cached, since a larger max_tokens would
+        produce a complete answer for the same cache key.
+
+        Streamed answers are single-pass, so they are not cached while the
+        model cascade or resolution escalation is enabled: the cache key
+        promises a result with model_tier or resolution_pass.
+
+        Returns:
+            Dict: Analysis results as dictionary (JSON serializable)
+        """
+        result = self._to_result(content)
+        if self.cascade is not None or self.resolution is not None:
+            return result
+        return self._store(prepared, result)
+
+    def _to_result(self, content: str) -> Dict:
+        """
+        Parse the model's answer into a result dictionary
+
+        Raises:
+            ValueError: If no analysis could be recovered from the answer
+        """
+        analysis, parsed = self._parse_response(content)
+        result = analysis.__dict__
+        if parsed.truncated:
+            result["truncated"] = True
+            result["recovered_fields"] = list(parsed.data)
+            result["repaired_fields"] = parsed.repaired
+        return result
+
+    def _store(self, prepared: _PreparedAnalysis, result: Dict) -> Dict:
+        """Record a parsed result in the caches unless it was truncated or a fallback"""
+        if result.get("truncated") or result.get("escalation_failed"):
+            return result
+        self._remember(prepared.cache_key, prepared.image_sha256, result)
+        if self.near_duplicates is not None and prepared.perceptual_hash is not None:
+            self.near_duplicates.add(
+                prepared.perceptual_hash, prepared.variant, result)
+        return result
+
+    def _lookup_cached(self, cache_key: str) -> Optional[Dict]:
+        """
+        Return a cached result from memory or the persistent store
+
+        Hits from the persistent store are promoted into the in-memory cache.
+        Store failures are logged and treated as misses.
+        """
+        cached = self.cache.get(cache_key)
+        if cached is None and self.store is not None:
+            try:
+                cached = self.store.get(cache_key)
+            except Exception as e:
+                logger.warning(f"Result store lookup failed: {str(e)}")
+            if cached is not None:
+                self.cache.put(cache_key, cached)
+        return cached
+
+    def _remember(self, cache_key: str, image_sha256: str, result: Dict):
+        """Store a fresh result in memory and in the persistent store"""
+        self.cache.put(cache_key, result)
+        if self.store is not None:
+            try:
+                self.store.put(cache_key, result, image_sha256=image_sha256)
+            except Exception as e:
+                logger.warning(f"Result store write failed: {str(e)}")
+
+    def _clean_base64(self, base64_image: str) -> str:
+        """
+        Validate base64 input and strip any data URL prefix
+
+        Args:
+            base64_image (str): Base64 encoded image data
+
+        Returns:
+            str: Bare base64 payload
+
+        Raises:
+            ValueError: If base64_image is not a non-empty string
+        """
+        # Validate base64 input
+        if not isinstance(base64_image, str):
+            raise ValueError("base64_image must be a string")
+
+        if not base64_image:
+            raise ValueError("base64_image cannot be empty")
+
+        # Clean base64 string (remove data URL prefix if present)
+        if base64_image.startswith('data:'):
+            base64_image = base64_image.split(',', 1)[1]
+
+        return base64_image
+
+    def _build_request(self, base64_image: str,
+                       temperature: float = None,
+                       max_tokens: int = None,
+                       mime_type: str = "image/jpeg",
+                       stream: bool = False) -> Dict:
+        """
+        Validate the image input and build chat completion request parameters
+
+        Args:
+            base64_image (str): Base64 encoded image data, optionally with a
+                                data URL prefix
+            temperature (float, optional): Model temperature for response generation
+            max_tokens (int, optional): Maximum tokens for response
+            mime_type (str): MIME type of the encoded image
+            stream (bool): Request the answer as a stream of chunks. Streamed
+                           requests are sent without the prompt's output
+                           constraint, which the provider does not stream.
+
+        Returns:
+            Dict: Keyword arguments of a chat.completions.create() call, as
+                  sent by the backend
+
+        Raises:
+            ValueError: If base64_image is not a non-empty string
+        """
+        base64_image = self._clean_base64(base64_image)
+
+        # Prepare request parameters
+        temperature = temperature or self.DEFAULT_TEMPERATURE
+        max_tokens = max_tokens or self.DEFAULT_MAX_TOKENS
+
+        request = dict(
+            model=self.model_name,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": self.create_analysis_prompt()
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{mime_type};base64,{base64_image}"
+                            }
+                        }
+                    ]
+                }
+            ],
+            temperature=temperature,
+            max_completion_tokens=max_tokens,
+            top_p=1,
+            stream=stream,
+            stop=None,
+        )
+        response_format = self.prompt.response_format(self._output_mode)
+        if response_format is not None and not stream:
+            request["response_format"] = response_format
+        return request
+
+    def _parse_response(self, response_content: str) -> Tuple[DiseaseAnalysisResult, ParsedObject]:
+        """
+        Parse and validate API response
+
+        The first JSON object in the response is extracted in a single pass,
+        ignoring markdown fences and surrounding text. If the response was
+        cut off, the completed fields are kept and the field being written is
+        repaired, so the answer is usable without another upstream call.
+
+        Args:
+            response_content (str): Raw response from API
+
+        Returns:
+            Tuple[DiseaseAnalysisResult, ParsedObject]: Parsed and validated
+                results, and how the fields were recovered
+
+        Raises:
+            ValueError: If no object was found, or a truncated response lacks
+                        even the disease_detected field
+        """
+        parsed = parse_json_object(response_content)
+        disease_data = parsed.data
+        if not disease_data or (parsed.truncated
+                                and 'disease_detected' not in disease_data):
             logger.error(
                 f"Could not parse response as JSON. Raw response: {response_content}")
             raise ValueError(
                 f"Unable to parse API response as JSON: {response_content[:200]}...")
 
+        if parsed.truncated:
+            logger.warning(
+                f"Response was truncated; recovered fields {list(disease_data)}, "
+                f"repaired {parsed.repaired}")
+        else:
+            logger.info("Response parsed successfully as JSON")
+
+        # Validate required fields and create result object
+        return DiseaseAnalysisResult(
+            disease_detected=bool(disease_data.get('disease_detected', False)),
+            disease_name=disease_data.get('disease_name'),
+            disease_type=disease_data.get('disease_type', 'unknown'),
+            severity=disease_data.get('severity', 'unknown'),
+            confidence=float(disease_data.get('confidence', 0)),
+            symptoms=disease_data.get('symptoms', []),
+            possible_causes=disease_data.get('possible_causes', []),
+            treatment=disease_data.get('treatment', [])
+        ), parsed
+
 
 def main():
     """Main execution function for testing"""
@@ -0,0 +1,259 @@
+"""
+Perceptual hashing and near-duplicate lookup for the Leaf Disease Detection System.
+
+Re-saved or re-photographed leaves produce different bytes and therefore miss
+the content-addressed result cache. This module computes 64-bit perceptual
+hashes on a small grayscale rendition of each image and indexes them in a
+BK-tree, so images within a small Hamming distance of an earlier upload can be
+answered with the stored diagnosis.
+
+Classes:
+    BKTree: Metric tree for sub-linear Hamming-distance range queries
+    NearDuplicateIndex: Bounded, thread-safe index of hashes to analysis results
+
+Functions:
+    dhash: Difference hash of an image
+    phash: DCT-based perceptual hash of an image
+    hamming_distance: Number of differing bits between two hashes
+
+Usage:
+    >>> index = NearDuplicateIndex(max_distance=6)
+    >>> index.add(phash(image), variant, result)
+    >>> index.find(phash(other_image), variant)
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+def _grayscale(image: Image.Image, size: Tuple[int, int]) -> np.ndarray:
+    """Downscale an image to a grayscale float array of the given (width, height)"""
+    if image.mode != "L":
+        image = image.convert("L")
+    small = image.resize(size, Image.Resampling.BILINEAR)
+    return np.asarray(small, dtype=np.float32)
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    """Pack a boolean array into an integer, most significant bit first"""
+    value = 0
+    for bit in np.packbits(bits.ravel()):
+        value = (value << 8) | int(bit)
+    return value
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Compute the difference hash of an image.
+
+    Each bit records whether a pixel is brighter than its right neighbour on a
+    (hash_size + 1) x hash_size grayscale thumbnail.
+
+    Args:
+        image (Image.Image): Image to hash
+        hash_size (int): Bits per row and column (8 gives a 64-bit hash)
+
+    Returns:
+        int: Hash value with hash_size * hash_size bits
+    """
+    pixels = _grayscale(image, (hash_size + 1, hash_size))
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+_DCT_CACHE: Dict[int, np.ndarray] = {}
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Return the orthonormal DCT-II basis matrix of size n x n"""
+    matrix = _DCT_CACHE.get(n)
+    if matrix is None:
+        k = np.arange(n)[:, None]
+        i = np.arange(n)[None, :]
+        matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        matrix[0] /= np.sqrt(2.0)
+        _DCT_CACHE[n] = matrix
+    return matrix
+
+
+def phash(image: Image.Image, hash_size: int = 8, highfreq_factor: int = 4) -> int:
+    """
+    Compute the DCT-based perceptual hash of an image.
+
+    The image is reduced to a square grayscale thumbnail, transformed with a
+    2-D DCT, and the lowest hash_size x hash_size frequencies are thresholded
+    against their median.
+
+    Args:
+        image (Image.Image): Image to hash
+        hash_size (int): Bits per row and column of the retained DCT block
+        highfreq_factor (int): Oversampling of the thumbnail before the DCT
+
+    Returns:
+        int: Hash value with hash_size * hash_size bits
+    """
+    n = hash_size * highfreq_factor
+    pixels = _grayscale(image, (n, n))
+    dct = _dct_matrix(n)
+    low = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    return _pack_bits(low > np.median(low))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Return the number of differing bits between two hashes"""
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer hashes under Hamming distance.
+
+    Range queries only descend into children whose edge distance lies within
+    the query radius of the node distance, which prunes most of the tree for
+    small radii.
+    """
+
+    def __init__(self):
+        # Each node is [hash, payloads, {distance: child}]
+        self._root: Optional[list] = None
+        self._size = 0
+
+    def add(self, value: int, payload: Any):
+        """
+        Insert a hash with an associated payload.
+
+        Args:
+            value (int): Hash value
+            payload (Any): Object returned by search() for this hash
+        """
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [payload], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(payload)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [payload], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """
+        Find every payload whose hash is within max_distance of value.
+
+        Args:
+            value (int): Query hash
+            max_distance (int): Maximum Hamming distance, inclusive
+
+        Returns:
+            List[Tuple[int, Any]]: (distance, payload) pairs sorted by distance
+        """
+        if self._root is None:
+            return []
+        matches = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, payload) for payload in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for edge, child in node[2].items()
+                         if low <= edge <= high)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class NearDuplicateIndex:
+    """
+    Bounded index of perceptual hashes to analysis results.
+
+    Results are grouped by a variant string (model, temperature and prompt) so
+    a match is only returned for the same request parameters. When the index
+    grows past max_entries the oldest quarter is dropped and the tree rebuilt.
+
+    Attributes:
+        max_distance (int): Largest Hamming distance treated as a duplicate
+        max_entries (int): Maximum number of indexed results
+    """
+
+    def __init__(self, max_distance: int = 6, max_entries: int = 10000):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, str], Dict]" = OrderedDict()
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, value: int, variant: str, result: Dict):
+        """
+        Index a result under its perceptual hash.
+
+        Args:
+            value (int): Perceptual hash of the analysed image
+            variant (str): Request parameters the result was produced with
+            result (Dict): Analysis result to return for near-duplicates
+        """
+        with self._lock:
+            key = (value, variant)
+            if key not in self._entries:
+                self._tree.add(value, key)
+            self._entries[key] = copy.deepcopy(result)
+            if len(self._entries) > self.max_entries:
+                for _ in range(max(1, self.max_entries // 4)):
+                    self._entries.popitem(last=False)
+                self._rebuild()
+
+    def find(self, value: int, variant: str,
+             max_distance: Optional[int] = None) -> Optional[Tuple[int, Dict]]:
+        """
+        Return the closest stored result for a hash, if one is close enough.
+
+        Args:
+            value (int): Perceptual hash of the query image
+            variant (str): Request parameters the result must match
+            max_distance (Optional[int]): Override of the index's max_distance
+
+        Returns:
+            Optional[Tuple[int, Dict]]: (distance, copy of the result), or None
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        with self._lock:
+            for distance, key in self._tree.search(value, max_distance):
+                result = self._entries.get(key)
+                if key[1] == variant and result is not None:
+                    self.hits += 1
+                    return distance, copy.deepcopy(result)
+            self.misses += 1
+            return None
+
+    def clear(self) -> int:
+        """Drop every indexed result and return how many were removed"""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._tree = BKTree()
+            return removed
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _rebuild(self):
+        """Rebuild the BK-tree from the surviving entries (lock must be held)"""
+        self._tree = BKTree()
+        for key in self._entries:
+            self._tree.add(key[0], key)
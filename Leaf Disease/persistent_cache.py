@@ -0,0 +1,252 @@
+"""
+Persistent result store for the Leaf Disease Detection System.
+
+This module keeps analysis results in a SQLite database so cache hits survive
+restarts and redeploys and are shared by every worker process on the host.
+The database runs in WAL mode, which lets any number of processes read while
+one of them writes.
+
+Entries are stamped with a version string derived from the model name and the
+analysis prompt. Opening the store with a different version drops the rows
+written by the old one, so changing MODEL_NAME or the prompt never serves a
+stale diagnosis.
+
+Classes:
+    SQLiteAnalysisCache: Disk-backed result cache with TTL compaction and size cap
+
+Usage:
+    >>> store = SQLiteAnalysisCache("analysis_cache.db", version="model|prompt")
+    >>> store.put(key, result, image_sha256=digest)
+    >>> store.get(key)
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from result_cache import CacheStats
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteAnalysisCache:
+    """
+    SQLite-backed analysis result cache shared across processes.
+
+    Every thread gets its own connection. Reads never take a write lock, and
+    expired or oversized data is removed by compact(), which also runs
+    automatically every compact_every writes.
+
+    Attributes:
+        path (str): Path to the SQLite database file
+        version (str): Version tag for entries written by this process
+        ttl_seconds (float): Lifetime of an entry in seconds
+        max_bytes (int): Maximum total size of stored results in bytes
+        compact_every (int): Number of writes between automatic compactions
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            image_sha256 TEXT,
+            version TEXT NOT NULL,
+            result TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS results_expires_at ON results (expires_at);
+        CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at);
+        CREATE TABLE IF NOT EXISTS meta (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, version: str = "",
+                 ttl_seconds: float = 7 * 24 * 3600.0,
+                 max_bytes: int = 256 * 1024 * 1024,
+                 compact_every: int = 100):
+        self.path = path
+        self.version = version
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.compact_every = compact_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        if version:
+            self.set_version(version)
+
+    def set_version(self, version: str) -> int:
+        """
+        Switch the store to a new version and drop entries from other versions.
+
+        Args:
+            version (str): Version tag, typically derived from model and prompt
+
+        Returns:
+            int: Number of stale entries removed
+        """
+        self.version = version
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                "SELECT value FROM meta WHERE name = 'version'").fetchone()
+            if row is not None and row[0] == version:
+                return 0
+            removed = conn.execute(
+                "DELETE FROM results WHERE version != ?", (version,)).rowcount
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('version', ?)",
+                (version,))
+        if removed:
+            logger.info(f"Dropped {removed} cached results from previous version")
+        return removed
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a stored result.
+
+        Args:
+            key (str): Cache key from make_cache_key()
+
+        Returns:
+            Optional[Dict]: Stored result, or None if missing, expired or
+                            written by another version
+        """
+        row = self._connect().execute(
+            "SELECT result FROM results WHERE key = ? AND version = ? "
+            "AND expires_at > ?", (key, self.version, time.time())).fetchone()
+        with self._lock:
+            if row is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict, image_sha256: Optional[str] = None):
+        """
+        Store a result for this version.
+
+        Args:
+            key (str): Cache key from make_cache_key()
+            result (Dict): JSON serializable analysis result
+            image_sha256 (Optional[str]): Digest of the image bytes, kept for
+                                          per-image invalidation
+        """
+        payload = json.dumps(result, default=str)
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, image_sha256, version, "
+                "result, size, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, image_sha256, self.version, payload, len(payload), now,
+                 now + self.ttl_seconds))
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.compact_every == 0
+        if due:
+            self.compact()
+
+    def invalidate(self, key: Optional[str] = None,
+                   image_sha256: Optional[str] = None) -> int:
+        """
+        Drop one entry, every entry for an image, or the whole store.
+
+        Args:
+            key (Optional[str]): Cache key to drop
+            image_sha256 (Optional[str]): Drop every entry for this image digest
+
+        Returns:
+            int: Number of entries removed
+        """
+        conn = self._connect()
+        with conn:
+            if key is not None:
+                return conn.execute(
+                    "DELETE FROM results WHERE key = ?", (key,)).rowcount
+            if image_sha256 is not None:
+                return conn.execute(
+                    "DELETE FROM results WHERE image_sha256 = ?",
+                    (image_sha256,)).rowcount
+            return conn.execute("DELETE FROM results").rowcount
+
+    def compact(self) -> int:
+        """
+        Remove expired entries, then the oldest entries until under max_bytes.
+
+        Returns:
+            int: Number of entries removed
+        """
+        conn = self._connect()
+        with conn:
+            expired = conn.execute(
+                "DELETE FROM results WHERE expires_at <= ?",
+                (time.time(),)).rowcount
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            evicted = 0
+            if total > self.max_bytes:
+                # Walk from the oldest entry until enough bytes are released
+                excess = total - self.max_bytes
+                released = 0
+                cutoff = None
+                for created_at, size in conn.execute(
+                        "SELECT created_at, size FROM results "
+                        "ORDER BY created_at"):
+                    released += size
+                    cutoff = created_at
+                    if released >= excess:
+                        break
+                evicted = conn.execute(
+                    "DELETE FROM results WHERE created_at <= ?",
+                    (cutoff,)).rowcount
+        with self._lock:
+            self._expirations += expired
+            self._evictions += evicted
+        return expired + evicted
+
+    def stats(self) -> CacheStats:
+        """
+        Return this process's counters together with the store's current size.
+
+        Returns:
+            CacheStats: Hit, miss, eviction and size counters
+        """
+        entries, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        with self._lock:
+            return CacheStats(hits=self._hits, misses=self._misses,
+                              evictions=self._evictions,
+                              expirations=self._expirations,
+                              entries=entries, bytes=size)
+
+    def close(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,402 @@
+"""
+Image preprocessing for the Leaf Disease Detection System.
+
+Uploads arrive in whatever form the phone or browser produced: multi-megapixel
+JPEGs, PNG screenshots, images rotated through EXIF tags. This module turns
+them into a compact, correctly labelled payload before it is sent upstream:
+EXIF orientation is applied, metadata is dropped, the image is converted to
+RGB, the longest side is capped and the result is re-encoded at a target
+quality. An optional LeafCropper can crop the image to the leaf region
+before it is resized, which both shrinks the payload and gives the leaf more
+of the pixel budget.
+
+Format and dimensions are sniffed from the file header before any pixel data
+is decoded. JPEGs are then decoded in draft mode, where libjpeg scales the
+DCT blocks by 1/2, 1/4 or 1/8 during decoding, so a 12 MP photo headed for a
+1024 px payload never materializes at full resolution. Other formats (PNG,
+BMP, TIFF, ...) fall back to a normal full decode. When a cropper is set, the
+leaf is first located on a 1/8 draft and the draft scale is then chosen so
+that the leaf region, not the whole frame, keeps at least max_side pixels.
+
+Classes:
+    PreprocessedImage: Encoded payload together with per-stage timings
+    PreprocessingStats: Aggregate byte and timing counters
+    ImagePreprocessor: Configurable preprocessing pipeline
+
+Usage:
+    >>> preprocessor = ImagePreprocessor(max_side=1024, quality=85)
+    >>> processed = preprocessor.process(image_bytes)
+    >>> processed.mime_type, processed.bytes_saved
+"""
+
+import io
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from PIL import ExifTags, Image, ImageOps
+
+from vegetation import LeafCropper
+
+
+@dataclass
+class PreprocessedImage:
+    """
+    Result of preprocessing one image.
+
+    Attributes:
+        data (bytes): Re-encoded image bytes
+        mime_type (str): MIME type matching data
+        width (int): Width of the encoded image in pixels
+        height (int): Height of the encoded image in pixels
+        original_format (str): Format detected in the upload (JPEG, PNG, ...)
+        original_size (tuple): (width, height) of the upload
+        original_bytes (int): Size of the upload in bytes
+        decoded_size (tuple): (width, height) actually decoded, smaller than
+            original_size when draft decoding was used
+        crop_box (Optional[tuple]): (left, top, right, bottom) of the leaf
+            crop in decoded pixel coordinates, None if not cropped
+        timings (Dict[str, float]): Milliseconds spent in each stage
+        image (Image.Image): Final RGB image, reused by later local stages
+    """
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_format: str
+    original_size: tuple
+    original_bytes: int
+    decoded_size: tuple = None
+    crop_box: Optional[tuple] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    image: Image.Image = field(default=None, repr=False)
+
+    @property
+    def bytes_saved(self) -> int:
+        """Bytes removed from the upload by preprocessing (negative if it grew)"""
+        return self.original_bytes - len(self.data)
+
+
+@dataclass
+class PreprocessingStats:
+    """
+    Aggregate preprocessing counters.
+
+    Attributes:
+        images (int): Images processed
+        input_bytes (int): Total bytes received
+        output_bytes (int): Total bytes produced
+        total_ms (float): Total preprocessing time in milliseconds
+    """
+    images: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    total_ms: float = 0.0
+
+
+class ImagePreprocessor:
+    """
+    Decode, normalize, downsize and re-encode uploaded images.
+
+    Attributes:
+        max_side (int): Longest side of the encoded image in pixels
+        quality (int): Encoder quality (1-100) for JPEG and WebP
+        output_format (str): Output format, "JPEG" or "WEBP"
+        draft_decode (bool): Decode JPEGs at reduced resolution when possible
+        cropper (Optional[LeafCropper]): Leaf-region crop applied before resizing
+    """
+
+    MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+    def __init__(self, max_side: int = 1024, quality: int = 85,
+                 output_format: str = "JPEG", draft_decode: bool = True,
+                 cropper: Optional[LeafCropper] = None):
+        output_format = output_format.upper()
+        if output_format not in ("JPEG", "WEBP"):
+            raise ValueError(f"Unsupported output format: {output_format}")
+        self.max_side = max_side
+        self.quality = quality
+        self.output_format = output_format
+        self.draft_decode = draft_decode
+        self.cropper = cropper
+        self._stats = PreprocessingStats()
+        self._lock = threading.Lock()
+
+    @property
+    def signature(self) -> str:
+        """Settings that change the encoded output, for use in cache keys"""
+        signature = f"{self.output_format}:{self.max_side}:{self.quality}"
+        if self.cropper is not None:
+            signature += f":{self.cropper.signature}"
+        return signature
+
+    def process(self, image_bytes: bytes) -> PreprocessedImage:
+        """
+        Run the full preprocessing pipeline on raw upload bytes.
+
+        Args:
+            image_bytes (bytes): Uploaded image file contents
+
+        Returns:
+            PreprocessedImage: Encoded payload, dimensions and stage timings
+
+        Raises:
+            ValueError: If the bytes cannot be decoded as an image
+        """
+        timings = {}
+        started = time.perf_counter()
+
+        image = self.open(image_bytes)
+        original_format = image.format or "UNKNOWN"
+        original_size = image.size
+        timings["sniff_ms"] = self._elapsed_ms(started)
+
+        # Locate the leaf on a cheap draft so the real decode can keep its detail
+        located = self.cropper is not None and self._drafts(image)
+        region = None
+        if located:
+            stage = time.perf_counter()
+            region = self.locate(image_bytes)
+            timings["locate_ms"] = self._elapsed_ms(stage)
+
+        stage = time.perf_counter()
+        image = self.decode(image, region)
+        timings["decode_ms"] = self._elapsed_ms(stage)
+        decoded_size = image.size
+
+        stage = time.perf_counter()
+        image = self.normalize(image)
+        timings["normalize_ms"] = self._elapsed_ms(stage)
+
+        crop_box = None
+        if region is not None:
+            stage = time.perf_counter()
+            crop_box = self._region_box(region, image.size)
+            image = image.crop(crop_box)
+            timings["crop_ms"] = self._elapsed_ms(stage)
+        elif self.cropper is not None and not located:
+            stage = time.perf_counter()
+            image, crop_box = self.cropper.crop(image)
+            timings["crop_ms"] = self._elapsed_ms(stage)
+
+        stage = time.perf_counter()
+        image = self.resize(image)
+        timings["resize_ms"] = self._elapsed_ms(stage)
+
+        stage = time.perf_counter()
+        data = self.encode(image)
+        timings["encode_ms"] = self._elapsed_ms(stage)
+        timings["total_ms"] = self._elapsed_ms(started)
+
+        with self._lock:
+            self._stats.images += 1
+            self._stats.input_bytes += len(image_bytes)
+            self._stats.output_bytes += len(data)
+            self._stats.total_ms += timings["total_ms"]
+
+        return PreprocessedImage(
+            data=data,
+            mime_type=self.MIME_TYPES[self.output_format],
+            width=image.width,
+            height=image.height,
+            original_format=original_format,
+            original_size=original_size,
+            original_bytes=len(image_bytes),
+            decoded_size=decoded_size,
+            crop_box=crop_box,
+            timings=timings,
+            image=image)
+
+    def open(self, image_bytes: bytes) -> Image.Image:
+        """
+        Identify an image from its header without decoding pixel data.
+
+        Args:
+            image_bytes (bytes): Uploaded image file contents
+
+        Returns:
+            Image.Image: Lazily loaded image with format and size populated
+
+        Raises:
+            ValueError: If the bytes are not a recognizable image
+        """
+        try:
+            return Image.open(io.BytesIO(image_bytes))
+        except Exception as e:
+            raise ValueError(f"Could not decode image: {str(e)}") from e
+
+    def locate(self, image_bytes: bytes) -> Optional[tuple]:
+        """
+        Find the leaf region on a cheap draft of a JPEG.
+
+        Args:
+            image_bytes (bytes): Uploaded image file contents
+
+        Returns:
+            Optional[tuple]: (left, top, right, bottom) of the leaf crop as
+                fractions of the upright image, None if it is not cropped
+
+        Raises:
+            ValueError: If the bytes cannot be decoded as an image
+        """
+        image = self.open(image_bytes)
+        scale = self.cropper.grid_size / max(image.size)
+        try:
+            image.draft("RGB", (max(1, int(image.width * scale)),
+                                max(1, int(image.height * scale))))
+            image.load()
+        except Exception as e:
+            raise ValueError(f"Could not decode image: {str(e)}") from e
+        image = self.normalize(image)
+        box = self.cropper.find_box(image)
+        if box is None:
+            return None
+        left, top, right, bottom = box
+        return (left / image.width, top / image.height,
+                right / image.width, bottom / image.height)
+
+    def decode(self, image: Image.Image,
+               region: Optional[tuple] = None) -> Image.Image:
+        """
+        Decode pixel data at the lowest resolution the pipeline needs.
+
+        For JPEGs larger than max_side, libjpeg is asked for a DCT-scaled
+        draft that is still at least as large as the final resize target:
+        the whole frame, or the leaf region when one is given. Other formats
+        are decoded in full.
+
+        Args:
+            image (Image.Image): Image returned by open()
+            region (Optional[tuple]): Leaf region returned by locate() that
+                has to keep max_side pixels after decoding
+
+        Returns:
+            Image.Image: Loaded image
+
+        Raises:
+            ValueError: If the pixel data cannot be decoded
+        """
+        try:
+            if self._drafts(image):
+                longest = max(image.size)
+                if region is not None:
+                    width, height = self._upright_size(image)
+                    longest = max((region[2] - region[0]) * width,
+                                  (region[3] - region[1]) * height)
+                scale = self.max_side / longest
+                if scale < 1:
+                    image.draft("RGB", (max(1, int(image.width * scale)),
+                                        max(1, int(image.height * scale))))
+            image.load()
+            return image
+        except Exception as e:
+            raise ValueError(f"Could not decode image: {str(e)}") from e
+
+    def normalize(self, image: Image.Image) -> Image.Image:
+        """
+        Apply EXIF orientation and convert to RGB.
+
+        Transparent images are flattened onto a white background. Metadata is
+        not carried over to the returned image.
+
+        Args:
+            image (Image.Image): Decoded image
+
+        Returns:
+            Image.Image: Upright RGB image
+        """
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA") or (
+                image.mode == "P" and "transparency" in image.info):
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            return background
+        if image.mode != "RGB":
+            return image.convert("RGB")
+        return image
+
+    def resize(self, image: Image.Image,
+               max_side: Optional[int] = None) -> Image.Image:
+        """
+        Downscale so the longest side is at most max_side, keeping aspect ratio.
+
+        Args:
+            image (Image.Image): RGB image
+            max_side (Optional[int]): Size cap overriding self.max_side
+
+        Returns:
+            Image.Image: Resized image, or the input if already small enough
+        """
+        max_side = max_side or self.max_side
+        longest = max(image.size)
+        if longest <= max_side:
+            return image
+        scale = max_side / longest
+        size = (max(1, round(image.width * scale)),
+                max(1, round(image.height * scale)))
+        return image.resize(size, Image.Resampling.LANCZOS,
+                            reducing_gap=3.0)
+
+    def encode(self, image: Image.Image) -> bytes:
+        """
+        Encode an RGB image in the configured format without metadata.
+
+        Args:
+            image (Image.Image): RGB image
+
+        Returns:
+            bytes: Encoded image data
+        """
+        buffer = io.BytesIO()
+        image.save(buffer, self.output_format, quality=self.quality)
+        return buffer.getvalue()
+
+    def render(self, image: Image.Image, max_side: int) -> bytes:
+        """
+        Encode a smaller rendition of a preprocessed image.
+
+        Args:
+            image (Image.Image): Final image of a PreprocessedImage
+            max_side (int): Longest side of the rendition in pixels
+
+        Returns:
+            bytes: Encoded rendition in the configured format
+        """
+        return self.encode(self.resize(image, max_side))
+
+    def stats(self) -> PreprocessingStats:
+        """
+        Return a snapshot of the aggregate counters.
+
+        Returns:
+            PreprocessingStats: Images processed, bytes in and out, time spent
+        """
+        with self._lock:
+            return PreprocessingStats(**self._stats.__dict__)
+
+    def _drafts(self, image: Image.Image) -> bool:
+        """Whether an opened image is decoded in draft mode"""
+        return (self.draft_decode and image.format == "JPEG"
+                and max(image.size) > self.max_side)
+
+    @staticmethod
+    def _upright_size(image: Image.Image) -> tuple:
+        """Size of an opened image after its EXIF orientation is applied"""
+        if image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+            return image.height, image.width
+        return image.size
+
+    @staticmethod
+    def _region_box(region: tuple, size: tuple) -> tuple:
+        """Convert a fractional region to a pixel box of an image of size"""
+        width, height = size
+        return (max(0, int(region[0] * width)), max(0, int(region[1] * height)),
+                min(width, math.ceil(region[2] * width)),
+                min(height, math.ceil(region[3] * height)))
+
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 3)
@@ -0,0 +1,164 @@
+"""
+Versioned analysis prompts for the Leaf Disease Detection System.
+
+Every prompt has a stable ID so results, caches and token measurements can
+be attributed to the prompt that produced them, and prompts can be compared
+side by side. Output tokens are both billed and waited for, so the compact
+prompt asks for short list entries and, where the provider supports it,
+constrains the answer to a JSON object with response_format instead of
+relying on the model to leave out prose and code fences.
+
+Classes:
+    AnalysisPrompt: One versioned prompt and its output constraints
+
+Functions:
+    get_prompt: Look up a registered prompt by ID
+
+Usage:
+    >>> prompt = get_prompt("leaf-json-v2")
+    >>> request["response_format"] = prompt.response_format()
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# JSON Schema of the answer, used for provider-side structured output
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "disease_detected": {"type": "boolean"},
+        "disease_name": {"type": ["string", "null"]},
+        "disease_type": {"type": "string", "enum": [
+            "fungal", "bacterial", "viral", "pest", "nutrient deficiency",
+            "healthy", "invalid_image"]},
+        "severity": {"type": "string",
+                     "enum": ["none", "mild", "moderate", "severe"]},
+        "confidence": {"type": "number"},
+        "symptoms": {"type": "array", "items": {"type": "string"}},
+        "possible_causes": {"type": "array", "items": {"type": "string"}},
+        "treatment": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["disease_detected", "disease_name", "disease_type", "severity",
+                 "confidence", "symptoms", "possible_causes", "treatment"],
+    "additionalProperties": False,
+}
+
+# Original free-form prompt, kept verbatim so its cache fingerprint is stable
+_LEGACY_TEXT = """IMPORTANT: First determine if this image contains a plant leaf or vegetation. If the image shows humans, animals, objects, buildings, or anything other than plant leaves/vegetation, return the "invalid_image" response format below.
+
+        If this is a valid leaf/plant image, analyze it for diseases and return the results in JSON format.
+        
+        Please identify:
+        1. Whether this is actually a leaf/plant image
+        2. Disease name (if any)
+        3. Disease type/category or invalid_image
+        4. Severity level (mild, moderate, severe)
+        5. Confidence score (0-100%)
+        6. Symptoms observed
+        7. Possible causes
+        8. Treatment recommendations
+
+        For NON-LEAF images (humans, animals, objects, or not detected as leaves, etc.), return this format:
+        {
+            "disease_detected": false,
+            "disease_name": null,
+            "disease_type": "invalid_image",
+            "severity": "none",
+            "confidence": 95,
+            "symptoms": ["This image does not contain a plant leaf"],
+            "possible_causes": ["Invalid image type uploaded"],
+            "treatment": ["Please upload an image of a plant leaf for disease analysis"]
+        }
+        
+        For VALID LEAF images, return this format:
+        {
+            "disease_detected": true/false,
+            "disease_name": "name of disease or null",
+            "disease_type": "fungal/bacterial/viral/pest/nutrient deficiency/healthy",
+            "severity": "mild/moderate/severe/none",
+            "confidence": 85,
+            "symptoms": ["list", "of", "symptoms"],
+            "possible_causes": ["list", "of", "causes"],
+            "treatment": ["list", "of", "treatments"]
+        }"""
+
+_COMPACT_TEXT = """Examine the image. If it does not show a plant leaf or vegetation, set disease_type to "invalid_image", severity "none", disease_detected false and explain in symptoms.
+
+Otherwise diagnose the leaf. Reply with only this JSON object, no prose or code fences:
+{"disease_detected": bool, "disease_name": string|null, "disease_type": "fungal"|"bacterial"|"viral"|"pest"|"nutrient deficiency"|"healthy"|"invalid_image", "severity": "none"|"mild"|"moderate"|"severe", "confidence": 0-100, "symptoms": [string], "possible_causes": [string], "treatment": [string]}
+
+Give at most 3 entries per list, each under 15 words."""
+
+
+@dataclass(frozen=True)
+class AnalysisPrompt:
+    """
+    One versioned analysis prompt.
+
+    Attributes:
+        prompt_id (str): Stable identifier, changed whenever the text changes
+        text (str): Instructions sent with the image
+        output_mode (str): Provider-side output constraint: "json_object"
+            for JSON mode, "json_schema" for structured output against
+            ANALYSIS_SCHEMA, or "text" for none
+    """
+    prompt_id: str
+    text: str
+    output_mode: str = "text"
+
+    def response_format(self, output_mode: Optional[str] = None) -> Optional[Dict]:
+        """
+        Build the response_format request parameter for this prompt.
+
+        Args:
+            output_mode (Optional[str]): Mode to use instead of output_mode,
+                e.g. "text" once the provider rejected structured output
+
+        Returns:
+            Optional[Dict]: Parameter value, or None to send no constraint
+        """
+        mode = output_mode or self.output_mode
+        if mode == "json_object":
+            return {"type": "json_object"}
+        if mode == "json_schema":
+            return {"type": "json_schema",
+                    "json_schema": {"name": "leaf_analysis",
+                                    "schema": ANALYSIS_SCHEMA}}
+        return None
+
+
+PROMPTS: Dict[str, AnalysisPrompt] = {
+    prompt.prompt_id: prompt for prompt in (
+        AnalysisPrompt("leaf-v1", _LEGACY_TEXT),
+        AnalysisPrompt("leaf-json-v2", _COMPACT_TEXT, output_mode="json_object"),
+    )
+}
+
+# leaf-json-v2 is opt-in (PROMPT_ID): besides JSON mode it caps every list at
+# 3 entries of under 15 words, which changes the content of the answers
+DEFAULT_PROMPT_ID = "leaf-v1"
+
+
+def get_prompt(prompt_id: str, output_mode: Optional[str] = None) -> AnalysisPrompt:
+    """
+    Look up a registered prompt.
+
+    Args:
+        prompt_id (str): ID of the prompt, e.g. "leaf-json-v2"
+        output_mode (Optional[str]): Override of the prompt's output mode
+
+    Returns:
+        AnalysisPrompt: The prompt
+
+    Raises:
+        ValueError: If prompt_id or output_mode is unknown
+    """
+    if prompt_id not in PROMPTS:
+        raise ValueError(f"Unknown prompt ID {prompt_id!r}, "
+                         f"expected one of {sorted(PROMPTS)}")
+    prompt = PROMPTS[prompt_id]
+    if output_mode is None or output_mode == prompt.output_mode:
+        return prompt
+    if output_mode not in ("text", "json_object", "json_schema"):
+        raise ValueError(f"Unknown output mode {output_mode!r}")
+    return AnalysisPrompt(prompt.prompt_id, prompt.text, output_mode)
@@ -0,0 +1,148 @@
+"""
+Resolution escalation for the Leaf Disease Detection System.
+
+Most diagnoses are obvious from a small thumbnail, while subtle early-stage
+spots need the detail of the full preprocessed image. In resolution
+escalation mode the detector first sends a small preview rendition, which
+uploads faster and costs fewer image tokens, and resends the image at full
+preprocessing resolution only when the preview answer is uncertain: its
+confidence is below a threshold, it reports mild severity without naming a
+disease, or it could not be parsed.
+
+Classes:
+    ResolutionStats: Snapshot of escalation counters and per-pass figures
+    ResolutionPolicy: Preview size, escalation rule and counters
+
+Usage:
+    >>> policy = ResolutionPolicy(preview_side=384, min_confidence=70)
+    >>> reason = policy.escalation_reason(preview_result)   # None keeps it
+    >>> policy.stats().escalation_rate
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+PREVIEW = "preview"
+FULL = "full"
+
+
+@dataclass
+class ResolutionStats:
+    """
+    Snapshot of resolution escalation counters.
+
+    Attributes:
+        requests (int): Analyses that started with a preview pass
+        escalations (int): Analyses resent at full resolution
+        escalation_rate (float): escalations / requests
+        reasons (Dict[str, int]): Escalations per reason
+        fallbacks (int): Escalations that failed, answered by the preview
+        preview_mean_ms (float): Mean latency of the preview pass
+        full_mean_ms (float): Mean latency of the full-resolution pass
+        preview_mean_bytes (float): Mean base64 image size of the preview pass
+        full_mean_bytes (float): Mean base64 image size of the full pass
+    """
+    requests: int
+    escalations: int
+    escalation_rate: float
+    reasons: Dict[str, int] = field(default_factory=dict)
+    fallbacks: int = 0
+    preview_mean_ms: float = 0.0
+    full_mean_ms: float = 0.0
+    preview_mean_bytes: float = 0.0
+    full_mean_bytes: float = 0.0
+
+
+class ResolutionPolicy:
+    """
+    Decide when a preview answer is resent at full resolution.
+
+    Attributes:
+        preview_side (int): Longest side of the preview rendition in pixels;
+            images no larger than this are sent once at full resolution
+        min_confidence (float): Confidence (0-100) below which to escalate
+    """
+
+    def __init__(self, preview_side: int = 384, min_confidence: float = 70.0):
+        self.preview_side = preview_side
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._escalations = 0
+        self._reasons: Dict[str, int] = {}
+        self._fallbacks = 0
+        self._latency_ms = {PREVIEW: 0.0, FULL: 0.0}
+        self._bytes = {PREVIEW: 0, FULL: 0}
+        self._calls = {PREVIEW: 0, FULL: 0}
+
+    @property
+    def signature(self) -> str:
+        """Identity of the policy for cache keys, changed by any setting"""
+        return f"preview{self.preview_side}@{self.min_confidence:g}"
+
+    def escalation_reason(self, result: Optional[Dict]) -> Optional[str]:
+        """
+        Decide whether a preview result needs the full-resolution image.
+
+        Args:
+            result (Optional[Dict]): Parsed preview result, None if the
+                answer could not be parsed
+
+        Returns:
+            Optional[str]: parse_failed, truncated, mild_unnamed or
+                low_confidence, or None to keep the preview answer
+        """
+        if result is None:
+            return "parse_failed"
+        if result.get("truncated"):
+            return "truncated"
+        name = (result.get("disease_name") or "").strip().lower()
+        if result.get("severity") == "mild" and name in ("", "unknown", "none"):
+            return "mild_unnamed"
+        if float(result.get("confidence") or 0) < self.min_confidence:
+            return "low_confidence"
+        return None
+
+    def record(self, rendition: str, seconds: float, payload_bytes: int):
+        """Record the latency and payload size of one pass of an analysis"""
+        with self._lock:
+            if rendition == PREVIEW:
+                self._requests += 1
+            self._latency_ms[rendition] += seconds * 1000
+            self._bytes[rendition] += payload_bytes
+            self._calls[rendition] += 1
+
+    def record_escalation(self, reason: str):
+        """Count an analysis resent at full resolution"""
+        with self._lock:
+            self._escalations += 1
+            self._reasons[reason] = self._reasons.get(reason, 0) + 1
+
+    def record_fallback(self):
+        """Count an escalation that failed and fell back to the preview answer"""
+        with self._lock:
+            self._fallbacks += 1
+
+    def stats(self) -> ResolutionStats:
+        """
+        Return a snapshot of the escalation counters.
+
+        Returns:
+            ResolutionStats: Escalation rate, reasons and per-pass figures
+        """
+        with self._lock:
+            def mean(totals, rendition):
+                calls = self._calls[rendition]
+                return round(totals[rendition] / calls, 1) if calls else 0.0
+            return ResolutionStats(
+                requests=self._requests,
+                escalations=self._escalations,
+                escalation_rate=round(self._escalations / self._requests, 4)
+                if self._requests else 0.0,
+                reasons=dict(self._reasons),
+                fallbacks=self._fallbacks,
+                preview_mean_ms=mean(self._latency_ms, PREVIEW),
+                full_mean_ms=mean(self._latency_ms, FULL),
+                preview_mean_bytes=mean(self._bytes, PREVIEW),
+                full_mean_bytes=mean(self._bytes, FULL))
@@ -0,0 +1,195 @@
+"""
+In-memory result cache for the Leaf Disease Detection System.
+
+This module provides a bounded, thread-safe LRU cache with per-entry expiry
+for analysis results. Entries are content addressed: the key is derived from
+the decoded image bytes together with every request parameter that can change
+the model output, so re-uploads of the same photo are answered locally instead
+of paying for another vision-model call.
+
+Classes:
+    CacheStats: Snapshot of cache counters
+    AnalysisCache: LRU + TTL cache capped by entry count and total bytes
+
+Functions:
+    make_cache_key: Build a content-addressed cache key for an analysis
+
+Usage:
+    >>> cache = AnalysisCache(max_entries=512, ttl_seconds=600)
+    >>> digest = hashlib.sha256(image_bytes).hexdigest()
+    >>> key = make_cache_key(digest, model, temperature, prompt_fingerprint)
+    >>> cache.put(key, result)
+    >>> cache.get(key)
+"""
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+
+def make_cache_key(image_sha256: str, model: str, temperature: float,
+                   prompt_fingerprint: str, pipeline: str = "") -> str:
+    """
+    Build a content-addressed cache key for an analysis request.
+
+    Args:
+        image_sha256 (str): SHA-256 hex digest of the decoded image data
+        model (str): Model identifier used for the analysis
+        temperature (float): Sampling temperature used for the analysis
+        prompt_fingerprint (str): Digest of the analysis prompt text
+        pipeline (str): Signature of the local preprocessing settings
+
+    Returns:
+        str: Hex digest identifying the image and request parameters
+    """
+    params = f"{model}|{temperature:.4f}|{prompt_fingerprint}|{pipeline}"
+    return hashlib.sha256(f"{image_sha256}|{params}".encode()).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """
+    Snapshot of cache counters.
+
+    Attributes:
+        hits (int): Lookups answered from the cache
+        misses (int): Lookups that found no live entry
+        evictions (int): Entries dropped to respect the entry or byte caps
+        expirations (int): Entries dropped because their TTL elapsed
+        entries (int): Entries currently stored
+        bytes (int): Approximate size of the stored results in bytes
+    """
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+class AnalysisCache:
+    """
+    Bounded LRU cache with time-to-live expiry for analysis results.
+
+    The cache is capped both by the number of entries and by the approximate
+    serialized size of the stored results. When either cap is exceeded the
+    least recently used entries are evicted. All operations are guarded by a
+    lock so a single instance can be shared between threads.
+
+    Attributes:
+        max_entries (int): Maximum number of stored results
+        max_bytes (int): Maximum total size of stored results in bytes
+        ttl_seconds (float): Lifetime of an entry in seconds
+    """
+
+    def __init__(self, max_entries: int = 1024,
+                 max_bytes: int = 16 * 1024 * 1024,
+                 ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, size, result)
+        self._entries: OrderedDict[str, Tuple[float, int, Dict]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cached result.
+
+        Args:
+            key (str): Cache key from make_cache_key()
+
+        Returns:
+            Optional[Dict]: Copy of the cached result, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            expires_at, size, result = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return copy.deepcopy(result)
+
+    def put(self, key: str, result: Dict):
+        """
+        Store a result, evicting least recently used entries if needed.
+
+        Results larger than max_bytes on their own are not stored.
+
+        Args:
+            key (str): Cache key from make_cache_key()
+            result (Dict): JSON serializable analysis result
+        """
+        size = len(json.dumps(result, default=str))
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds,
+                                  size, copy.deepcopy(result))
+            self._bytes += size
+            while (len(self._entries) > self.max_entries
+                   or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+
+    def invalidate(self, key: Optional[str] = None) -> int:
+        """
+        Drop one entry, or every entry when no key is given.
+
+        Args:
+            key (Optional[str]): Cache key to drop. If None, clears the cache.
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self._lock:
+            if key is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return removed
+            if key in self._entries:
+                self._remove(key)
+                return 1
+            return 0
+
+    def stats(self) -> CacheStats:
+        """
+        Return a snapshot of the cache counters.
+
+        Returns:
+            CacheStats: Current hit, miss, eviction and size counters
+        """
+        with self._lock:
+            return CacheStats(hits=self._hits, misses=self._misses,
+                              evictions=self._evictions,
+                              expirations=self._expirations,
+                              entries=len(self._entries), bytes=self._bytes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        """Remove an entry and release its byte budget (lock must be held)"""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,219 @@
+"""
+Retries and deadlines for upstream calls in the Leaf Disease Detection System.
+
+A single upstream attempt turns every transient hiccup (a 429, a 502 from a
+load balancer, a reset connection) into a user-visible failure, while an
+attempt without a timeout can hold a worker for as long as the connection
+hangs. This module retries only errors that are worth retrying, waits with
+exponential backoff and full jitter between attempts, and keeps all attempts
+inside one overall deadline handed down by the caller.
+
+Classes:
+    DeadlineExceeded: Raised when the overall deadline runs out
+    Deadline: Absolute point in time by which a request must finish
+    RetryPolicy: Retry budget, backoff schedule and retryable-error test
+
+Usage:
+    >>> policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=8.0)
+    >>> deadline = Deadline.after(30.0)
+    >>> completion = await policy.run_async(
+    ...     lambda timeout: client.chat.completions.create(..., timeout=timeout),
+    ...     deadline)
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+import groq
+
+from scheduler import parse_duration
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request cannot finish within its overall deadline"""
+
+
+class Deadline:
+    """
+    Absolute point in time by which a request must finish.
+
+    Attributes:
+        expires_at (float): time.monotonic() value of the deadline, or None
+            for no deadline
+    """
+
+    def __init__(self, expires_at: Optional[float] = None):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds: Optional[float]) -> 'Deadline':
+        """
+        Create a deadline the given number of seconds from now.
+
+        Args:
+            seconds (Optional[float]): Time budget, None for no deadline
+
+        Returns:
+            Deadline: The deadline
+        """
+        return cls(None if seconds is None else time.monotonic() + seconds)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or None if there is no deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self, what: str = "request"):
+        """
+        Raise if the deadline has passed.
+
+        Args:
+            what (str): Description used in the error message
+
+        Raises:
+            DeadlineExceeded: If no time is left
+        """
+        if self.remaining() == 0.0:
+            raise DeadlineExceeded(f"Deadline exceeded before {what} could finish")
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Retry budget and backoff schedule for upstream calls.
+
+    Only 429 responses, 5xx responses and connection failures (resets,
+    timeouts) are retried. The delay before retry n (counting from 0) is drawn
+    uniformly from [0, min(max_delay, base_delay * 2**n)] ("full jitter"), so
+    clients that failed together do not retry together. A Retry-After header
+    raises the delay to at least the time the provider asked for.
+
+    Attributes:
+        max_attempts (int): Attempts per request, including the first one
+        base_delay (float): Backoff ceiling of the first retry in seconds
+        max_delay (float): Largest backoff ceiling in seconds
+    """
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    rng: random.Random = field(default_factory=random.Random, repr=False)
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """
+        Decide whether an error is transient.
+
+        Args:
+            error (BaseException): Error raised by an attempt
+
+        Returns:
+            bool: True for 429, 5xx and connection errors
+        """
+        if isinstance(error, (groq.RateLimitError, groq.InternalServerError,
+                              groq.APIConnectionError)):
+            return True
+        status = _status_code(error)
+        return status is not None and (status == 429 or status >= 500)
+
+    def backoff(self, retry: int, error: Optional[BaseException] = None) -> float:
+        """
+        Compute the delay before a retry.
+
+        Args:
+            retry (int): Number of retries already made
+            error (Optional[BaseException]): Error that triggered the retry,
+                inspected for a Retry-After header
+
+        Returns:
+            float: Seconds to wait
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** retry))
+        delay = self.rng.uniform(0.0, ceiling)
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = parse_duration(response.headers.get("retry-after"))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+        return delay
+
+    def run(self, attempt: Callable[[Optional[float]], Any],
+            deadline: Deadline) -> Any:
+        """
+        Call attempt until it succeeds, fails permanently or time runs out.
+
+        Args:
+            attempt (Callable[[Optional[float]], Any]): Makes one attempt;
+                receives the seconds left before the deadline (None if
+                unbounded) to use as its timeout
+            deadline (Deadline): Overall deadline for all attempts
+
+        Returns:
+            Any: Result of the first successful attempt
+
+        Raises:
+            DeadlineExceeded: If the deadline passed before an attempt started
+            Exception: The last error if it was not retryable, the retry
+                budget is spent, or the backoff would overrun the deadline
+        """
+        for retry in range(self.max_attempts):
+            deadline.check("the upstream call")
+            try:
+                return attempt(deadline.remaining())
+            except Exception as e:
+                delay = self._next_delay(retry, e, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def run_async(self, attempt: Callable[[Optional[float]], Awaitable[Any]],
+                        deadline: Deadline) -> Any:
+        """
+        Coroutine counterpart of run() that sleeps without blocking the loop.
+
+        Args:
+            attempt (Callable[[Optional[float]], Awaitable[Any]]): Makes one
+                attempt; receives the seconds left before the deadline
+            deadline (Deadline): Overall deadline for all attempts
+
+        Returns:
+            Any: Result of the first successful attempt
+
+        Raises:
+            DeadlineExceeded: If the deadline passed before an attempt started
+            Exception: The last error if it was not retryable, the retry
+                budget is spent, or the backoff would overrun the deadline
+        """
+        for retry in range(self.max_attempts):
+            deadline.check("the upstream call")
+            try:
+                return await attempt(deadline.remaining())
+            except Exception as e:
+                delay = self._next_delay(retry, e, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    def _next_delay(self, retry: int, error: Exception,
+                    deadline: Deadline) -> Optional[float]:
+        """Backoff before the next attempt, or None to give up with error"""
+        if retry + 1 >= self.max_attempts or not self.is_retryable(error):
+            return None
+        delay = self.backoff(retry, error)
+        remaining = deadline.remaining()
+        if remaining is not None and delay >= remaining:
+            logger.warning(f"Not retrying upstream error, backoff of {delay:.2f}s "
+                           f"exceeds the remaining deadline: {str(error)}")
+            return None
+        logger.warning(f"Upstream attempt {retry + 1}/{self.max_attempts} failed, "
+                       f"retrying in {delay:.2f}s: {str(error)}")
+        return delay
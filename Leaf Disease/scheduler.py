@@ -0,0 +1,468 @@
+"""
+Rate-limit-aware upstream scheduling for the Leaf Disease Detection System.
+
+The Groq API enforces requests-per-minute and tokens-per-minute limits and
+answers with HTTP 429 once they are exceeded. Sending every analysis straight
+upstream makes throughput bounce between idle and rate limited. The scheduler
+in this module sits in front of the API client and admits calls only when
+
+    - a concurrency slot is free; the number of slots adapts with AIMD
+      (additive increase on success, multiplicative decrease on 429),
+    - the request and token buckets hold enough budget for the call, and
+    - no Retry-After pause from a previous 429 is in effect.
+
+Callers that cannot be admitted wait in FIFO order for at most
+max_queue_wait seconds instead of failing immediately. The x-ratelimit-*
+response headers are fed back into the buckets after every call, so the
+local view of the remaining budget follows the provider's.
+
+Classes:
+    QueueTimeout: Raised when a caller waited too long for capacity
+    TokenBucket: Continuously refilling budget of requests or tokens
+    Reservation: Capacity held by one admitted call
+    SchedulerStats: Snapshot of scheduler counters
+    UpstreamScheduler: Admission control in front of the upstream client
+
+Functions:
+    parse_duration: Parse rate-limit reset durations such as "1m30.5s"
+
+Usage:
+    >>> scheduler = UpstreamScheduler(requests_per_minute=30,
+    ...                               tokens_per_minute=30000)
+    >>> reservation = await scheduler.acquire_async()
+    >>> try:
+    ...     raw = await client.chat.completions.with_raw_response.create(...)
+    ... except RateLimitError as e:
+    ...     scheduler.release(reservation, rate_limited=True,
+    ...                       headers=e.response.headers)
+    ...     raise
+    >>> scheduler.release(reservation, used_tokens=usage.total_tokens,
+    ...                   headers=raw.headers)
+"""
+
+import asyncio
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Mapping, Optional
+
+
+class QueueTimeout(TimeoutError):
+    """Raised when a call could not be admitted within max_queue_wait"""
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a rate-limit duration header into seconds.
+
+    Accepts plain numbers ("12", "0.5") as used by Retry-After and Go-style
+    durations ("2m59.56s", "7.66s", "120ms") as used by x-ratelimit-reset-*.
+
+    Args:
+        value (Optional[str]): Header value
+
+    Returns:
+        Optional[float]: Duration in seconds, or None if missing or unparsable
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts or "".join(number + unit for number, unit in parts) != value:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def _header_float(headers: Mapping[str, str], name: str) -> Optional[float]:
+    """Read a numeric header, returning None if missing or malformed"""
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Budget that refills continuously at a per-minute rate.
+
+    Not thread-safe on its own; UpstreamScheduler guards it with its lock.
+
+    Attributes:
+        rate (float): Refill rate in units per second
+        capacity (float): Maximum budget, i.e. the largest burst
+        tokens (float): Budget currently available (negative after an
+            underestimated call was charged)
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        if per_minute <= 0:
+            raise ValueError("per_minute must be positive")
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (0 if it is available now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float, now: float):
+        """Spend amount, assuming wait_time() returned 0"""
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        """Return unused budget, or charge extra when amount is negative"""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def observe(self, remaining: float, now: float):
+        """Never assume more budget than the provider reports as remaining"""
+        self._refill(now)
+        self.tokens = min(self.tokens, remaining)
+
+    def set_limit(self, per_minute: float):
+        """Adopt a new per-minute limit reported by the provider"""
+        if per_minute > 0:
+            self.rate = per_minute / 60.0
+            self.capacity = per_minute
+            self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+
+@dataclass
+class Reservation:
+    """
+    Capacity held by one admitted upstream call.
+
+    Attributes:
+        tokens (float): Tokens reserved from the token bucket
+        queued_seconds (float): Time spent waiting for admission
+        admitted_at (float): time.monotonic() at admission
+    """
+    tokens: float
+    queued_seconds: float
+    admitted_at: float
+
+
+@dataclass
+class SchedulerStats:
+    """
+    Snapshot of scheduler counters.
+
+    Attributes:
+        concurrency_limit (float): Current AIMD concurrency limit
+        in_flight (int): Calls currently admitted
+        queued (int): Callers waiting for admission
+        admitted (int): Calls admitted so far
+        rate_limited (int): Calls answered with HTTP 429
+        timeouts (int): Callers that gave up after max_queue_wait
+        mean_queue_wait_ms (float): Average wait before admission
+        estimated_tokens (float): Current per-call token estimate
+    """
+    concurrency_limit: float
+    in_flight: int
+    queued: int
+    admitted: int
+    rate_limited: int
+    timeouts: int
+    mean_queue_wait_ms: float
+    estimated_tokens: float
+
+
+class UpstreamScheduler:
+    """
+    Admit upstream calls within rate limits and an adaptive concurrency limit.
+
+    Works for threads and event loops at the same time: state is guarded by a
+    threading lock and waiters are woken through a callback, so sync callers
+    block on a threading.Event and async callers await an asyncio.Event.
+
+    Attributes:
+        min_concurrency (int): Lower bound of the concurrency limit
+        max_concurrency (int): Upper bound of the concurrency limit
+        concurrency_limit (float): Current limit, adapted with AIMD
+        max_queue_wait (float): Longest time a caller waits for admission
+        decrease_factor (float): Multiplier applied to the limit on 429
+        estimated_tokens (float): Tokens reserved per call, a moving average
+            of the reported usage
+    """
+
+    # Stop growing the limit when less than this share of the token budget remains
+    HEADROOM = 0.1
+    # Weight of the newest observation in the token estimate
+    ESTIMATE_WEIGHT = 0.2
+
+    def __init__(self, requests_per_minute: float = 30,
+                 tokens_per_minute: float = 30000,
+                 initial_concurrency: int = 4, min_concurrency: int = 1,
+                 max_concurrency: int = 16, max_queue_wait: float = 30.0,
+                 decrease_factor: float = 0.5,
+                 estimated_tokens: float = 2048):
+        self.requests = TokenBucket(requests_per_minute)
+        self.token_budget = TokenBucket(tokens_per_minute)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(
+            min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.max_queue_wait = max_queue_wait
+        self.decrease_factor = decrease_factor
+        self.estimated_tokens = float(estimated_tokens)
+        self._lock = threading.Lock()
+        self._queue: "deque[Callable[[], None]]" = deque()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._near_limit = False
+        self._admitted = 0
+        self._rate_limited = 0
+        self._timeouts = 0
+        self._queue_wait_total = 0.0
+
+    def acquire(self, tokens: Optional[float] = None,
+                max_wait: Optional[float] = None) -> Reservation:
+        """
+        Block the calling thread until a call may be sent upstream.
+
+        Args:
+            tokens (Optional[float]): Tokens to reserve. Defaults to the
+                running estimate.
+            max_wait (Optional[float]): Shorter wait bound than
+                max_queue_wait, e.g. the time left before a request deadline
+
+        Returns:
+            Reservation: Capacity to pass back to release()
+
+        Raises:
+            QueueTimeout: If the call was not admitted in time
+        """
+        event = threading.Event()
+        wake = event.set
+        started = time.monotonic()
+        limit = self._wait_limit(max_wait)
+        self._enqueue(wake)
+        try:
+            while True:
+                reservation, wait = self._try_admit(wake, tokens, started, limit)
+                if reservation is not None:
+                    return reservation
+                event.wait(wait)
+                event.clear()
+        finally:
+            self._dequeue(wake)
+
+    async def acquire_async(self, tokens: Optional[float] = None,
+                            max_wait: Optional[float] = None) -> Reservation:
+        """
+        Wait without blocking the event loop until a call may be sent upstream.
+
+        Args:
+            tokens (Optional[float]): Tokens to reserve. Defaults to the
+                running estimate.
+            max_wait (Optional[float]): Shorter wait bound than
+                max_queue_wait, e.g. the time left before a request deadline
+
+        Returns:
+            Reservation: Capacity to pass back to release()
+
+        Raises:
+            QueueTimeout: If the call was not admitted in time
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # Loop already closed
+
+        started = time.monotonic()
+        limit = self._wait_limit(max_wait)
+        self._enqueue(wake)
+        try:
+            while True:
+                reservation, wait = self._try_admit(wake, tokens, started, limit)
+                if reservation is not None:
+                    return reservation
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        finally:
+            self._dequeue(wake)
+
+    def release(self, reservation: Reservation,
+                used_tokens: Optional[float] = None,
+                rate_limited: bool = False,
+                headers: Optional[Mapping[str, str]] = None):
+        """
+        Return a slot and feed the outcome of the call back into the scheduler.
+
+        Args:
+            reservation (Reservation): Value returned by acquire()
+            used_tokens (Optional[float]): Tokens the call actually consumed,
+                e.g. usage.total_tokens. Unused reserved tokens are refunded.
+            rate_limited (bool): True if the provider answered with 429
+            headers (Optional[Mapping[str, str]]): Response headers carrying
+                x-ratelimit-* and Retry-After information
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._in_flight -= 1
+            if used_tokens is not None:
+                self.token_budget.give(reservation.tokens - used_tokens)
+                self.estimated_tokens += self.ESTIMATE_WEIGHT * (
+                    used_tokens - self.estimated_tokens)
+            if headers is not None:
+                self._observe_headers(headers, now)
+            if rate_limited:
+                self._rate_limited += 1
+                self._decrease(now)
+                retry_after = parse_duration(headers.get("retry-after")) \
+                    if headers is not None else None
+                self._paused_until = max(self._paused_until,
+                                         now + (retry_after or 1.0))
+            elif used_tokens is not None and not self._near_limit:
+                # Additive increase: about one extra slot per window of calls
+                self.concurrency_limit = min(
+                    self.max_concurrency,
+                    self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self._wake_head()
+
+    def stats(self) -> SchedulerStats:
+        """
+        Return a snapshot of the scheduler counters.
+
+        Returns:
+            SchedulerStats: Limit, queue and rate-limit counters
+        """
+        with self._lock:
+            return SchedulerStats(
+                concurrency_limit=round(self.concurrency_limit, 3),
+                in_flight=self._in_flight,
+                queued=len(self._queue),
+                admitted=self._admitted,
+                rate_limited=self._rate_limited,
+                timeouts=self._timeouts,
+                mean_queue_wait_ms=round(
+                    self._queue_wait_total * 1000 / self._admitted, 3)
+                if self._admitted else 0.0,
+                estimated_tokens=round(self.estimated_tokens, 1))
+
+    def _wait_limit(self, max_wait: Optional[float]) -> float:
+        """Queue wait bound for one caller"""
+        if max_wait is None:
+            return self.max_queue_wait
+        return min(self.max_queue_wait, max_wait)
+
+    def _enqueue(self, wake: Callable[[], None]):
+        with self._lock:
+            self._queue.append(wake)
+
+    def _dequeue(self, wake: Callable[[], None]):
+        """Leave the queue after admission, timeout or cancellation"""
+        with self._lock:
+            was_head = bool(self._queue) and self._queue[0] is wake
+            try:
+                self._queue.remove(wake)
+            except ValueError:
+                pass
+            if was_head:
+                self._wake_head()
+
+    def _try_admit(self, wake: Callable[[], None], tokens: Optional[float],
+                   started: float, limit: float):
+        """
+        Admit the caller if it is first in line and capacity is available.
+
+        Returns:
+            Tuple[Optional[Reservation], Optional[float]]: The reservation, or
+                None and how long to wait before retrying (None = until woken)
+
+        Raises:
+            QueueTimeout: If the caller's wait budget is exhausted
+        """
+        now = time.monotonic()
+        remaining = limit - (now - started)
+        with self._lock:
+            wait = self._admission_wait(wake, tokens, now)
+            if wait == 0.0:
+                amount = self.estimated_tokens if tokens is None else tokens
+                self.requests.take(1, now)
+                self.token_budget.take(amount, now)
+                self._in_flight += 1
+                self._admitted += 1
+                self._queue_wait_total += now - started
+                return Reservation(tokens=min(amount, self.token_budget.capacity),
+                                   queued_seconds=now - started,
+                                   admitted_at=now), None
+            if remaining <= 0:
+                self._timeouts += 1
+                raise QueueTimeout(
+                    f"No upstream capacity within {limit:.1f}s "
+                    f"({self._in_flight} in flight, {len(self._queue)} queued)")
+        return None, remaining if wait is None else min(wait, remaining)
+
+    def _admission_wait(self, wake: Callable[[], None],
+                        tokens: Optional[float], now: float) -> Optional[float]:
+        """Seconds until admission is possible, 0 if now, None if unknown (lock held)"""
+        if self._queue[0] is not wake:
+            return None
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._in_flight >= int(self.concurrency_limit):
+            return None
+        amount = self.estimated_tokens if tokens is None else tokens
+        return max(self.requests.wait_time(1, now),
+                   self.token_budget.wait_time(amount, now))
+
+    def _wake_head(self):
+        """Wake the first waiter so it re-checks capacity (lock held)"""
+        if self._queue:
+            self._queue[0]()
+
+    def _decrease(self, now: float):
+        """Multiplicative decrease, at most once per second of 429 bursts"""
+        if now - self._last_decrease >= 1.0:
+            self.concurrency_limit = max(
+                self.min_concurrency,
+                self.concurrency_limit * self.decrease_factor)
+            self._last_decrease = now
+
+    def _observe_headers(self, headers: Mapping[str, str], now: float):
+        """Align the buckets with the provider's x-ratelimit-* headers (lock held)"""
+        limit_tokens = _header_float(headers, "x-ratelimit-limit-tokens")
+        if limit_tokens and limit_tokens != self.token_budget.capacity:
+            self.token_budget.set_limit(limit_tokens)
+        remaining_tokens = _header_float(headers, "x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            self.token_budget.observe(remaining_tokens, now)
+            self._near_limit = remaining_tokens < self.HEADROOM * self.token_budget.capacity
+        # The request limit header is per day, so only the remaining count is used
+        remaining_requests = _header_float(headers, "x-ratelimit-remaining-requests")
+        if remaining_requests is not None:
+            self.requests.observe(remaining_requests, now)
+            if remaining_requests <= 0:
+                reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+                if reset:
+                    self._paused_until = max(self._paused_until, now + reset)
@@ -0,0 +1,178 @@
+"""
+Request coalescing for the Leaf Disease Detection System.
+
+When the same photo is uploaded by several clients at once, every upload
+misses the result cache because none of the analyses has finished yet. This
+module lets concurrent callers with the same key share a single in-flight
+call: the first caller (the leader) runs it and every caller that arrives
+while it is running waits for the leader's result instead of starting its own.
+
+Async waiters are shielded from each other, so cancelling one of them never
+cancels the shared call the others are waiting on.
+
+Classes:
+    SingleFlightStats: Snapshot of coalescing counters
+    SingleFlight: Per-key deduplication of concurrent calls (sync and async)
+
+Usage:
+    >>> flight = SingleFlight()
+    >>> result = await flight.run_async(cache_key, lambda: call_upstream())
+    >>> result = flight.run(cache_key, lambda: call_upstream_sync())
+"""
+
+import asyncio
+import copy
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+@dataclass
+class SingleFlightStats:
+    """
+    Snapshot of coalescing counters.
+
+    Attributes:
+        calls (int): Calls actually executed by a leader
+        coalesced (int): Callers that joined an in-flight call instead
+        in_flight (int): Calls currently running
+    """
+    calls: int = 0
+    coalesced: int = 0
+    in_flight: int = 0
+
+
+class _SyncCall:
+    """In-flight synchronous call shared by waiting threads"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Share one in-flight call between concurrent callers with the same key.
+
+    Results handed to followers are deep copies, so callers can modify their
+    result without affecting each other. Exceptions raised by the shared call
+    are raised in every caller. Nothing is remembered once a call finishes;
+    completed results belong in the result cache.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._calls: Dict[str, _SyncCall] = {}
+        self._lock = threading.Lock()
+        self._executed = 0
+        self._coalesced = 0
+
+    async def run_async(self, key: str,
+                        factory: Callable[[], Awaitable[Any]],
+                        timeout: Optional[float] = None) -> Any:
+        """
+        Await the call for key, starting it only if none is in flight.
+
+        Args:
+            key (str): Identity of the call, e.g. an analysis cache key
+            factory (Callable[[], Awaitable[Any]]): Creates the coroutine to
+                run when this caller becomes the leader
+            timeout (Optional[float]): Longest time a follower waits for the
+                leader's call, which keeps running for the other callers. The
+                leader awaits its own call, which must bound itself.
+
+        Returns:
+            Any: Result of the shared call
+
+        Raises:
+            TimeoutError: If a follower's wait exceeded timeout
+            Exception: Whatever the shared call raised
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._tasks.get(key)
+            # A task left behind by another event loop cannot be awaited here
+            leader = task is None or task.get_loop() is not loop
+            if leader:
+                task = loop.create_task(factory())
+                self._tasks[key] = task
+                self._executed += 1
+            else:
+                self._coalesced += 1
+        if leader:
+            task.add_done_callback(lambda done: self._forget_task(key, done))
+        # Shield the shared task so cancelling this waiter leaves it running
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task),
+                                            None if leader else timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Timed out waiting for a coalesced call") from None
+        return result if leader else copy.deepcopy(result)
+
+    def run(self, key: str, function: Callable[[], Any],
+            timeout: Optional[float] = None) -> Any:
+        """
+        Run the call for key in this thread, or wait for the running one.
+
+        Args:
+            key (str): Identity of the call, e.g. an analysis cache key
+            function (Callable[[], Any]): Function to run when this caller
+                becomes the leader
+            timeout (Optional[float]): Longest time a follower waits for the
+                leader. The leader itself is not interrupted.
+
+        Returns:
+            Any: Result of the shared call
+
+        Raises:
+            TimeoutError: If a follower's wait exceeded timeout
+            Exception: Whatever the shared call raised
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _SyncCall()
+                self._executed += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError("Timed out waiting for a coalesced call")
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> SingleFlightStats:
+        """
+        Return a snapshot of the coalescing counters.
+
+        Returns:
+            SingleFlightStats: Executed, coalesced and in-flight calls
+        """
+        with self._lock:
+            return SingleFlightStats(
+                calls=self._executed,
+                coalesced=self._coalesced,
+                in_flight=len(self._tasks) + len(self._calls))
+
+    def _forget_task(self, key: str, task: asyncio.Task):
+        """Drop a finished task and mark its exception as retrieved"""
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        if not task.cancelled():
+            task.exception()
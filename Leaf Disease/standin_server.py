@@ -0,0 +1,462 @@
+"""
+Offline stand-in for the Groq chat completions API.
+
+Load tests, benchmarks and CI runs should not spend real quota or depend on
+the network. This module serves the subset of the Groq (OpenAI-compatible)
+API the detector uses, blocking and streamed chat completions plus the model
+list, and answers with canned leaf diagnoses. The detector talks to it
+through the regular GroqBackend by pointing GROQ_BASE_URL at it, so the whole
+stack, including retries, the scheduler and the circuit breaker, is
+exercised exactly as against the real API.
+
+The server simulates what makes the real upstream hard to work with:
+
+    - latency drawn from a fixed, uniform, lognormal or exponential
+      distribution, with a time to first token and a per-chunk delay for
+      streamed answers,
+    - injected 5xx errors at a configurable rate,
+    - requests-per-minute and tokens-per-minute budgets per API key, answered
+      with 429, Retry-After and x-ratelimit-* headers like Groq's, plus
+      randomly injected 429s.
+
+Each image gets the same diagnosis every time (picked by a digest of the
+image), so caching and request coalescing behave as they would upstream.
+Token usage is estimated: text at four characters per token and images at
+144 tokens per started 336 px tile.
+
+Classes:
+    LatencyModel: Distribution of simulated upstream latency
+    StandInSettings: Behaviour of the stand-in server
+
+Functions:
+    create_app: Build the FastAPI application
+    main: Command line entry point
+
+Usage:
+    $ python standin_server.py --port 8001 --latency lognormal:800:0.5 \\
+          --error-rate 0.02 --rpm 30 --tpm 30000
+    $ GROQ_API_KEY=offline GROQ_BASE_URL=http://127.0.0.1:8001 python main.py
+
+    >>> app = create_app(StandInSettings(latency=LatencyModel("fixed", 50)))
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from PIL import Image
+
+DIAGNOSES: List[Dict] = [
+    {"disease_detected": True, "disease_name": "Leaf Rust",
+     "disease_type": "fungal", "severity": "moderate", "confidence": 91,
+     "symptoms": ["Orange pustules on the underside", "Yellow spots on top"],
+     "possible_causes": ["Puccinia spores", "Humid weather"],
+     "treatment": ["Remove infected leaves", "Apply a copper fungicide"]},
+    {"disease_detected": False, "disease_name": None,
+     "disease_type": "healthy", "severity": "none", "confidence": 95,
+     "symptoms": ["Uniform green color", "No lesions"],
+     "possible_causes": [], "treatment": ["No treatment needed"]},
+    {"disease_detected": True, "disease_name": "Bacterial Leaf Spot",
+     "disease_type": "bacterial", "severity": "severe", "confidence": 84,
+     "symptoms": ["Water-soaked dark lesions", "Yellow halos"],
+     "possible_causes": ["Xanthomonas bacteria", "Overhead watering"],
+     "treatment": ["Prune affected foliage", "Apply copper bactericide"]},
+    {"disease_detected": True, "disease_name": None,
+     "disease_type": "fungal", "severity": "mild", "confidence": 58,
+     "symptoms": ["A few small pale spots"],
+     "possible_causes": ["Early fungal infection"],
+     "treatment": ["Monitor the plant", "Improve air circulation"]},
+]
+
+# Rough Llama 4 vision cost: tokens per started tile of TILE_SIDE pixels
+TILE_SIDE = 336
+TOKENS_PER_TILE = 144
+CHARS_PER_TOKEN = 4.0
+CHUNK_CHARS = 16
+
+
+@dataclass
+class LatencyModel:
+    """
+    Distribution of simulated upstream latency.
+
+    Attributes:
+        distribution (str): fixed, uniform, lognormal or exponential
+        median_ms (float): Median latency in milliseconds
+        spread (float): Shape of the distribution: the half-width of a
+            uniform distribution as a fraction of the median, or sigma of
+            a lognormal one; unused by fixed and exponential
+    """
+    distribution: str = "lognormal"
+    median_ms: float = 800.0
+    spread: float = 0.5
+
+    DISTRIBUTIONS = ("fixed", "uniform", "lognormal", "exponential")
+
+    def __post_init__(self):
+        if self.distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {self.distribution}")
+
+    @classmethod
+    def parse(cls, spec: str) -> 'LatencyModel':
+        """
+        Parse a "distribution:median_ms[:spread]" specification.
+
+        Args:
+            spec (str): e.g. "lognormal:800:0.5" or "fixed:50"
+
+        Returns:
+            LatencyModel: The parsed model
+
+        Raises:
+            ValueError: If the specification is malformed
+        """
+        parts = spec.split(":")
+        if not 2 <= len(parts) <= 3:
+            raise ValueError(f"Latency must be distribution:median_ms[:spread], got {spec}")
+        spread = float(parts[2]) if len(parts) == 3 else cls.spread
+        return cls(parts[0], float(parts[1]), spread)
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one latency in seconds"""
+        median = self.median_ms / 1000
+        if self.distribution == "fixed":
+            return median
+        if self.distribution == "uniform":
+            return max(0.0, rng.uniform(median * (1 - self.spread),
+                                        median * (1 + self.spread)))
+        if self.distribution == "lognormal":
+            return median * math.exp(rng.gauss(0.0, self.spread))
+        return rng.expovariate(math.log(2) / median) if median > 0 else 0.0
+
+
+@dataclass
+class StandInSettings:
+    """
+    Behaviour of the stand-in server.
+
+    Attributes:
+        latency (LatencyModel): Latency of a blocking call, and time to the
+            first token of a streamed one
+        chunk_delay_ms (float): Delay between streamed chunks
+        error_rate (float): Share of calls failed with error_status
+        error_status (int): HTTP status of injected errors
+        rate_limit_rate (float): Share of calls answered with an injected 429
+        requests_per_minute (Optional[float]): Request budget per API key;
+            unlimited when None
+        tokens_per_minute (Optional[float]): Token budget per API key;
+            unlimited when None
+        responses (List[Dict]): Diagnoses to answer with, one picked per image
+        seed (Optional[int]): Seed for reproducible latency and errors
+    """
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    chunk_delay_ms: float = 15.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    rate_limit_rate: float = 0.0
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    responses: List[Dict] = field(default_factory=lambda: list(DIAGNOSES))
+    seed: Optional[int] = None
+
+
+class _Budget:
+    """Continuously refilling per-minute budget of one API key"""
+
+    def __init__(self, per_minute: Optional[float]):
+        self.per_minute = per_minute
+        self.remaining = per_minute or 0.0
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        if self.per_minute is None:
+            return
+        self.remaining = min(self.per_minute, self.remaining
+                             + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def shortfall_seconds(self, amount: float) -> float:
+        """Seconds until amount is available, 0 if it is now (refilled)"""
+        if self.per_minute is None or amount <= self.remaining:
+            return 0.0
+        return (amount - self.remaining) * 60 / self.per_minute
+
+    def reset_seconds(self) -> float:
+        """Seconds until the budget is full again (refilled)"""
+        if self.per_minute is None:
+            return 0.0
+        return (self.per_minute - self.remaining) * 60 / self.per_minute
+
+
+class _KeyLimits:
+    """Request and token budgets of one API key"""
+
+    def __init__(self, settings: StandInSettings):
+        self.requests = _Budget(settings.requests_per_minute)
+        self.tokens = _Budget(settings.tokens_per_minute)
+
+    def admit(self, tokens: int) -> Tuple[bool, Dict[str, str]]:
+        """Charge one call if both budgets allow it, returning its headers"""
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(self.requests.shortfall_seconds(1),
+                   self.tokens.shortfall_seconds(tokens))
+        admitted = wait == 0.0
+        if admitted:
+            self.requests.remaining -= 1
+            self.tokens.remaining -= tokens
+        headers = {}
+        for kind, budget in (("requests", self.requests), ("tokens", self.tokens)):
+            if budget.per_minute is not None:
+                headers[f"x-ratelimit-limit-{kind}"] = f"{budget.per_minute:g}"
+                headers[f"x-ratelimit-remaining-{kind}"] = f"{max(0, int(budget.remaining))}"
+                headers[f"x-ratelimit-reset-{kind}"] = f"{budget.reset_seconds():.2f}s"
+        if not admitted:
+            headers["retry-after"] = f"{math.ceil(wait)}"
+        return admitted, headers
+
+
+def _error(status: int, message: str, error_type: str, code: Optional[str] = None,
+           headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    """Error response in the provider's format"""
+    body = {"error": {"message": message, "type": error_type}}
+    if code is not None:
+        body["error"]["code"] = code
+    return JSONResponse(status_code=status, content=body, headers=headers)
+
+
+def _prompt_tokens(messages: List[Dict]) -> Tuple[int, Optional[str]]:
+    """Estimate the prompt tokens of a request and return its first image URL"""
+    text_chars, image_tokens, image_url = 0, 0, None
+    for message in messages:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            if part.get("type") == "text":
+                text_chars += len(part.get("text") or "")
+            elif part.get("type") == "image_url":
+                url = part.get("image_url", {}).get("url", "")
+                image_url = image_url or url
+                image_tokens += _image_tokens(url)
+    return math.ceil(text_chars / CHARS_PER_TOKEN) + image_tokens, image_url
+
+
+def _image_tokens(url: str) -> int:
+    """Estimate the tokens of a data URL image from its dimensions"""
+    try:
+        data = base64.b64decode(url.split(",", 1)[1])
+        width, height = Image.open(io.BytesIO(data)).size
+    except Exception:
+        return TOKENS_PER_TILE
+    return math.ceil(width / TILE_SIDE) * math.ceil(height / TILE_SIDE) * TOKENS_PER_TILE
+
+
+def create_app(settings: Optional[StandInSettings] = None) -> FastAPI:
+    """
+    Build the stand-in application.
+
+    Args:
+        settings (Optional[StandInSettings]): Simulated behaviour. If None,
+            the defaults are used (lognormal latency, no errors, no limits).
+
+    Returns:
+        FastAPI: Application serving /openai/v1 (Groq SDK paths) and /v1
+            (OpenAI SDK paths), plus GET /stats with call counters
+    """
+    settings = settings or StandInSettings()
+    rng = random.Random(settings.seed)
+    lock = threading.Lock()
+    limits: Dict[str, _KeyLimits] = {}
+    stats = {"requests": 0, "completed": 0, "streamed": 0, "errors": 0,
+             "rate_limited": 0, "in_flight": 0, "max_in_flight": 0,
+             "per_key": {}}
+    app = FastAPI(title="Leaf Disease API stand-in",
+                  description="Offline stand-in for the Groq chat completions API")
+
+    def count(name: str, delta: int = 1):
+        with lock:
+            stats[name] += delta
+            if name == "in_flight":
+                stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+
+    def answer_for(image_url: Optional[str]) -> str:
+        digest = hashlib.sha256((image_url or "").encode()).digest()
+        choice = settings.responses[int.from_bytes(digest[:4], "big") % len(settings.responses)]
+        return json.dumps(choice)
+
+    async def chat_completions(request: Request):
+        auth = request.headers.get("authorization", "")
+        if not auth.lower().startswith("bearer ") or not auth[7:].strip():
+            return _error(401, "Invalid API Key", "invalid_request_error",
+                          "invalid_api_key")
+        key = auth[7:].strip()
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            return _error(400, "Request body is not valid JSON",
+                          "invalid_request_error")
+        if not body.get("model") or not isinstance(body.get("messages"), list):
+            return _error(400, "model and messages are required",
+                          "invalid_request_error")
+
+        prompt_tokens, image_url = _prompt_tokens(body["messages"])
+        content = answer_for(image_url)
+        finish_reason = "stop"
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+        if max_tokens and len(content) > max_tokens * CHARS_PER_TOKEN:
+            content = content[:int(max_tokens * CHARS_PER_TOKEN)]
+            finish_reason = "length"
+        completion_tokens = math.ceil(len(content) / CHARS_PER_TOKEN)
+        usage = {"prompt_tokens": prompt_tokens,
+                 "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+
+        with lock:
+            stats["requests"] += 1
+            stats["per_key"][key] = stats["per_key"].get(key, 0) + 1
+            key_limits = limits.setdefault(key, _KeyLimits(settings))
+            admitted, headers = key_limits.admit(usage["total_tokens"])
+            injected_429 = admitted and rng.random() < settings.rate_limit_rate
+            latency = settings.latency.sample(rng)
+            failed = rng.random() < settings.error_rate
+        if not admitted or injected_429:
+            count("rate_limited")
+            headers.setdefault("retry-after", "1")
+            return _error(429, f"Rate limit reached for model {body['model']} "
+                          f"(stand-in, key ...{key[-4:]})", "tokens",
+                          "rate_limit_exceeded", headers)
+
+        count("in_flight")
+        streamed = False
+        try:
+            if failed or not body.get("stream"):
+                await asyncio.sleep(latency)
+            if failed:
+                count("errors")
+                return _error(settings.error_status, "Injected upstream error",
+                              "internal_server_error")
+            if body.get("stream"):
+                # The stream releases its in-flight slot when it ends
+                streamed = True
+                count("streamed")
+                return StreamingResponse(
+                    stream_chunks(body["model"], content, finish_reason, usage,
+                                  latency),
+                    media_type="text/event-stream", headers=headers)
+            count("completed")
+            return JSONResponse(content={
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": finish_reason,
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            }, headers=headers)
+        finally:
+            if not streamed:
+                count("in_flight", -1)
+
+    async def stream_chunks(model: str, content: str, finish_reason: str,
+                            usage: Dict, latency: float) -> AsyncIterator[str]:
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        def chunk(delta: Dict, reason: Optional[str] = None, **extra) -> str:
+            data = {"id": completion_id, "object": "chat.completion.chunk",
+                    "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta,
+                                 "finish_reason": reason}], **extra}
+            return f"data: {json.dumps(data)}\n\n"
+
+        try:
+            await asyncio.sleep(latency)
+            yield chunk({"role": "assistant", "content": ""})
+            for start in range(0, len(content), CHUNK_CHARS):
+                yield chunk({"content": content[start:start + CHUNK_CHARS]})
+                await asyncio.sleep(settings.chunk_delay_ms / 1000)
+            yield chunk({}, finish_reason,
+                        x_groq={"id": completion_id, "usage": usage})
+            yield "data: [DONE]\n\n"
+            count("completed")
+        finally:
+            count("in_flight", -1)
+
+    async def list_models():
+        return {"object": "list", "data": [
+            {"id": "meta-llama/llama-4-scout-17b-16e-instruct", "object": "model",
+             "created": 0, "owned_by": "stand-in"},
+            {"id": "meta-llama/llama-4-maverick-17b-128e-instruct", "object": "model",
+             "created": 0, "owned_by": "stand-in"},
+        ]}
+
+    async def get_stats():
+        with lock:
+            return dict(stats, per_key=dict(stats["per_key"]))
+
+    for prefix in ("/openai/v1", "/v1"):
+        app.add_api_route(f"{prefix}/chat/completions", chat_completions,
+                          methods=["POST"])
+        app.add_api_route(f"{prefix}/models", list_models, methods=["GET"])
+    app.add_api_route("/stats", get_stats, methods=["GET"])
+    return app
+
+
+def main():
+    """Run the stand-in server from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Offline stand-in for the Groq chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="lognormal:800:0.5",
+                        help="distribution:median_ms[:spread], distribution is "
+                             "fixed, uniform, lognormal or exponential")
+    parser.add_argument("--chunk-delay-ms", type=float, default=15.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="share of calls answered with an injected 429")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="requests per minute per API key")
+    parser.add_argument("--tpm", type=float, default=None,
+                        help="tokens per minute per API key")
+    parser.add_argument("--responses", default=None,
+                        help="JSON file with a list of diagnoses to answer with")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    responses = list(DIAGNOSES)
+    if args.responses:
+        with open(args.responses) as f:
+            responses = json.load(f)
+    settings = StandInSettings(
+        latency=LatencyModel.parse(args.latency),
+        chunk_delay_ms=args.chunk_delay_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        rate_limit_rate=args.rate_limit_rate,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        responses=responses,
+        seed=args.seed)
+
+    import uvicorn
+    uvicorn.run(create_app(settings), host=args.host, port=args.port,
+                log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Upstream token and latency accounting for the Leaf Disease Detection System.
+
+What a diagnosis costs is decided by the upstream call: the prompt tokens
+(instructions plus the image), the completion tokens, the time spent waiting
+for admission by the scheduler and the time the provider took to answer.
+This module records those figures for every upstream call, hands them back
+to the caller as optional response metadata and rolls them up per model and
+per prompt, so quotas can be sized and the effect of preprocessing or prompt
+changes can be measured instead of guessed.
+
+Providers that do not report image tokens separately get an estimate: the
+prompt tokens minus the prompt text at roughly four characters per token.
+
+Classes:
+    CallUsage: Tokens and timings of one upstream call
+    UsageTotals: Aggregate of many calls
+    UsageLedger: Thread-safe per-model and per-prompt aggregates
+
+Usage:
+    >>> ledger = UsageLedger()
+    >>> ledger.record(CallUsage.from_completion_usage(
+    ...     completion.usage, model="llama", prompt_id="leaf-json-v2",
+    ...     prompt_chars=600, queue_seconds=0.01, upstream_seconds=1.8))
+    >>> ledger.by_model()["llama"].mean_completion_tokens
+"""
+
+import math
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+# Rough size of one text token, used to estimate image tokens
+CHARS_PER_TOKEN = 4.0
+
+
+@dataclass
+class CallUsage:
+    """
+    Tokens and timings of one upstream call, or the sum of the calls made
+    for one analysis.
+
+    Attributes:
+        model (str): Model that served the call; models joined with "+"
+            when calls to several models were summed
+        prompt_id (str): Prompt version the call was made with
+        prompt_tokens (int): Input tokens, including the image
+        completion_tokens (int): Output tokens
+        image_tokens (int): Input tokens spent on the image
+        image_tokens_estimated (bool): True if image_tokens was derived from
+            the prompt length because the provider did not report it
+        queue_ms (float): Time spent waiting for admission by the scheduler
+        upstream_ms (float): Time from sending the request to the complete
+            answer
+        calls (int): Upstream calls summed into the record
+    """
+    model: str
+    prompt_id: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    image_tokens: int = 0
+    image_tokens_estimated: bool = True
+    queue_ms: float = 0.0
+    upstream_ms: float = 0.0
+    calls: int = 1
+
+    @property
+    def total_tokens(self) -> int:
+        """Input and output tokens together"""
+        return self.prompt_tokens + self.completion_tokens
+
+    @classmethod
+    def from_completion_usage(cls, usage, model: str, prompt_id: str,
+                              prompt_chars: int, queue_seconds: float,
+                              upstream_seconds: float) -> 'CallUsage':
+        """
+        Build a record from the usage object of a chat completion.
+
+        Args:
+            usage: completion.usage (None if the provider sent none)
+            model (str): Model that served the call
+            prompt_id (str): Prompt version the call was made with
+            prompt_chars (int): Length of the prompt text, for estimating
+                image tokens
+            queue_seconds (float): Scheduler wait before the call
+            upstream_seconds (float): Duration of the call
+
+        Returns:
+            CallUsage: The record
+        """
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        image_tokens = getattr(details, "image_tokens", None)
+        estimated = image_tokens is None
+        if estimated:
+            text_tokens = math.ceil(prompt_chars / CHARS_PER_TOKEN)
+            image_tokens = max(0, prompt_tokens - text_tokens) if prompt_tokens else 0
+        return cls(model=model, prompt_id=prompt_id,
+                   prompt_tokens=prompt_tokens,
+                   completion_tokens=getattr(usage, "completion_tokens", None) or 0,
+                   image_tokens=image_tokens,
+                   image_tokens_estimated=estimated,
+                   queue_ms=round(queue_seconds * 1000, 1),
+                   upstream_ms=round(upstream_seconds * 1000, 1))
+
+    @classmethod
+    def combine(cls, *calls: Optional['CallUsage']) -> Optional['CallUsage']:
+        """
+        Sum the usage of the upstream calls made for one analysis.
+
+        Args:
+            *calls (Optional[CallUsage]): Usage of each call; None for calls
+                that reported none
+
+        Returns:
+            Optional[CallUsage]: The sum, or None if no call reported usage
+        """
+        calls = [call for call in calls if call is not None]
+        if len(calls) <= 1:
+            return calls[0] if calls else None
+        models = list(dict.fromkeys(call.model for call in calls))
+        prompt_ids = list(dict.fromkeys(call.prompt_id for call in calls))
+        return cls(model="+".join(models), prompt_id="+".join(prompt_ids),
+                   prompt_tokens=sum(call.prompt_tokens for call in calls),
+                   completion_tokens=sum(call.completion_tokens for call in calls),
+                   image_tokens=sum(call.image_tokens for call in calls),
+                   image_tokens_estimated=any(
+                       call.image_tokens_estimated for call in calls),
+                   queue_ms=round(sum(call.queue_ms for call in calls), 1),
+                   upstream_ms=round(sum(call.upstream_ms for call in calls), 1),
+                   calls=sum(call.calls for call in calls))
+
+    def as_dict(self) -> Dict:
+        """JSON-serializable form, used as response metadata"""
+        data = asdict(self)
+        data["total_tokens"] = self.total_tokens
+        return data
+
+
+@dataclass
+class UsageTotals:
+    """
+    Aggregate of many upstream calls.
+
+    Attributes:
+        calls (int): Successful calls recorded
+        failures (int): Calls that ended in an error
+        prompt_tokens (int): Input tokens over all calls
+        completion_tokens (int): Output tokens over all calls
+        image_tokens (int): Image tokens over all calls
+        queue_ms (float): Scheduler wait over all calls
+        upstream_ms (float): Upstream time over all calls
+        max_upstream_ms (float): Slowest call
+    """
+    calls: int = 0
+    failures: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    image_tokens: int = 0
+    queue_ms: float = 0.0
+    upstream_ms: float = 0.0
+    max_upstream_ms: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        """Input and output tokens over all calls"""
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def mean_prompt_tokens(self) -> float:
+        """Average input tokens per call"""
+        return self.prompt_tokens / self.calls if self.calls else 0.0
+
+    @property
+    def mean_completion_tokens(self) -> float:
+        """Average output tokens per call"""
+        return self.completion_tokens / self.calls if self.calls else 0.0
+
+    @property
+    def mean_queue_ms(self) -> float:
+        """Average scheduler wait per call"""
+        return self.queue_ms / self.calls if self.calls else 0.0
+
+    @property
+    def mean_upstream_ms(self) -> float:
+        """Average upstream time per call"""
+        return self.upstream_ms / self.calls if self.calls else 0.0
+
+    def add(self, call: CallUsage):
+        """Add one successful call"""
+        self.calls += 1
+        self.prompt_tokens += call.prompt_tokens
+        self.completion_tokens += call.completion_tokens
+        self.image_tokens += call.image_tokens
+        self.queue_ms += call.queue_ms
+        self.upstream_ms += call.upstream_ms
+        self.max_upstream_ms = max(self.max_upstream_ms, call.upstream_ms)
+
+
+class UsageLedger:
+    """
+    Thread-safe per-model and per-prompt usage aggregates.
+
+    Aggregates grow with the number of distinct models and prompts, not with
+    the number of calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, UsageTotals] = {}
+        self._prompts: Dict[str, UsageTotals] = {}
+
+    def record(self, call: CallUsage):
+        """
+        Add a successful call to the aggregates of its model and prompt.
+
+        Args:
+            call (CallUsage): Usage of the call
+        """
+        with self._lock:
+            self._models.setdefault(call.model, UsageTotals()).add(call)
+            self._prompts.setdefault(call.prompt_id, UsageTotals()).add(call)
+
+    def record_failure(self, model: str, prompt_id: Optional[str] = None):
+        """
+        Count a call that ended in an error.
+
+        Args:
+            model (str): Model the call was made to
+            prompt_id (Optional[str]): Prompt version the call was made with
+        """
+        with self._lock:
+            self._models.setdefault(model, UsageTotals()).failures += 1
+            if prompt_id is not None:
+                self._prompts.setdefault(prompt_id, UsageTotals()).failures += 1
+
+    def by_model(self) -> Dict[str, UsageTotals]:
+        """
+        Return a snapshot of the aggregates per model.
+
+        Returns:
+            Dict[str, UsageTotals]: Totals keyed by model name
+        """
+        with self._lock:
+            return {name: UsageTotals(**asdict(totals))
+                    for name, totals in self._models.items()}
+
+    def by_prompt(self) -> Dict[str, UsageTotals]:
+        """
+        Return a snapshot of the aggregates per prompt version.
+
+        Returns:
+            Dict[str, UsageTotals]: Totals keyed by prompt ID
+        """
+        with self._lock:
+            return {prompt_id: UsageTotals(**asdict(totals))
+                    for prompt_id, totals in self._prompts.items()}
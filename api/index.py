@@ -1,18 +1,300 @@
 from fastapi import FastAPI, Request, HTTPException, UploadFile, File
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
+import asyncio
 import logging
 import os
 import base64
 import json
-from typing import Dict, Optional, List
-from dataclasses import dataclass
+import math
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, List, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Leaf Disease Detection API", version="1.0.0")
+# Overall deadline of one analysis and retry budget for transient upstream errors
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+
+# Circuit breaker thresholds for the upstream API
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "10"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over the last window_size upstream calls.
+
+    Opens when at least min_calls outcomes are recorded and the failure or slow-call
+    share reaches its threshold, fails fast for open_seconds, then lets
+    half_open_probes probe calls decide whether to close again.
+    """
+
+    def __init__(self, failure_rate: float = BREAKER_FAILURE_RATE,
+                 slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS,
+                 slow_call_rate: float = BREAKER_SLOW_CALL_RATE,
+                 open_seconds: float = BREAKER_OPEN_SECONDS,
+                 window_size: int = 20, min_calls: int = 10, half_open_probes: int = 2):
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.min_calls = min_calls
+        self.half_open_probes = half_open_probes
+        self.window: deque = deque(maxlen=window_size)
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+
+    def before_call(self) -> bool:
+        """Return True if the call is a half-open probe; raise CircuitOpenError while open"""
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= self.open_seconds:
+            self.state, self.probes_in_flight, self.probe_successes = "half_open", 0, 0
+        if self.state == "closed":
+            return False
+        if self.state == "half_open" and self.probes_in_flight < self.half_open_probes:
+            self.probes_in_flight += 1
+            return True
+        retry_after = max(1.0, self.opened_at + self.open_seconds - now)
+        raise CircuitOpenError(f"Upstream circuit is {self.state}; failing fast", retry_after)
+
+    def record(self, probe: bool, success: Optional[bool], latency: float):
+        """Record a call outcome; success=None means it says nothing about upstream health"""
+        healthy = bool(success) and latency < self.slow_call_seconds
+        if probe:
+            self.probes_in_flight -= 1
+            if success is None or self.state != "half_open":
+                return
+            if not healthy:
+                self._open()
+            else:
+                self.probe_successes += 1
+                if self.probe_successes >= self.half_open_probes:
+                    self.state = "closed"
+                    self.window.clear()
+            return
+        if success is None or self.state != "closed":
+            return
+        self.window.append((not success, latency >= self.slow_call_seconds))
+        if len(self.window) >= self.min_calls:
+            failures = sum(failed for failed, _ in self.window) / len(self.window)
+            slow = sum(is_slow for _, is_slow in self.window) / len(self.window)
+            if failures >= self.failure_rate or slow >= self.slow_call_rate:
+                self._open()
+
+    def retry_after(self) -> float:
+        """Seconds until calls are admitted again, 0 if they are admitted now"""
+        now = time.monotonic()
+        if self.state == "closed" or (self.state == "open" and now - self.opened_at >= self.open_seconds):
+            return 0.0
+        if self.state == "half_open":
+            return 0.0 if self.probes_in_flight < self.half_open_probes else 1.0
+        return max(1.0, self.opened_at + self.open_seconds - now)
+
+    def _open(self):
+        logger.warning("Upstream circuit breaker opened")
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.window.clear()
+
+class IncrementalJSONParser:
+    """Report each top-level field of a streamed JSON object as soon as its value is complete.
+
+    Text before the opening brace (markdown fences, preamble) is skipped; nested values are
+    returned whole once their closing bracket arrives.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, object] = {}
+        self.complete = False
+        self._depth = 0
+        self._state = "key"
+        self._in_string = False
+        self._escape = False
+        self._key = None
+        self._token: List[str] = []
+
+    def feed(self, text: str) -> List[Tuple[str, object]]:
+        """Consume the next text delta and return the (key, value) pairs it completed"""
+        completed = []
+        for char in text:
+            if self.complete:
+                break
+            self._consume(char, completed)
+        return completed
+
+    @property
+    def started(self) -> bool:
+        return self._depth > 0 or self.complete
+
+    def finish(self) -> Optional[Tuple[str, object]]:
+        """Close the value being written when the text ended and return it as a (key, value) pair.
+
+        Cut-off strings keep the text written so far, containers keep their complete entries; cut-off
+        keys, numbers and literals cannot be salvaged and return None.
+        """
+        if self.complete or self._depth == 0 or not self._token or self._state != "value":
+            return None
+        if self._depth == 1 and not self._in_string:
+            return None
+        value = _close_truncated("".join(self._token))
+        if value is _UNREPAIRABLE:
+            return None
+        self.fields[self._key] = value
+        return self._key, value
+
+    def _consume(self, char: str, completed: list):
+        if self._depth == 0:
+            if char == "{":
+                self._depth = 1
+            return
+        if self._in_string:
+            self._token.append(char)
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._depth == 1:
+                    self._end_token(completed)
+            return
+        if self._depth > 1:
+            self._token.append(char)
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._end_token(completed)
+            return
+        if self._state == "scalar":
+            if char not in ",}" and not char.isspace():
+                self._token.append(char)
+                return
+            self._end_token(completed)
+        if char.isspace():
+            return
+        if self._state in ("key", "after") and char == "}":
+            self.complete = True
+        elif self._state == "key" and char == '"':
+            self._token, self._in_string = [char], True
+        elif self._state == "colon" and char == ":":
+            self._state = "value"
+        elif self._state == "value":
+            self._token = [char]
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth = 2
+            else:
+                self._state = "scalar"
+        elif self._state == "after" and char == ",":
+            self._state = "key"
+
+    def _end_token(self, completed: list):
+        text, self._token = "".join(self._token), []
+        if self._state == "key":
+            self._key, self._state = json.loads(text), "colon"
+            return
+        self._state = "after"
+        try:
+            self.fields[self._key] = json.loads(text)
+            completed.append((self._key, self.fields[self._key]))
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping unparseable streamed value for {self._key!r}")
+
+
+_UNREPAIRABLE = object()
+
+
+def _close_truncated(text: str) -> object:
+    """Parse a string, array or object value whose end was cut off, or return _UNREPAIRABLE.
+
+    Containers cut off inside an entry are cut back to their last complete entry; containers cut off
+    between entries and bare strings are closed where they stop.
+    """
+    closers: List[str] = []
+    in_string = escape = False
+    last_comma: Optional[Tuple[int, Tuple[str, ...]]] = None
+    for index, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            closers.append("]" if char == "[" else "}")
+        elif char in "]}":
+            closers.pop()
+        elif char == ",":
+            last_comma = (index, tuple(closers))
+
+    # A dangling backslash would escape the closing quote
+    body = text[:-1] if escape else text
+    closed = body + ('"' if in_string else "") + "".join(reversed(closers))
+    if not closers:
+        candidates = [closed]
+    else:
+        candidates = [closed, text[0] + ("]" if text[0] == "[" else "}")]
+        if last_comma is not None:
+            index, open_closers = last_comma
+            candidates.insert(1, text[:index] + "".join(reversed(open_closers)))
+        if in_string or text.rstrip()[-1] not in '"]}':
+            # The last entry is incomplete; prefer dropping it
+            candidates.append(candidates.pop(0))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return _UNREPAIRABLE
+
+
+@dataclass
+class ParsedObject:
+    """Fields recovered from a model answer, whether it was cut off, and which cut-off fields were closed"""
+    data: Dict[str, object] = field(default_factory=dict)
+    truncated: bool = False
+    repaired: List[str] = field(default_factory=list)
+
+
+def parse_json_object(text: str) -> ParsedObject:
+    """Extract the first JSON object from a model answer in one pass, repairing a cut-off last field"""
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    parsed = ParsedObject(data=parser.fields, truncated=parser.started and not parser.complete)
+    if parsed.truncated:
+        repaired = parser.finish()
+        if repaired is not None:
+            parsed.repaired.append(repaired[0])
+    return parsed
+
 
 # Simplified Leaf Disease Detector (without heavy dependencies)
 @dataclass
@@ -28,9 +310,11 @@ class DiseaseAnalysisResult:
     analysis_timestamp: str = datetime.now().astimezone().isoformat()
 
 class LeafDiseaseDetector:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, max_connections: int = 100):
         try:
-            from groq import Groq
+            import httpx
+            from groq import (APIConnectionError, AsyncGroq, DefaultAsyncHttpxClient,
+                              Groq, InternalServerError, RateLimitError)
             from dotenv import load_dotenv
             
             load_dotenv()
@@ -38,12 +322,44 @@ class LeafDiseaseDetector:
             if not self.api_key:
                 raise ValueError("GROQ_API_KEY not found in environment variables")
             self.client = Groq(api_key=self.api_key)
+            # Pooled keep-alive connections are reused across requests; retries
+            # are made by _create_with_retries() within the request deadline
+            self.async_client = AsyncGroq(
+                api_key=self.api_key,
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(max_connections=max_connections,
+                                        max_keepalive_connections=max_connections)))
+            self._retryable_errors = (RateLimitError, InternalServerError,
+                                      APIConnectionError)
+            self._rate_limit_error = RateLimitError
+            self.breaker = CircuitBreaker()
             logger.info("Leaf Disease Detector initialized")
         except ImportError:
             logger.warning("Groq not available, using demo mode")
             self.client = None
+            self.async_client = None
             self.api_key = None
 
+    async def warmup(self) -> bool:
+        """Open the upstream connection pool with a cheap probe so the first request skips the TLS handshake"""
+        if not self.async_client:
+            return False
+        try:
+            await self.async_client.models.list()
+            logger.info("Upstream connection warmed up")
+            return True
+        except Exception as e:
+            logger.warning(f"Warmup probe failed: {str(e)}")
+            return False
+
+    async def aclose(self):
+        """Close the pooled upstream connections"""
+        if self.async_client:
+            await self.async_client.close()
+        if self.client:
+            self.client.close()
+
     def create_analysis_prompt(self) -> str:
         return """IMPORTANT: First determine if this image contains a plant leaf or vegetation. If the image shows humans, animals, objects, buildings, or anything other than plant leaves/vegetation, return the "invalid_image" response format below.
 
@@ -86,133 +402,207 @@ class LeafDiseaseDetector:
     def analyze_leaf_image_base64(self, base64_image: str, temperature: float = 0.3, max_tokens: int = 1024) -> Dict:
         try:
             if not self.client:
-                # Demo mode - return sample response
-                return {
-                    "disease_detected": True,
-                    "disease_name": "Brown Spot Disease",
-                    "disease_type": "fungal",
-                    "severity": "moderate",
-                    "confidence": 87.3,
-                    "symptoms": ["Circular brown spots with yellow halos", "Leaf yellowing around affected areas"],
-                    "possible_causes": ["High humidity levels", "Poor air circulation", "Overwatering"],
-                    "treatment": ["Apply copper-based fungicide spray", "Improve air circulation", "Reduce watering frequency"],
-                    "analysis_timestamp": datetime.now().astimezone().isoformat()
-                }
+                raise RuntimeError("Groq client is not available")
 
             logger.info("Starting analysis for base64 image data")
+            completion = self.client.chat.completions.create(
+                **self._build_request(base64_image, temperature, max_tokens))
 
-            if not isinstance(base64_image, str) or not base64_image:
-                raise ValueError("Invalid base64 image data")
+            logger.info("API request completed successfully")
+            return self._to_result(completion.choices[0].message.content)
 
-            # Clean base64 string
-            if base64_image.startswith('data:'):
-                base64_image = base64_image.split(',', 1)[1]
+        except Exception as e:
+            logger.error(f"Analysis failed: {str(e)}")
+            raise
 
-            # Make API request
-            completion = self.client.chat.completions.create(
-                model="meta-llama/llama-4-scout-17b-16e-instruct",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": self.create_analysis_prompt()
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                temperature=temperature,
-                max_completion_tokens=max_tokens,
-                top_p=1,
-                stream=False,
-                stop=None,
-            )
+    async def analyze_leaf_image_async(self, base64_image: str, temperature: float = 0.3, max_tokens: int = 1024,
+                                       timeout: float = REQUEST_TIMEOUT_SECONDS) -> Dict:
+        """Coroutine variant of analyze_leaf_image_base64 that does not block the event loop.
+
+        Transient upstream errors are retried as long as the overall timeout (in seconds) allows.
+        Raises CircuitOpenError without calling upstream while the circuit breaker is open.
+        """
+        try:
+            if not self.async_client:
+                raise RuntimeError("Groq client is not available")
+
+            logger.info("Starting async analysis for base64 image data")
+            completion = await self._create_with_retries(
+                self._build_request(base64_image, temperature, max_tokens), timeout)
 
             logger.info("API request completed successfully")
-            result = self._parse_response(completion.choices[0].message.content)
-            return result.__dict__
+            return self._to_result(completion.choices[0].message.content)
 
         except Exception as e:
             logger.error(f"Analysis failed: {str(e)}")
-            # Return demo response on error
-            return {
-                "disease_detected": True,
-                "disease_name": "Sample Disease",
-                "disease_type": "fungal",
-                "severity": "mild",
-                "confidence": 75.0,
-                "symptoms": ["Sample symptoms detected"],
-                "possible_causes": ["Environmental factors"],
-                "treatment": ["Consult with plant specialist"],
-                "analysis_timestamp": datetime.now().astimezone().isoformat()
-            }
-
-    def _parse_response(self, response_content: str) -> DiseaseAnalysisResult:
+            raise
+
+    async def stream_leaf_image_async(self, base64_image: str, temperature: float = 0.3, max_tokens: int = 1024,
+                                      timeout: float = REQUEST_TIMEOUT_SECONDS) -> AsyncIterator[Tuple[str, Dict]]:
+        """Streaming variant of analyze_leaf_image_async yielding (event, data) pairs.
+
+        Yields ("field", {"field": name, "value": value}) for each top-level result field as soon as
+        the model has finished writing it, then ("done", result) with the validated result. Only
+        opening the stream is retried; errors after that are raised to the caller.
+        """
+        if not self.async_client:
+            raise RuntimeError("Groq client is not available")
+
+        logger.info("Starting streamed analysis for base64 image data")
+        request = self._build_request(base64_image, temperature, max_tokens)
+        request["stream"] = True
+        stream = await self._create_with_retries(request, timeout)
+        parser = IncrementalJSONParser()
+        parts = []
         try:
-            # Clean up response
-            cleaned_response = response_content.strip()
-            if cleaned_response.startswith('```json'):
-                cleaned_response = cleaned_response.replace('```json', '').replace('```', '').strip()
-            elif cleaned_response.startswith('```'):
-                cleaned_response = cleaned_response.replace('```', '').strip()
-
-            # Parse JSON
-            disease_data = json.loads(cleaned_response)
-            logger.info("Response parsed successfully as JSON")
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    parts.append(text)
+                    for name, value in parser.feed(text):
+                        yield "field", {"field": name, "value": value}
+        finally:
+            await stream.close()
 
-            return DiseaseAnalysisResult(
-                disease_detected=bool(disease_data.get('disease_detected', False)),
-                disease_name=disease_data.get('disease_name'),
-                disease_type=disease_data.get('disease_type', 'unknown'),
-                severity=disease_data.get('severity', 'unknown'),
-                confidence=float(disease_data.get('confidence', 0)),
-                symptoms=disease_data.get('symptoms', []),
-                possible_causes=disease_data.get('possible_causes', []),
-                treatment=disease_data.get('treatment', [])
-            )
+        logger.info("Streamed API request completed successfully")
+        yield "done", self._to_result("".join(parts))
 
-        except json.JSONDecodeError:
-            logger.warning("Failed to parse as JSON, using fallback")
-            import re
-            json_match = re.search(r'\{.*\}', response_content, re.DOTALL)
-            if json_match:
-                try:
-                    disease_data = json.loads(json_match.group())
-                    return DiseaseAnalysisResult(
-                        disease_detected=bool(disease_data.get('disease_detected', False)),
-                        disease_name=disease_data.get('disease_name'),
-                        disease_type=disease_data.get('disease_type', 'unknown'),
-                        severity=disease_data.get('severity', 'unknown'),
-                        confidence=float(disease_data.get('confidence', 0)),
-                        symptoms=disease_data.get('symptoms', []),
-                        possible_causes=disease_data.get('possible_causes', []),
-                        treatment=disease_data.get('treatment', [])
-                    )
-                except json.JSONDecodeError:
-                    pass
-
-            # Fallback response
+    async def _create_with_retries(self, request: Dict, timeout: float):
+        """Call the API, retrying 429, 5xx and connection errors with full-jitter backoff inside the deadline"""
+        deadline = time.monotonic() + timeout
+        for attempt in range(RETRY_MAX_ATTEMPTS):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Deadline exceeded before the upstream call could finish")
+            try:
+                return await self._create_guarded(request, remaining)
+            except Exception as e:
+                if attempt + 1 >= RETRY_MAX_ATTEMPTS or not self._is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                if delay >= deadline - time.monotonic():
+                    raise
+                logger.warning(f"Upstream attempt {attempt + 1} failed, retrying in {delay:.2f}s: {str(e)}")
+                await asyncio.sleep(delay)
+
+    async def _create_guarded(self, request: Dict, timeout: float):
+        """Make one upstream call through the circuit breaker"""
+        probe = self.breaker.before_call()
+        started = time.monotonic()
+        try:
+            completion = await self.async_client.chat.completions.create(**request, timeout=timeout)
+        except BaseException as e:
+            # Rate limits, client errors and cancellations say nothing about upstream health
+            upstream_failure = (isinstance(e, Exception) and self._is_retryable(e)
+                                and not isinstance(e, self._rate_limit_error))
+            self.breaker.record(probe, False if upstream_failure else None, time.monotonic() - started)
+            raise
+        self.breaker.record(probe, True, time.monotonic() - started)
+        return completion
+
+    def _is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, self._retryable_errors):
+            return True
+        status = getattr(error, "status_code", None)
+        return status is not None and (status == 429 or status >= 500)
+
+    def _build_request(self, base64_image: str, temperature: float, max_tokens: int) -> Dict:
+        if not isinstance(base64_image, str) or not base64_image:
+            raise ValueError("Invalid base64 image data")
+
+        # Clean base64 string
+        if base64_image.startswith('data:'):
+            base64_image = base64_image.split(',', 1)[1]
+
+        return dict(
+            model="meta-llama/llama-4-scout-17b-16e-instruct",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": self.create_analysis_prompt()
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/jpeg;base64,{base64_image}"
+                            }
+                        }
+                    ]
+                }
+            ],
+            temperature=temperature,
+            max_completion_tokens=max_tokens,
+            top_p=1,
+            stream=False,
+            stop=None,
+        )
+
+    def _to_result(self, response_content: str) -> Dict:
+        """Parse the model's answer into a result dictionary.
+
+        An answer cut off by the token limit is returned with the fields that could be recovered,
+        flagged with truncated, recovered_fields and repaired_fields.
+        """
+        analysis, parsed = self._parse_response(response_content)
+        result = analysis.__dict__
+        if parsed.truncated:
+            result["truncated"] = True
+            result["recovered_fields"] = list(parsed.data)
+            result["repaired_fields"] = parsed.repaired
+        return result
+
+    def _parse_response(self, response_content: str) -> Tuple[DiseaseAnalysisResult, ParsedObject]:
+        """Parse the first JSON object in the response in one pass, ignoring fences and surrounding text.
+
+        If the response was cut off by the token limit, the fields completed before the cut are kept
+        and the one being written is repaired where possible.
+        """
+        parsed = parse_json_object(response_content)
+        disease_data = parsed.data
+        if not disease_data or (parsed.truncated and 'disease_detected' not in disease_data):
             logger.error(f"Could not parse response: {response_content[:200]}...")
-            return DiseaseAnalysisResult(
-                disease_detected=False,
-                disease_name=None,
-                disease_type="unknown",
-                severity="unknown",
-                confidence=0.0,
-                symptoms=["Analysis failed"],
-                possible_causes=["Unable to process image"],
-                treatment=["Please try again or contact support"]
-            )
+            raise ValueError("Unable to parse API response as JSON")
+        if parsed.truncated:
+            logger.warning(f"Response was truncated; recovered fields {list(disease_data)}, "
+                           f"repaired {parsed.repaired}")
+        else:
+            logger.info("Response parsed successfully as JSON")
+
+        return DiseaseAnalysisResult(
+            disease_detected=bool(disease_data.get('disease_detected', False)),
+            disease_name=disease_data.get('disease_name'),
+            disease_type=disease_data.get('disease_type', 'unknown'),
+            severity=disease_data.get('severity', 'unknown'),
+            confidence=float(disease_data.get('confidence', 0)),
+            symptoms=disease_data.get('symptoms', []),
+            possible_causes=disease_data.get('possible_causes', []),
+            treatment=disease_data.get('treatment', [])
+        ), parsed
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create one detector per process, warm it up on startup and close it on shutdown"""
+    try:
+        detector = LeafDiseaseDetector()
+        await detector.warmup()
+    except Exception as e:
+        logger.error(f"Could not initialize detector: {str(e)}")
+        detector = None
+    app.state.detector = detector
+    try:
+        yield
+    finally:
+        if detector:
+            await detector.aclose()
+
+
+app = FastAPI(title="Leaf Disease Detection API", version="1.0.0", lifespan=lifespan)
 
 @app.post('/disease-detection-file')
-async def disease_detection_file(file: UploadFile = File(...)):
+async def disease_detection_file(request: Request, file: UploadFile = File(...)):
     """
     Endpoint to detect diseases in leaf images using direct image file upload.
     Accepts multipart/form-data with an image file.
@@ -226,39 +616,92 @@ async def disease_detection_file(file: UploadFile = File(...)):
         # Convert to base64 for processing
         base64_string = base64.b64encode(contents).decode('utf-8')
         
-        # Use the simplified disease detection logic
+        detector = request.app.state.detector
+        if detector is None or detector.async_client is None:
+            return _degraded_response("Disease analysis is not configured on this server",
+                                      retry_after=None)
         try:
-            detector = LeafDiseaseDetector()
-            result = detector.analyze_leaf_image_base64(base64_string)
-            
-            logger.info("Disease detection completed successfully")
-            return JSONResponse(content=result)
-            
+            result = await detector.analyze_leaf_image_async(
+                base64_string, timeout=REQUEST_TIMEOUT_SECONDS)
+        except CircuitOpenError as e:
+            return _degraded_response(
+                "Disease analysis is temporarily unavailable, please try again shortly",
+                retry_after=e.retry_after)
+        except TimeoutError:
+            return JSONResponse(status_code=504,
+                                content={"detail": "Disease analysis timed out, please try again"})
         except Exception as e:
             logger.error(f"Error in disease detection: {str(e)}")
-            # Fallback to simple response
-            pass
-        
-        # Fallback response (demo version)
-        result = {
-            "status": "success",
-            "message": "Image received successfully",
-            "file_size": len(contents),
-            "base64_length": len(base64_string),
-            "filename": file.filename,
-            "content_type": file.content_type,
-            "note": "This is a demo version. Full disease detection will be available soon!"
-        }
-        
-        logger.info("Disease detection from file completed successfully")
+            return JSONResponse(status_code=502,
+                                content={"detail": f"Disease analysis failed: {str(e)}"})
+
+        logger.info("Disease detection completed successfully")
         return JSONResponse(content=result)
-        
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error in disease detection (file): {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post('/disease-detection-stream')
+async def disease_detection_stream(request: Request, file: UploadFile = File(...)):
+    """
+    Streaming variant of /disease-detection-file using Server-Sent Events.
+
+    Accepts the same multipart upload and replies with text/event-stream events:
+    accepted, one field event per result field as soon as the model has
+    written it, and done with the final result. Failures after the stream has started
+    are reported as an error event. The response is produced by an async generator,
+    so a long-lived stream holds no worker thread.
+    """
+    detector = request.app.state.detector
+    if detector is None or detector.async_client is None:
+        return _degraded_response("Disease analysis is not configured on this server",
+                                  retry_after=None)
+    retry_after = detector.breaker.retry_after()
+    if retry_after > 0:
+        return _degraded_response(
+            "Disease analysis is temporarily unavailable, please try again shortly",
+            retry_after=retry_after)
+
+    contents = await file.read()
+
+    async def events():
+        yield _sse_event("accepted", {"filename": file.filename,
+                                      "content_type": file.content_type,
+                                      "file_size": len(contents)})
+        base64_string = base64.b64encode(contents).decode('utf-8')
+        try:
+            async for event, data in detector.stream_leaf_image_async(
+                    base64_string, timeout=REQUEST_TIMEOUT_SECONDS):
+                yield _sse_event(event, data)
+        except CircuitOpenError as e:
+            yield _sse_event("error", {"status": 503, "retry_after": e.retry_after,
+                                       "detail": "Disease analysis is temporarily unavailable, please try again shortly"})
+        except TimeoutError:
+            yield _sse_event("error", {"status": 504,
+                                       "detail": "Disease analysis timed out, please try again"})
+        except Exception as e:
+            logger.error(f"Error in streamed disease detection: {str(e)}")
+            yield _sse_event("error", {"status": 502, "detail": f"Disease analysis failed: {str(e)}"})
+
+    logger.info("Streaming disease detection for uploaded file")
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _sse_event(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _degraded_response(detail: str, retry_after: Optional[float]) -> JSONResponse:
+    """503 telling the client analysis is unavailable rather than returning a made-up diagnosis"""
+    headers = {} if retry_after is None else {"Retry-After": str(math.ceil(retry_after))}
+    return JSONResponse(status_code=503, headers=headers,
+                        content={"detail": detail, "degraded": True, "retry_after": retry_after})
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     """Root endpoint serving the Streamlit-style interface"""
@@ -931,6 +1374,35 @@ async def root():
                 }
             }
             
+            function renderResult(data, partial) {
+                result.className = 'result success';
+                const pending = partial ? '<p><em>Analysing…</em></p>' : '';
+                if (data.disease_detected === false) {
+                    result.innerHTML = `
+                        <h3>✅ Healthy Leaf</h3>
+                        <p>No disease detected in this leaf. The plant appears to be healthy!</p>
+                        <p><strong>Confidence:</strong> ${data.confidence ?? '…'}%</p>
+                        ${pending}
+                    `;
+                    return;
+                }
+                result.innerHTML = `
+                    <h3>🦠 ${data.disease_name ?? '…'}</h3>
+                    <p><strong>Type:</strong> ${data.disease_type ?? '…'}</p>
+                    <p><strong>Severity:</strong> ${data.severity ?? '…'}</p>
+                    <p><strong>Confidence:</strong> ${data.confidence ?? '…'}%</p>
+                    <div style="margin-top: 15px;">
+                        <h4>Symptoms:</h4>
+                        <ul>${(data.symptoms || []).map(s => `<li>${s}</li>`).join('')}</ul>
+                    </div>
+                    <div style="margin-top: 15px;">
+                        <h4>Treatment:</h4>
+                        <ul>${(data.treatment || []).map(t => `<li>${t}</li>`).join('')}</ul>
+                    </div>
+                    ${pending}
+                `;
+            }
+            
             async function analyzeImage() {
                 if (!selectedFile) return;
                 
@@ -942,44 +1414,49 @@ async def root():
                 formData.append('file', selectedFile);
                 
                 try {
-                    const response = await fetch('/disease-detection-file', {
+                    // Stream the diagnosis so fields show up while the model is still writing
+                    const response = await fetch('/disease-detection-stream', {
                         method: 'POST',
                         body: formData
                     });
                     
-                    const data = await response.json();
-                    
-                    loading.style.display = 'none';
-                    result.style.display = 'block';
+                    if (!response.ok) {
+                        const data = await response.json();
+                        throw new Error(data.detail || 'Analysis failed');
+                    }
                     
-                    if (response.ok) {
-                        if (data.disease_detected) {
-                            result.className = 'result success';
-                            result.innerHTML = `
-                                <h3>🦠 ${data.disease_name}</h3>
-                                <p><strong>Type:</strong> ${data.disease_type}</p>
-                                <p><strong>Severity:</strong> ${data.severity}</p>
-                                <p><strong>Confidence:</strong> ${data.confidence}%</p>
-                                <div style="margin-top: 15px;">
-                                    <h4>Symptoms:</h4>
-                                    <ul>${data.symptoms.map(s => `<li>${s}</li>`).join('')}</ul>
-                                </div>
-                                <div style="margin-top: 15px;">
-                                    <h4>Treatment:</h4>
-                                    <ul>${data.treatment.map(t => `<li>${t}</li>`).join('')}</ul>
-                                </div>
-                            `;
-                        } else {
-                            result.className = 'result success';
-                            result.innerHTML = `
-                                <h3>✅ Healthy Leaf</h3>
-                                <p>No disease detected in this leaf. The plant appears to be healthy!</p>
-                                <p><strong>Confidence:</strong> ${data.confidence}%</p>
-                            `;
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    const partial = {};
+                    let buffer = '';
+                    let finished = false;
+                    while (!finished) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+                        buffer += decoder.decode(value, { stream: true });
+                        const events = buffer.split('\\n\\n');
+                        buffer = events.pop();
+                        for (const raw of events) {
+                            const event = (raw.match(/^event: (.*)$/m) || [])[1];
+                            const data = JSON.parse((raw.match(/^data: (.*)$/m) || [])[1] || '{}');
+                            if (event === 'field') {
+                                partial[data.field] = data.value;
+                                loading.style.display = 'none';
+                                result.style.display = 'block';
+                                renderResult(partial, true);
+                            } else if (event === 'done') {
+                                renderResult(data, false);
+                                finished = true;
+                            } else if (event === 'error') {
+                                throw new Error(data.detail || 'Analysis failed');
+                            }
                         }
-                    } else {
-                        throw new Error(data.detail || 'Analysis failed');
                     }
+                    if (!finished) {
+                        throw new Error('Analysis stream ended unexpectedly');
+                    }
+                    loading.style.display = 'none';
+                    result.style.display = 'block';
                 } catch (error) {
                     loading.style.display = 'none';
                     result.style.display = 'block';
@@ -1005,6 +1482,7 @@ async def api_info():
         "version": "1.0.0",
         "status": "running",
         "endpoints": {
-            "disease_detection_file": "/disease-detection-file (POST, file upload)"
+            "disease_detection_file": "/disease-detection-file (POST, file upload)",
+            "disease_detection_stream": "/disease-detection-stream (POST, file upload, text/event-stream)"
         }
     }
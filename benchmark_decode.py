@@ -0,0 +1,148 @@
+"""
+Decode Benchmark for Leaf Disease Detection
+===========================================
+
+This script compares the full decode path with the JPEG draft decode path used
+by ImagePreprocessor. For each image it reports decode time and peak memory
+per megapixel of the original image.
+
+Peak memory is measured as the growth of the process's peak resident set
+size over the resident size before decoding, in a fresh child process per
+path. On Linux the peak is reset through /proc/self/clear_refs first so the
+interpreter's own startup does not mask it. Where no RSS figures are
+available (Windows) the size of the decoded pixel buffer is reported instead.
+
+Usage:
+    python benchmark_decode.py                 # synthetic 2, 6 and 12 MP JPEGs
+    python benchmark_decode.py photo1.jpg ...  # your own images
+"""
+
+import io
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Add the Leaf Disease directory to Python path
+sys.path.insert(0, str(Path(__file__).parent / "Leaf Disease"))
+
+from preprocessing import ImagePreprocessor
+
+MAX_SIDE = 1024
+REPEATS = 5
+
+
+def synthetic_jpeg(width: int, height: int) -> bytes:
+    """Create a JPEG with photo-like texture so the encoder cannot cheat"""
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, (height // 16 + 1, width // 16 + 1, 3),
+                         dtype=np.uint8)
+    image = Image.fromarray(small).resize((width, height),
+                                          Image.Resampling.BICUBIC)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def _proc_status_kb(field: str) -> int:
+    """Read a memory field such as VmRSS or VmHWM from /proc/self/status"""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def _start_peak_tracking():
+    """Return a callable giving peak memory growth in bytes, or None"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")  # Reset the VmHWM high-water mark
+        baseline = _proc_status_kb("VmRSS")
+        return lambda: (_proc_status_kb("VmHWM") - baseline) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return lambda: (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                    - baseline) * unit
+
+
+def measure(image_bytes: bytes, draft: bool) -> dict:
+    """Decode one image repeatedly and report timing and memory"""
+    preprocessor = ImagePreprocessor(max_side=MAX_SIDE, draft_decode=draft)
+    peak_growth = _start_peak_tracking()
+
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        image = preprocessor.decode(preprocessor.open(image_bytes))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    if peak_growth is not None:
+        peak_bytes = peak_growth()
+    else:
+        peak_bytes = image.width * image.height * len(image.getbands())
+
+    return {
+        "decoded_size": list(image.size),
+        "decode_ms": sorted(timings)[len(timings) // 2],
+        "peak_bytes": peak_bytes,
+    }
+
+
+def run_isolated(path: str, draft: bool) -> dict:
+    """Run measure() in a child process so peak memory starts from a clean slate"""
+    output = subprocess.run(
+        [sys.executable, __file__, "--measure", path, str(int(draft))],
+        capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def report(name: str, path: str):
+    """Print both decode paths for one image"""
+    with Image.open(path) as image:
+        width, height = image.size
+        image_format = image.format
+    megapixels = width * height / 1e6
+    print(f"\n{name}: {image_format} {width}x{height} ({megapixels:.1f} MP)")
+    for label, draft in (("full decode ", False), ("draft decode", True)):
+        result = run_isolated(path, draft)
+        print(f"  {label}: decoded {result['decoded_size'][0]}x"
+              f"{result['decoded_size'][1]}, "
+              f"{result['decode_ms'] / megapixels:7.2f} ms/MP, "
+              f"{result['peak_bytes'] / megapixels / 1e6:6.2f} MB/MP peak")
+
+
+def main():
+    """Benchmark the given images, or synthetic JPEGs if none are given"""
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        image_bytes = Path(sys.argv[2]).read_bytes()
+        print(json.dumps(measure(image_bytes, bool(int(sys.argv[3])))))
+        return
+
+    paths = sys.argv[1:]
+    if paths:
+        for path in paths:
+            report(Path(path).name, path)
+        return
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in ((1600, 1200), (3000, 2000), (4000, 3000)):
+            path = Path(tmp) / f"synthetic_{width}x{height}.jpg"
+            path.write_bytes(synthetic_jpeg(width, height))
+            report(path.name, str(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -1606,6 +1606,10 @@ with center:
                             st.markdown(
                                 f"<div class='timestamp'>🕒 {result.get('analysis_timestamp', 'N/A')}</div>", unsafe_allow_html=True)
                             st.markdown("</div>", unsafe_allow_html=True)
+                    elif response.status_code == 503:
+                        retry_after = response.headers.get("Retry-After")
+                        st.warning(response.json().get("detail", "Disease analysis is temporarily unavailable.")
+                                   + (f" Retry in about {retry_after}s." if retry_after else ""))
                     else:
                         st.error(f"API Error: {response.status_code}")
                         st.write(response.text)
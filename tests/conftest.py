@@ -0,0 +1,12 @@
+"""
+Shared fixtures for the Leaf Disease Detection System tests.
+
+The modules live in the "Leaf Disease" directory, which is not a package, so
+it is put on the import path the same way the scripts in it expect.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                "Leaf Disease"))
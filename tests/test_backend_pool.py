@@ -0,0 +1,206 @@
+"""Tests for latency-aware routing across backends"""
+
+import asyncio
+import time
+import types
+
+import pytest
+
+from backend_pool import BackendPool
+from backends import BackendResponse
+
+
+class UpstreamError(Exception):
+    """Error carrying an HTTP status and headers, like the groq errors"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(headers=headers or {})
+
+
+class FakeBackend:
+    """Member backend answering from a script of errors, then successes"""
+
+    def __init__(self, name, latency=0.0, headers=None, errors=()):
+        self.name = name
+        self.latency = latency
+        self.headers = headers or {}
+        self.errors = list(errors)
+        self.calls = 0
+
+    def _answer(self):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.errors:
+            raise self.errors.pop(0)
+        usage = types.SimpleNamespace(total_tokens=100)
+        return BackendResponse(types.SimpleNamespace(usage=usage), dict(self.headers))
+
+    def complete(self, request, timeout):
+        return self._answer()
+
+    async def complete_async(self, request, timeout):
+        return self._answer()
+
+    def stream(self, request, timeout):
+        response = self._answer()
+        return BackendResponse((chunk for chunk in ["chunk1", "chunk2"]),
+                               response.headers)
+
+    async def stream_async(self, request, timeout):
+        raise NotImplementedError
+
+    async def probe_async(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+def states(pool):
+    return {member.name: member.state for member in pool.stats()}
+
+
+def test_an_empty_pool_is_rejected():
+    with pytest.raises(ValueError):
+        BackendPool([])
+
+
+def test_calls_go_to_the_member_with_the_lowest_latency():
+    fast = FakeBackend("fast", latency=0.0)
+    slow = FakeBackend("slow", latency=0.02)
+    pool = BackendPool([fast, slow])
+    while not (fast.calls and slow.calls):
+        pool.complete({}, timeout=5)
+    fast.calls = slow.calls = 0
+    for _ in range(10):
+        pool.complete({}, timeout=5)
+    assert (fast.calls, slow.calls) == (10, 0)
+    stats = {member.name: member for member in pool.stats()}
+    assert stats["slow"].ewma_ms > stats["fast"].ewma_ms
+    assert all(member.in_flight == 0 for member in pool.stats())
+
+
+def test_rate_limited_member_is_paused_and_the_call_fails_over():
+    hot = FakeBackend("hot", errors=[UpstreamError(429, {"retry-after": "0.1"})])
+    spare = FakeBackend("spare", latency=0.01)
+    pool = BackendPool([hot, spare])
+    pool._members[1].ewma = 1.0  # make the hot member the first choice
+    pool.complete({}, timeout=5)
+    assert (hot.calls, spare.calls) == (1, 1)
+    assert states(pool)["hot"] == "limited"
+    pool.complete({}, timeout=5)
+    assert hot.calls == 1
+    time.sleep(0.12)
+    assert states(pool)["hot"] == "healthy"
+    assert {member.name: member.rate_limited for member in pool.stats()}["hot"] == 1
+
+
+def test_client_errors_are_not_failed_over():
+    bad = FakeBackend("bad", errors=[UpstreamError(400)])
+    other = FakeBackend("other")
+    pool = BackendPool([bad, other])
+    pool._members[1].ewma = 1.0
+    with pytest.raises(UpstreamError):
+        pool.complete({}, timeout=5)
+    assert other.calls == 0
+    assert states(pool)["bad"] == "healthy"
+
+
+def test_failing_member_is_ejected_then_probed_back_into_rotation():
+    flaky = FakeBackend("flaky", errors=[UpstreamError(503)] * 2)
+    steady = FakeBackend("steady")
+    pool = BackendPool([flaky, steady], eject_after=2, eject_seconds=0.05)
+    pool._members[1].ewma = 1.0
+    pool.complete({}, timeout=5)
+    assert states(pool)["flaky"] == "healthy"
+    pool.complete({}, timeout=5)
+    assert states(pool)["flaky"] == "ejected"
+    # Out of rotation, the member gets no traffic
+    pool.complete({}, timeout=5)
+    assert flaky.calls == 2
+    time.sleep(0.06)
+    assert states(pool)["flaky"] == "probing"
+    pool.complete({}, timeout=5)
+    assert flaky.calls == 3
+    assert states(pool)["flaky"] == "healthy"
+
+
+def test_failed_probe_ejects_the_member_again():
+    flaky = FakeBackend("flaky", errors=[UpstreamError(503)] * 2)
+    steady = FakeBackend("steady")
+    pool = BackendPool([flaky, steady], eject_after=1, eject_seconds=0.05)
+    pool._members[1].ewma = 1.0
+    pool.complete({}, timeout=5)
+    time.sleep(0.06)
+    pool.complete({}, timeout=5)
+    assert flaky.calls == 2
+    assert states(pool)["flaky"] == "ejected"
+    assert steady.calls == 2
+
+
+def test_the_last_error_surfaces_when_every_member_fails():
+    first = FakeBackend("first", errors=[UpstreamError(502)])
+    second = FakeBackend("second", errors=[UpstreamError(503)])
+    pool = BackendPool([first, second])
+    with pytest.raises(UpstreamError) as raised:
+        pool.complete({}, timeout=5)
+    assert raised.value.status_code in (502, 503)
+    assert first.calls + second.calls == 2
+
+
+def test_rate_limit_headers_are_summed_over_members():
+    def headers(remaining):
+        return {"x-ratelimit-limit-requests": "30",
+                "x-ratelimit-remaining-requests": str(remaining),
+                "x-ratelimit-limit-tokens": "6000",
+                "x-ratelimit-remaining-tokens": "5000",
+                "x-ratelimit-reset-requests": "2s",
+                "x-request-id": "abc"}
+
+    first = FakeBackend("first", headers=headers(20))
+    second = FakeBackend("second", headers=headers(10))
+    pool = BackendPool([first, second])
+    while not (first.calls and second.calls):
+        response = pool.complete({}, timeout=5)
+    response = pool.complete({}, timeout=5)
+    assert response.headers["x-ratelimit-limit-requests"] == "60"
+    assert response.headers["x-ratelimit-limit-tokens"] == "12000"
+    assert float(response.headers["x-ratelimit-remaining-requests"]) in (29, 30)
+    assert response.headers["x-request-id"] == "abc"
+
+
+def test_member_with_a_spent_budget_is_skipped():
+    spent = FakeBackend("spent", headers={"x-ratelimit-remaining-requests": "0",
+                                          "x-ratelimit-reset-requests": "10s"})
+    other = FakeBackend("other", latency=0.01)
+    pool = BackendPool([spent, other])
+    pool._members[1].ewma = 1.0
+    pool.complete({}, timeout=5)
+    assert states(pool)["spent"] == "limited"
+    pool.complete({}, timeout=5)
+    assert (spent.calls, other.calls) == (1, 1)
+
+
+def test_streams_hold_their_slot_until_closed():
+    pool = BackendPool([FakeBackend("only")])
+    response = pool.stream({}, timeout=5)
+    assert pool.stats()[0].in_flight == 1
+    assert list(response.body) == ["chunk1", "chunk2"]
+    assert pool.stats()[0].in_flight == 0
+
+    response = pool.stream({}, timeout=5)
+    response.body.close()
+    response.body.close()
+    assert pool.stats()[0].in_flight == 0
+
+
+def test_async_calls_fail_over_like_blocking_ones():
+    hot = FakeBackend("hot", errors=[UpstreamError(429)])
+    spare = FakeBackend("spare")
+    pool = BackendPool([hot, spare])
+    pool._members[1].ewma = 1.0
+    asyncio.run(pool.complete_async({}, timeout=5))
+    assert (hot.calls, spare.calls) == (1, 1)
+    assert states(pool)["hot"] == "limited"
@@ -0,0 +1,131 @@
+"""Tests for the upstream circuit breaker"""
+
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def breaker(**kwargs):
+    kwargs.setdefault("window_size", 4)
+    kwargs.setdefault("min_calls", 4)
+    kwargs.setdefault("open_seconds", 0.05)
+    kwargs.setdefault("half_open_probes", 2)
+    return CircuitBreaker(**kwargs)
+
+
+def call(circuit, success=True, latency=0.1):
+    circuit.record(circuit.before_call(), success, latency)
+
+
+def trip(circuit):
+    for _ in range(circuit.min_calls):
+        call(circuit, success=False)
+    assert circuit.state == "open"
+
+
+def wait_for_half_open(circuit):
+    time.sleep(circuit.open_seconds + 0.01)
+    assert circuit.state == "half_open"
+
+
+def test_stays_closed_below_min_calls_and_below_the_failure_rate():
+    circuit = breaker()
+    for _ in range(3):
+        call(circuit, success=False)
+    assert circuit.state == "closed"
+    circuit = breaker()
+    for success in (True, True, True, False, True):
+        call(circuit, success=success)
+    assert circuit.state == "closed"
+    assert circuit.stats().failure_rate == 0.25
+
+
+def test_opens_on_the_failure_rate_and_fails_fast():
+    circuit = breaker(open_seconds=30)
+    for success in (True, False, True, False):
+        call(circuit, success=success)
+    assert circuit.state == "open"
+    with pytest.raises(CircuitOpenError) as raised:
+        circuit.before_call()
+    assert 29 < raised.value.retry_after <= 30
+    stats = circuit.stats()
+    assert (stats.opened, stats.rejected, stats.window_calls) == (1, 1, 0)
+
+
+def test_opens_on_the_slow_call_rate():
+    circuit = breaker(slow_call_seconds=1.0, slow_call_rate=0.5)
+    call(circuit, latency=0.2)
+    call(circuit, latency=0.3)
+    call(circuit, latency=1.5)
+    assert circuit.state == "closed"
+    call(circuit, latency=2.0)
+    assert circuit.state == "open"
+
+
+def test_neutral_outcomes_do_not_count():
+    circuit = breaker()
+    for _ in range(10):
+        call(circuit, success=None)
+    assert circuit.stats().window_calls == 0
+    assert circuit.state == "closed"
+
+
+def test_successful_probes_close_the_breaker():
+    circuit = breaker()
+    trip(circuit)
+    wait_for_half_open(circuit)
+    first, second = circuit.before_call(), circuit.before_call()
+    assert first.probe and second.probe
+    # Only half_open_probes calls are let through at once
+    with pytest.raises(CircuitOpenError):
+        circuit.before_call()
+    circuit.record(first, True, 0.1)
+    assert circuit.state == "half_open"
+    circuit.record(second, True, 0.1)
+    assert circuit.state == "closed"
+    assert not circuit.before_call().probe
+
+
+def test_a_failed_probe_reopens_the_breaker():
+    circuit = breaker()
+    trip(circuit)
+    wait_for_half_open(circuit)
+    circuit.record(circuit.before_call(), False, 0.1)
+    assert circuit.state == "open"
+    assert circuit.stats().opened == 2
+
+
+def test_a_slow_probe_reopens_the_breaker():
+    circuit = breaker(slow_call_seconds=1.0)
+    trip(circuit)
+    wait_for_half_open(circuit)
+    circuit.record(circuit.before_call(), True, 5.0)
+    assert circuit.state == "open"
+
+
+def test_a_neutral_probe_frees_its_slot():
+    circuit = breaker(half_open_probes=1)
+    trip(circuit)
+    wait_for_half_open(circuit)
+    circuit.record(circuit.before_call(), None)
+    assert circuit.state == "half_open"
+    circuit.record(circuit.before_call(), True, 0.1)
+    assert circuit.state == "closed"
+
+
+def test_outcomes_from_an_earlier_generation_are_ignored():
+    circuit = breaker()
+    late = circuit.before_call()
+    trip(circuit)
+    wait_for_half_open(circuit)
+    # A call admitted before the breaker opened finishes during half-open
+    circuit.record(late, False, 0.1)
+    assert circuit.state == "half_open"
+    call(circuit)
+    call(circuit)
+    assert circuit.state == "closed"
+    # And a stale failure cannot count against the fresh window
+    circuit.record(late, False, 0.1)
+    assert circuit.stats().window_calls == 0
@@ -0,0 +1,60 @@
+"""Tests for the local plant filter"""
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from image_gates import PlantFilter
+
+
+def leaf_on(background, leaf_colour, size=(640, 480)):
+    """An ellipse of leaf_colour filling about a third of a plain background"""
+    image = Image.new("RGB", size, background)
+    width, height = size
+    ImageDraw.Draw(image).ellipse(
+        (width // 4, height // 5, 3 * width // 4, 4 * height // 5),
+        fill=leaf_colour)
+    return image
+
+
+def test_green_leaf_passes():
+    assert PlantFilter().check(leaf_on((255, 255, 255), (40, 150, 40))) is None
+
+
+def test_brown_leaf_on_white_passes():
+    assert PlantFilter().check(leaf_on((255, 255, 255), (110, 70, 30))) is None
+
+
+def test_dark_brown_necrotic_leaf_on_grey_passes():
+    image = leaf_on((128, 128, 128), (70, 45, 20))
+    assert PlantFilter().features(image).necrotic_ratio > 0.2
+    assert PlantFilter().check(image) is None
+
+
+def test_blighted_leaf_with_speckle_passes():
+    rng = np.random.default_rng(0)
+    base = np.asarray(leaf_on((235, 235, 230), (90, 60, 35))).astype(np.int16)
+    noisy = np.clip(base + rng.integers(-15, 15, base.shape), 0, 255)
+    assert PlantFilter().check(Image.fromarray(noisy.astype(np.uint8))) is None
+
+
+def test_grey_screenshot_is_rejected():
+    image = Image.new("RGB", (640, 480), (245, 245, 245))
+    ImageDraw.Draw(image).rectangle((40, 40, 600, 120), fill=(30, 30, 30))
+    rejection = PlantFilter().check(image)
+    assert rejection is not None
+    assert rejection.reason == "no_plant_detected"
+
+
+def test_pale_skin_is_rejected():
+    assert PlantFilter().check(leaf_on((250, 250, 250), (224, 172, 140))) is not None
+
+
+def test_blue_object_is_rejected():
+    assert PlantFilter().check(leaf_on((255, 255, 255), (30, 60, 200))) is not None
+
+
+def test_counters_track_rejections():
+    plant_filter = PlantFilter()
+    plant_filter.check(leaf_on((255, 255, 255), (110, 70, 30)))
+    plant_filter.check(Image.new("RGB", (320, 240), (200, 200, 200)))
+    assert plant_filter.stats() == {"checked": 2, "rejected": 1}
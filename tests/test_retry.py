@@ -0,0 +1,142 @@
+"""Tests for upstream retries and deadlines"""
+
+import asyncio
+import random
+import time
+
+import pytest
+
+from retry import Deadline, DeadlineExceeded, RetryPolicy
+
+
+class UpstreamError(Exception):
+    """Error carrying an HTTP status and headers, like the groq errors"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def failing_then(result, errors):
+    """Attempt function raising the given errors before returning result"""
+    timeouts = []
+
+    def attempt(timeout):
+        timeouts.append(timeout)
+        if len(timeouts) <= len(errors):
+            raise errors[len(timeouts) - 1]
+        return result
+
+    attempt.timeouts = timeouts
+    return attempt
+
+
+def policy(**kwargs):
+    kwargs.setdefault("base_delay", 0.01)
+    kwargs.setdefault("max_delay", 0.02)
+    return RetryPolicy(rng=random.Random(7), **kwargs)
+
+
+@pytest.mark.parametrize("status, retryable", [
+    (429, True), (500, True), (502, True), (503, True),
+    (400, False), (401, False), (404, False), (None, False)])
+def test_only_transient_errors_are_retryable(status, retryable):
+    error = UpstreamError(status) if status else ValueError("bad json")
+    assert policy().is_retryable(error) is retryable
+
+
+def test_transient_errors_are_retried_until_success():
+    attempt = failing_then("ok", [UpstreamError(429), UpstreamError(503)])
+    assert policy(max_attempts=3).run(attempt, Deadline.after(5)) == "ok"
+    assert len(attempt.timeouts) == 3
+
+
+def test_permanent_errors_fail_on_the_first_attempt():
+    attempt = failing_then("ok", [UpstreamError(400)])
+    with pytest.raises(UpstreamError):
+        policy().run(attempt, Deadline.after(5))
+    assert len(attempt.timeouts) == 1
+
+
+def test_the_last_error_surfaces_when_attempts_run_out():
+    errors = [UpstreamError(500), UpstreamError(502), UpstreamError(503)]
+    attempt = failing_then("ok", errors)
+    with pytest.raises(UpstreamError) as raised:
+        policy(max_attempts=3).run(attempt, Deadline.after(5))
+    assert raised.value is errors[2]
+    assert len(attempt.timeouts) == 3
+
+
+@pytest.mark.parametrize("retry", range(8))
+def test_full_jitter_stays_under_the_exponential_ceiling(retry):
+    retry_policy = RetryPolicy(base_delay=0.5, max_delay=8.0,
+                               rng=random.Random(retry))
+    ceiling = min(8.0, 0.5 * 2 ** retry)
+    delays = [retry_policy.backoff(retry) for _ in range(200)]
+    assert all(0.0 <= delay <= ceiling for delay in delays)
+    # Jitter spreads the delays over the range instead of bunching them
+    assert max(delays) - min(delays) > ceiling / 2
+
+
+def test_retry_after_raises_the_delay():
+    retry_policy = policy()
+    error = UpstreamError(429, {"retry-after": "2"})
+    assert retry_policy.backoff(0, error) == 2.0
+    assert retry_policy.backoff(0, UpstreamError(429)) <= 0.01
+
+
+def test_backoff_beyond_the_deadline_gives_up_without_sleeping():
+    attempt = failing_then("ok", [UpstreamError(429, {"retry-after": "5"})])
+    started = time.monotonic()
+    with pytest.raises(UpstreamError):
+        policy().run(attempt, Deadline.after(1.0))
+    assert time.monotonic() - started < 0.5
+    assert len(attempt.timeouts) == 1
+
+
+def test_attempts_get_the_remaining_deadline_as_timeout():
+    attempt = failing_then("ok", [UpstreamError(500)])
+    policy().run(attempt, Deadline.after(2.0))
+    first, second = attempt.timeouts
+    assert 1.9 < first <= 2.0
+    assert second < first
+    unbounded = failing_then("ok", [])
+    policy().run(unbounded, Deadline())
+    assert unbounded.timeouts == [None]
+
+
+def test_expired_deadline_stops_before_the_first_attempt():
+    attempt = failing_then("ok", [])
+    with pytest.raises(DeadlineExceeded):
+        policy().run(attempt, Deadline(time.monotonic() - 1))
+    assert attempt.timeouts == []
+    assert issubclass(DeadlineExceeded, TimeoutError)
+
+
+def test_deadline_remaining_is_never_negative():
+    assert Deadline(time.monotonic() - 5).remaining() == 0.0
+    assert Deadline.after(None).remaining() is None
+    Deadline.after(None).check()
+
+
+def test_async_run_retries_and_respects_the_deadline():
+    calls = []
+
+    async def attempt(timeout):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise UpstreamError(502)
+        return "ok"
+
+    assert asyncio.run(policy().run_async(attempt, Deadline.after(5))) == "ok"
+    assert len(calls) == 3
+
+    async def rate_limited(timeout):
+        calls.append(timeout)
+        raise UpstreamError(429, {"retry-after": "10"})
+
+    calls.clear()
+    with pytest.raises(UpstreamError):
+        asyncio.run(policy().run_async(rate_limited, Deadline.after(1.0)))
+    assert len(calls) == 1
@@ -0,0 +1,166 @@
+"""Tests for rate-limit-aware upstream scheduling"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scheduler import QueueTimeout, TokenBucket, UpstreamScheduler, parse_duration
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("12", 12.0), ("0.5", 0.5), ("2m59.56s", 179.56), ("7.66s", 7.66),
+    ("120ms", 0.12), ("1h2m", 3720.0), (None, None), ("", None),
+    ("soon", None), ("5x", None)])
+def test_parse_duration(value, seconds):
+    result = parse_duration(value)
+    assert result == pytest.approx(seconds) if seconds is not None else result is None
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(per_minute=60)
+    start = bucket._updated
+    bucket.take(60, start)
+    assert bucket.wait_time(1, start) == pytest.approx(1.0)
+    assert bucket.wait_time(1, start + 1.0) == 0.0
+    bucket.observe(remaining=0.2, now=start + 1.0)
+    assert bucket.tokens == pytest.approx(0.2)
+
+
+def test_calls_beyond_the_concurrency_limit_queue_until_a_release():
+    scheduler = UpstreamScheduler(requests_per_minute=1000,
+                                  tokens_per_minute=1e6,
+                                  initial_concurrency=2, max_concurrency=2)
+    first, second = scheduler.acquire(), scheduler.acquire()
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(scheduler.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    assert admitted == [] and scheduler.stats().queued == 1
+    scheduler.release(first, used_tokens=100)
+    waiter.join(timeout=2)
+    assert len(admitted) == 1
+    assert scheduler.stats().in_flight == 2
+    scheduler.release(second, used_tokens=100)
+    scheduler.release(admitted[0], used_tokens=100)
+
+
+def test_queue_timeout_when_no_capacity_frees_up():
+    scheduler = UpstreamScheduler(initial_concurrency=1, max_concurrency=1,
+                                  max_queue_wait=0.05)
+    held = scheduler.acquire()
+    with pytest.raises(QueueTimeout):
+        scheduler.acquire()
+    # A caller's own deadline shortens the wait further
+    started = time.monotonic()
+    with pytest.raises(QueueTimeout):
+        scheduler.acquire(max_wait=0.01)
+    assert time.monotonic() - started < 0.05
+    assert scheduler.stats().timeouts == 2
+    scheduler.release(held)
+
+
+def test_aimd_grows_on_success_and_halves_on_rate_limit():
+    scheduler = UpstreamScheduler(requests_per_minute=1000,
+                                  tokens_per_minute=1e6,
+                                  initial_concurrency=4, max_concurrency=16)
+    for _ in range(8):
+        scheduler.release(scheduler.acquire(), used_tokens=100)
+    grown = scheduler.concurrency_limit
+    assert 5.0 < grown < 6.5
+
+    scheduler.release(scheduler.acquire(), rate_limited=True,
+                      headers={"retry-after": "0.05"})
+    assert scheduler.concurrency_limit == pytest.approx(grown / 2)
+    # A burst of 429s within a second is one congestion signal
+    scheduler._paused_until = 0.0
+    scheduler.release(scheduler.acquire(), rate_limited=True, headers={})
+    assert scheduler.concurrency_limit == pytest.approx(grown / 2)
+    assert scheduler.stats().rate_limited == 2
+
+
+def test_rate_limit_pauses_admission_for_retry_after():
+    scheduler = UpstreamScheduler(requests_per_minute=1000,
+                                  tokens_per_minute=1e6)
+    scheduler.release(scheduler.acquire(), rate_limited=True,
+                      headers={"retry-after": "0.2"})
+    started = time.monotonic()
+    reservation = scheduler.acquire()
+    assert time.monotonic() - started >= 0.15
+    assert reservation.queued_seconds >= 0.15
+    scheduler.release(reservation)
+
+
+def test_concurrency_limit_never_drops_below_the_minimum():
+    scheduler = UpstreamScheduler(initial_concurrency=1, min_concurrency=1)
+    scheduler.release(scheduler.acquire(), rate_limited=True,
+                      headers={"retry-after": "0"})
+    assert scheduler.concurrency_limit == 1.0
+
+
+def test_headers_align_the_token_budget_and_stop_growth_near_the_limit():
+    scheduler = UpstreamScheduler(requests_per_minute=1000,
+                                  tokens_per_minute=30000,
+                                  initial_concurrency=4)
+    reservation = scheduler.acquire(tokens=1000)
+    scheduler.release(reservation, used_tokens=1000, headers={
+        "x-ratelimit-limit-tokens": "6000",
+        "x-ratelimit-remaining-tokens": "500"})
+    assert scheduler.token_budget.capacity == 6000
+    assert scheduler.token_budget.tokens <= 501
+    assert scheduler.concurrency_limit == 4.0
+
+
+def test_exhausted_request_budget_pauses_until_reset():
+    scheduler = UpstreamScheduler(requests_per_minute=1000,
+                                  tokens_per_minute=1e6)
+    scheduler.release(scheduler.acquire(), used_tokens=10, headers={
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "150ms"})
+    started = time.monotonic()
+    scheduler.release(scheduler.acquire(), used_tokens=10)
+    assert time.monotonic() - started >= 0.1
+
+
+def test_async_waiters_are_admitted_in_fifo_order():
+    scheduler = UpstreamScheduler(requests_per_minute=1000,
+                                  tokens_per_minute=1e6,
+                                  initial_concurrency=1, max_concurrency=1)
+    order = []
+
+    async def caller(name):
+        reservation = await scheduler.acquire_async()
+        order.append(name)
+        await asyncio.sleep(0.01)
+        scheduler.release(reservation)
+
+    async def scenario():
+        tasks = []
+        for name in range(4):
+            tasks.append(asyncio.create_task(caller(name)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == [0, 1, 2, 3]
+    assert scheduler.stats().in_flight == 0
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    scheduler = UpstreamScheduler(initial_concurrency=1, max_concurrency=1)
+
+    async def scenario():
+        held = await scheduler.acquire_async()
+        waiter = asyncio.create_task(scheduler.acquire_async())
+        await asyncio.sleep(0.01)
+        assert scheduler.stats().queued == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.stats().queued == 0
+        scheduler.release(held)
+        # The next caller is admitted straight away
+        scheduler.release(await asyncio.wait_for(scheduler.acquire_async(), 1))
+
+    asyncio.run(scenario())
@@ -0,0 +1,166 @@
+"""Tests for request coalescing"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_async_callers_share_one_call_and_get_copies():
+    flight = SingleFlight()
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"symptoms": ["spots"]}
+
+    async def scenario():
+        return await asyncio.gather(
+            *(flight.run_async("key", upstream) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result == {"symptoms": ["spots"]} for result in results)
+    results[1]["symptoms"].append("changed")
+    assert results[2]["symptoms"] == ["spots"]
+    stats = flight.stats()
+    assert (stats.calls, stats.coalesced, stats.in_flight) == (1, 4, 0)
+
+
+def test_cancelled_leader_leaves_the_call_running_for_followers():
+    flight = SingleFlight()
+    finished = []
+
+    async def upstream():
+        await asyncio.sleep(0.1)
+        finished.append(1)
+        return "diagnosis"
+
+    async def scenario():
+        leader = asyncio.create_task(flight.run_async("key", upstream))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.run_async("key", upstream))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == "diagnosis"
+    assert finished == [1]
+
+
+def test_follower_timeout_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+
+    async def upstream():
+        await asyncio.sleep(0.1)
+        return "diagnosis"
+
+    async def scenario():
+        leader = asyncio.create_task(flight.run_async("key", upstream))
+        await asyncio.sleep(0.01)
+        with pytest.raises(TimeoutError):
+            await flight.run_async("key", upstream, timeout=0.02)
+        return await leader
+
+    assert asyncio.run(scenario()) == "diagnosis"
+
+
+def test_async_error_reaches_every_caller_and_is_not_remembered():
+    flight = SingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        raise ValueError("upstream failed")
+
+    async def scenario():
+        return await asyncio.gather(
+            *(flight.run_async("key", failing) for _ in range(3)),
+            return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(calls) == 1
+    # The failed call is forgotten, so the next caller tries again
+    with pytest.raises(ValueError):
+        asyncio.run(flight.run_async("key", failing))
+    assert len(calls) == 2
+
+
+def test_threads_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+    results = []
+
+    def upstream():
+        calls.append(1)
+        started.set()
+        while flight.stats().coalesced < 3:
+            time.sleep(0.001)
+        return {"severity": "mild"}
+
+    def caller():
+        results.append(flight.run("key", upstream, timeout=5))
+
+    leader = threading.Thread(target=caller)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=caller) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"severity": "mild"}] * 4
+    assert flight.stats().in_flight == 0
+
+
+def test_thread_follower_times_out_and_sees_errors():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait()
+        raise ValueError("upstream failed")
+
+    def leader():
+        try:
+            flight.run("key", failing)
+        except ValueError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait()
+    with pytest.raises(TimeoutError):
+        flight.run("key", failing, timeout=0.02)
+
+    follower_errors = []
+
+    def follower():
+        try:
+            flight.run("key", failing, timeout=5)
+        except ValueError as e:
+            follower_errors.append(e)
+
+    waiting = threading.Thread(target=follower)
+    waiting.start()
+    while flight.stats().coalesced < 2:
+        time.sleep(0.001)
+    release.set()
+    thread.join()
+    waiting.join()
+    assert len(errors) == 1
+    assert follower_errors == errors